@@ -0,0 +1,135 @@
+"""
+Benchmark penyajian /download/<filename>: throughput dan CPU server per GB.
+
+Membandingkan route lama (`send_file(path, as_attachment=True)`) dengan route
+sekarang (conditional/Range + wsgi.file_wrapper). Server dijalankan di proses
+terpisah supaya CPU-nya bisa diukur lewat rusage anak proses.
+
+    python bench/bench_download.py --size-mb 512 --rounds 4
+    python bench/bench_download.py --server gunicorn   # jalur sendfile() sungguhan
+
+Hasil dicetak sebagai JSON.
+"""
+import argparse, json, os, socket, subprocess, sys, tempfile, time, urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def serve(mode, port, folder, server):
+    import cibenyt
+    from flask import send_file
+
+    cibenyt.DOWNLOAD_FOLDER = folder
+    if mode == "legacy":
+        def legacy_download(filename):
+            file_path = os.path.join(cibenyt.DOWNLOAD_FOLDER, filename)
+            if os.path.exists(file_path):
+                return send_file(file_path, as_attachment=True)
+            return "File tidak ditemukan", 404
+        cibenyt.app.view_functions["download_file"] = legacy_download
+
+    if server == "gunicorn":
+        from gunicorn.app.base import BaseApplication
+
+        class App(BaseApplication):
+            def load_config(self):
+                self.cfg.set("bind", f"127.0.0.1:{port}")
+                self.cfg.set("workers", 1)
+                self.cfg.set("threads", 4)
+
+            def load(self):
+                return cibenyt.app
+
+        App().run()
+    else:
+        from werkzeug.serving import make_server
+        make_server("127.0.0.1", port, cibenyt.app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("server tidak menyala")
+
+
+def fetch(url, headers=None):
+    req = urllib.request.Request(url, headers=headers or {})
+    n = 0
+    with urllib.request.urlopen(req) as resp:
+        while True:
+            block = resp.read(1024 * 1024)
+            if not block:
+                return n
+            n += len(block)
+
+
+def run(mode, args, folder, name, size):
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", mode, str(port), folder, "--server", args.server],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_port(port)
+        url = f"http://127.0.0.1:{port}/download/{name}"
+        t0 = time.perf_counter()
+        total = 0
+        for _ in range(args.rounds):
+            total += fetch(url)
+        elapsed = time.perf_counter() - t0
+        # resume dari tengah file: route lama selalu mengirim ulang dari byte 0
+        half = size // 2
+        resumed = fetch(url, {"Range": f"bytes={half}-"})
+    finally:
+        proc.terminate()
+    _, _, ru = os.wait4(proc.pid, 0)
+    cpu = ru.ru_utime + ru.ru_stime
+    gb = total / 1e9
+    return {
+        "mode": mode,
+        "server": args.server,
+        "bytes": total,
+        "seconds": round(elapsed, 3),
+        "throughput_mb_s": round(total / 1e6 / elapsed, 1),
+        "server_cpu_s": round(cpu, 3),
+        "server_cpu_s_per_gb": round(cpu / gb, 3) if gb else None,
+        "resume_bytes_sent": resumed,
+    }
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--size-mb", type=int, default=256)
+    p.add_argument("--rounds", type=int, default=4)
+    p.add_argument("--server", choices=["werkzeug", "gunicorn"], default="werkzeug")
+    p.add_argument("--serve", nargs=3, metavar=("MODE", "PORT", "FOLDER"), help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.serve:
+        mode, port, folder = args.serve
+        return serve(mode, int(port), folder, args.server)
+
+    with tempfile.TemporaryDirectory() as folder:
+        name = "bench.bin"
+        size = args.size_mb * 1024 * 1024
+        with open(os.path.join(folder, name), "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+        results = [run(mode, args, folder, name, size) for mode in ("legacy", "current")]
+    json.dump({"size_bytes": size, "rounds": args.rounds, "results": results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
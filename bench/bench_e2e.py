@@ -0,0 +1,237 @@
+"""
+Benchmark end-to-end offline: route Flask asli di cibenyt.py + YouTube palsu lokal.
+
+Server aplikasi berjalan di proses anak (HOME & folder unduhan sementara) dengan
+`pytubefix.YouTube` diganti `bench.fakeyt.FakeYouTube`; stream-nya disajikan oleh
+`MediaServer` lokal (ukuran, latensi, bandwidth, Range bisa diatur). Tiap klien
+mengirim job lewat POST /jobs, menunggu sampai selesai, lalu mengunduh /download/...
+
+    python bench/bench_e2e.py                       # 1, 8, 64 klien
+    python bench/bench_e2e.py --clients 8 --quality p:720p --bandwidth-mbps 200
+    python bench/bench_e2e.py --out hasil.json --baseline versi-lama.json
+
+Laporan (JSON): jobs/detik, latensi job p50/p99, TTFB /download, waktu merge,
+RSS puncak & disk puncak server, per jumlah klien. Dengan --baseline, exit code 1
+bila throughput turun / latensi naik melebihi --tolerance.
+"""
+import argparse, json, os, shutil, socket, subprocess, sys, tempfile, threading, time, urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+import fakeyt  # noqa: E402
+
+
+def serve_app(port, media_url, media):
+    fakeyt.FakeYouTube.MEDIA_URL = media_url
+    fakeyt.FakeYouTube.MEDIA = media
+    sys.path.insert(0, ROOT)
+    import cibenyt
+    from werkzeug.serving import make_server
+
+    cibenyt.YouTube = fakeyt.FakeYouTube
+    make_server("127.0.0.1", port, cibenyt.app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("server aplikasi tidak menyala")
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100.0 * (len(values) - 1)))))
+    return round(values[k], 4)
+
+
+def disk_usage(folder):
+    total = 0
+    for dirpath, _, files in os.walk(folder):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def http_json(url, data=None):
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req) as resp:
+            return json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read() or b"{}")
+
+
+def client(base, quality, video_ids, samples, errors):
+    for video_id in video_ids:
+        t0 = time.perf_counter()
+        job = http_json(base + "/jobs", {"url": f"https://youtu.be/{video_id}", "quality": quality})
+        if "job_id" not in job:
+            errors.append(job.get("error", "submit gagal"))
+            continue
+        while True:
+            status = http_json(f"{base}/jobs/{job['job_id']}")
+            if status.get("status") in ("done", "error"):
+                break
+            time.sleep(0.05)
+        if status["status"] != "done":
+            errors.append(status.get("error"))
+            continue
+        latency = time.perf_counter() - t0
+        t1 = time.perf_counter()
+        with urllib.request.urlopen(base + urllib.parse.quote(status["result"]["file_path"])) as resp:
+            resp.read(1)
+            ttfb = time.perf_counter() - t1
+            while resp.read(1024 * 1024):
+                pass
+        samples.append({"latency": latency, "ttfb": ttfb, "merge": status.get("timings", {}).get("merge")})
+
+
+def run_level(args, clients, media_url, media, level_index):
+    home = tempfile.mkdtemp(prefix="cibenyt-bench-home-")
+    env = dict(os.environ, HOME=home, CIBEN_RESULT_DB=os.path.join(home, "index.sqlite3"))
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve-app", str(port), media_url, json.dumps(media)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    samples, errors = [], []
+    peak_disk = [0]
+    stop = threading.Event()
+
+    def sample_disk():
+        while not stop.is_set():
+            peak_disk[0] = max(peak_disk[0], disk_usage(home))
+            stop.wait(0.1)
+
+    try:
+        wait_port(port)
+        base = f"http://127.0.0.1:{port}"
+        sampler = threading.Thread(target=sample_disk, daemon=True)
+        sampler.start()
+        threads = []
+        for c in range(clients):
+            # video ID unik per job, kecuali --repeat (menguji cache & single-flight)
+            ids = [f"bench{level_index:02d}c{c:03d}j{j:03d}" if not args.repeat else "benchrepeat01"
+                   for j in range(args.jobs_per_client)]
+            threads.append(threading.Thread(target=client, args=(base, args.quality, ids, samples, errors)))
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+    finally:
+        stop.set()
+        proc.terminate()
+        _, _, ru = os.wait4(proc.pid, 0)
+        shutil.rmtree(home, ignore_errors=True)
+
+    merges = [s["merge"] for s in samples if s["merge"] is not None]
+    # ru_maxrss: KiB di Linux, byte di macOS
+    rss = ru.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return {
+        "clients": clients,
+        "jobs": len(samples),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "jobs_per_sec": round(len(samples) / elapsed, 3) if elapsed else None,
+        "latency_p50": percentile([s["latency"] for s in samples], 50),
+        "latency_p99": percentile([s["latency"] for s in samples], 99),
+        "ttfb_p50": percentile([s["ttfb"] for s in samples], 50),
+        "ttfb_p99": percentile([s["ttfb"] for s in samples], 99),
+        "merge_p50": percentile(merges, 50),
+        "merge_p99": percentile(merges, 99),
+        "server_cpu_s": round(ru.ru_utime + ru.ru_stime, 3),
+        "peak_rss_bytes": rss,
+        "peak_disk_bytes": peak_disk[0],
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Daftar regresi dibanding laporan lama (jumlah klien yang sama)."""
+    old = {r["clients"]: r for r in baseline.get("results", [])}
+    problems = []
+    for r in report["results"]:
+        b = old.get(r["clients"])
+        if not b:
+            continue
+        if b["jobs_per_sec"] and r["jobs_per_sec"] < b["jobs_per_sec"] * (1 - tolerance):
+            problems.append(f"{r['clients']} klien: jobs/detik {b['jobs_per_sec']} -> {r['jobs_per_sec']}")
+        for key in ("latency_p99", "ttfb_p99"):
+            if b.get(key) and r.get(key) and r[key] > b[key] * (1 + tolerance):
+                problems.append(f"{r['clients']} klien: {key} {b[key]} -> {r[key]}")
+    return problems
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--clients", type=int, nargs="+", default=[1, 8, 64])
+    p.add_argument("--jobs-per-client", type=int, default=2)
+    p.add_argument("--quality", default="v:1080p")
+    p.add_argument("--repeat", action="store_true", help="semua job memakai video yang sama")
+    p.add_argument("--video-mb", type=int, default=16)
+    p.add_argument("--audio-mb", type=int, default=2)
+    p.add_argument("--progressive-mb", type=int, default=8)
+    p.add_argument("--latency-ms", type=float, default=20)
+    p.add_argument("--bandwidth-mbps", type=float, default=0, help="batas per koneksi; 0 = tanpa batas")
+    p.add_argument("--no-range", action="store_true", help="server stream mengabaikan Range")
+    p.add_argument("--out", help="tulis laporan JSON ke file ini")
+    p.add_argument("--baseline", help="laporan JSON lama untuk deteksi regresi")
+    p.add_argument("--tolerance", type=float, default=0.2)
+    p.add_argument("--serve-app", nargs=3, help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.serve_app:
+        port, media_url, media = args.serve_app
+        return serve_app(int(port), media_url, json.loads(media))
+
+    folder = fakeyt.media_folder()
+    paths = fakeyt.prepare_media(folder, args.video_mb, args.audio_mb, args.progressive_mb)
+    media = {k: os.path.basename(v) for k, v in paths.items()}
+    server = fakeyt.MediaServer(folder, args.latency_ms, args.bandwidth_mbps, not args.no_range).start()
+    try:
+        results = [run_level(args, n, server.url, media, i) for i, n in enumerate(args.clients)]
+    finally:
+        server.stop()
+
+    report = {
+        "version": subprocess.run(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+                                  stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip(),
+        "ffmpeg": bool(shutil.which("ffmpeg")),
+        "config": {k: v for k, v in vars(args).items() if k not in ("serve_app", "out", "baseline")},
+        "media_bytes": {k: os.path.getsize(v) for k, v in paths.items()},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for line in problems:
+            print("REGRESI:", line, file=sys.stderr)
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
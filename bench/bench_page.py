@@ -0,0 +1,62 @@
+"""
+Benchmark halaman utama: waktu render server untuk GET / dan bobot halaman.
+
+Membandingkan `render_template_string` per request (cara lama) dengan template yang
+dikompilasi sekali, lalu mencatat ukuran HTML dan aset yang memblokir render
+(hasil build_assets.py, atau CDN Tailwind/Alpine bila static/dist/ belum dibuat).
+First contentful paint diukur di browser, mis. Lighthouse dengan profil HP lambat:
+
+    python bench/bench_page.py --rounds 500
+    npx lighthouse http://127.0.0.1:5001/ --only-categories=performance --form-factor=mobile
+
+Hasil dicetak sebagai JSON.
+"""
+import argparse, gzip, json, os, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def timed(fn, rounds):
+    for _ in range(min(20, rounds)):
+        fn()
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return round((time.perf_counter() - t0) / rounds * 1000, 3)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--rounds", type=int, default=300)
+    args = p.parse_args()
+
+    import cibenyt
+    from flask import render_template_string
+
+    client = cibenyt.app.test_client()
+    html = client.get("/").data
+    context = dict(page={"job_id": None, "result": None, "url": "", "quality": "p:720p",
+                         "progressive_res": ["720p", "480p", "360p"], "adaptive_res": [], "ffmpeg_ok": True},
+                   error=None, url="", start="", end="", assets=cibenyt.ASSETS)
+
+    with cibenyt.app.test_request_context("/"):
+        legacy_ms = timed(lambda: render_template_string(cibenyt.html_form, **context), args.rounds)
+        compiled_ms = timed(lambda: cibenyt.render_template(cibenyt.index_template(), **context), args.rounds)
+
+    assets = {}
+    for name, url in (cibenyt.ASSETS or {}).items():
+        path = os.path.join(cibenyt.STATIC_DIR, url.split("/assets/", 1)[1])
+        assets[name] = {enc: os.path.getsize(path + ext) for enc, ext in (("raw", ""), ("gzip", ".gz"), ("br", ".br"))
+                        if os.path.exists(path + ext)}
+
+    print(json.dumps({
+        "render_ms": {"render_template_string": legacy_ms, "compiled": compiled_ms},
+        "get_index_ms": timed(lambda: client.get("/"), args.rounds),
+        "html_bytes": {"raw": len(html), "gzip": len(gzip.compress(html))},
+        "assets": assets or "CDN (cdn.tailwindcss.com JIT + unpkg Alpine); jalankan build_assets.py",
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
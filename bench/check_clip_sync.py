@@ -0,0 +1,92 @@
+"""
+Cek sinkron klip adaptive (Mode Maks + clip): audio dan video hasil `cibenyt.clip_av` harus
+sama panjang dan mulai bersamaan.
+
+Media uji (H.264 dengan keyframe jarang + AAC) dibuat dengan ffmpeg lalu disajikan oleh
+`MediaServer` lokal, jadi ffmpeg membaca lewat HTTP seperti URL googlevideo. Rentang
+tiap track diukur dari timestamp paket (`-f framecrc`).
+
+    python bench/check_clip_sync.py                     # klip 7-12 s, GOP 10 s
+    python bench/check_clip_sync.py --start 13 --end 19 --gop 4
+
+Exit code 1 bila selisih awal/akhir audio vs video melebihi --tolerance detik.
+"""
+import argparse, os, subprocess, sys, tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+import fakeyt  # noqa: E402
+
+
+class Stream:
+    def __init__(self, url, video_codec=None, audio_codec=None):
+        self.url, self.video_codec, self.audio_codec = url, video_codec, audio_codec
+
+
+def make_sources(folder, seconds, gop):
+    video = os.path.join(folder, "v.mp4")
+    audio = os.path.join(folder, "a.m4a")
+    subprocess.run(["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", f"testsrc=size=320x240:rate=25:duration={seconds}",
+                    "-c:v", "libx264", "-preset", "ultrafast", "-g", str(gop * 25), "-keyint_min", str(gop * 25),
+                    "-sc_threshold", "0", video], check=True)
+    subprocess.run(["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+                    "-c:a", "aac", audio], check=True)
+    return video, audio
+
+
+def span(path, kind):
+    """(awal, akhir) detik track pertama `kind` ("v"/"a") dari timestamp paket."""
+    out = subprocess.run(["ffmpeg", "-v", "error", "-i", path, "-map", f"0:{kind}:0", "-c", "copy", "-f", "framecrc", "-"],
+                         stdout=subprocess.PIPE, text=True, check=True).stdout
+    timebase, first, last = None, None, None
+    for line in out.splitlines():
+        if line.startswith("#tb 0:"):
+            num, _, den = line.split(":", 1)[1].strip().partition("/")
+            timebase = int(num) / int(den)
+        elif line and not line.startswith("#"):
+            fields = [f.strip() for f in line.split(",")]
+            pts, duration = int(fields[2]), int(fields[3])
+            first = pts if first is None else min(first, pts)
+            last = pts + duration if last is None else max(last, pts + duration)
+    return first * timebase, last * timebase
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--start", type=float, default=7.0)
+    ap.add_argument("--end", type=float, default=12.0)
+    ap.add_argument("--gop", type=int, default=10, help="jarak keyframe video (detik)")
+    ap.add_argument("--seconds", type=int, default=30, help="panjang media sumber")
+    ap.add_argument("--tolerance", type=float, default=0.1)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        os.environ["HOME"] = home
+        sys.path.insert(0, ROOT)
+        import cibenyt
+
+        media = os.path.join(home, "media")
+        os.makedirs(media)
+        make_sources(media, args.seconds, args.gop)
+        server = fakeyt.MediaServer(media).start()
+        try:
+            out_path, cut = cibenyt.clip_av(Stream(server.url + "v.mp4", video_codec="avc1.64001e"),
+                                            Stream(server.url + "a.m4a", audio_codec="mp4a.40.2"),
+                                            "klip", args.start, args.end)
+        finally:
+            server.stop()
+        v, a = span(out_path, "v"), span(out_path, "a")
+        print(f"klip {args.start:g}-{args.end:g} s, mulai di keyframe {cut:.3f} s -> {os.path.basename(out_path)}")
+        print(f"  video {v[0]:.3f}-{v[1]:.3f} s ({v[1] - v[0]:.3f} s)")
+        print(f"  audio {a[0]:.3f}-{a[1]:.3f} s ({a[1] - a[0]:.3f} s)")
+        drift = max(abs(v[0] - a[0]), abs(v[1] - a[1]))
+        if drift > args.tolerance:
+            print(f"TIDAK SINKRON: selisih {drift:.3f} s > {args.tolerance} s")
+            return 1
+        print(f"sinkron (selisih {drift:.3f} s)")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
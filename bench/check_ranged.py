@@ -0,0 +1,164 @@
+"""
+Cek engine unduhan Range (`cibenyt.ranged_download` / `fetch_stream`) terhadap `MediaServer` lokal:
+
+1. resume: unduhan di proses anak dimatikan paksa (SIGKILL) di tengah jalan, lalu dilanjutkan
+   dari sidecar `.part.json`; hanya byte yang belum tercatat yang boleh diunduh ulang, dan
+   hasilnya harus identik (ukuran + sha256) dengan sumber.
+2. fallback: server tanpa Range (HTTP 200) -> `fetch_stream` kembali ke `stream.download()`,
+   hasil identik dan tidak ada `.part` / `.part.json` yang tertinggal.
+
+    python bench/check_ranged.py
+    python bench/check_ranged.py --size-mb 64 --connections 8 --kill-at 0.5
+
+Exit code 1 bila salah satu cek gagal.
+"""
+import argparse, hashlib, json, os, signal, subprocess, sys, tempfile, time, types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+import fakeyt  # noqa: E402
+
+
+class Counter:
+    """Pengganti `Progress` secukupnya: byte awal (dari checkpoint) dan byte yang benar-benar diunduh."""
+
+    def __init__(self):
+        self.initial = None
+        self.fetched = 0
+
+    def update(self, done, total=None):
+        if self.initial is None:
+            self.initial = done
+
+    def advance(self, n):
+        self.fetched += n
+
+
+def sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def checkpoint_bytes(ckpt_path, filesize):
+    with open(ckpt_path) as f:
+        data = json.load(f)
+    chunk = data["chunk_size"]
+    return (sum(min(chunk, filesize - i * chunk) for i in data["done"])
+            + sum(pos - int(i) * chunk for i, pos in data["partial"].items()))
+
+
+def child(args):
+    import cibenyt
+    cibenyt.ranged_download(args.url, args.out, args.filesize, connections=args.connections,
+                            chunk_size=args.chunk_mb * 1024 * 1024)
+
+
+def check_resume(cibenyt, media, src, args):
+    filesize = os.path.getsize(src)
+    out = os.path.join(media, "..", "resume.bin")
+    ckpt = out + ".part.json"
+    # dibatasi per koneksi supaya ada waktu untuk mematikan proses di tengah jalan
+    server = fakeyt.MediaServer(media, bandwidth_mbps=args.bandwidth_mbps).start()
+    try:
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", "--url", server.url + os.path.basename(src),
+               "--out", out, "--filesize", str(filesize), "--connections", str(args.connections),
+               "--chunk-mb", str(args.chunk_mb)]
+        proc = subprocess.Popen(cmd, env=dict(os.environ, PYTHONPATH=ROOT))
+        deadline = time.time() + 60
+        while time.time() < deadline and proc.poll() is None:
+            try:
+                if checkpoint_bytes(ckpt, filesize) >= args.kill_at * filesize:
+                    break
+            except (OSError, ValueError, KeyError):
+                pass
+            time.sleep(0.05)
+        if proc.poll() is not None:
+            print("GAGAL: unduhan selesai/berhenti sebelum sempat dimatikan (turunkan --bandwidth-mbps)")
+            return False
+        proc.send_signal(signal.SIGKILL)
+        proc.wait()
+        saved = checkpoint_bytes(ckpt, filesize)
+        print(f"resume: dimatikan pada {saved / filesize:.0%} tercatat ({saved} / {filesize} byte)")
+
+        counter = Counter()
+        cibenyt.ranged_download(server.url + os.path.basename(src), out, filesize, connections=args.connections,
+                                chunk_size=args.chunk_mb * 1024 * 1024, progress=counter)
+    finally:
+        server.stop()
+    ok = True
+    if counter.initial != saved or counter.initial + counter.fetched != filesize:
+        print(f"GAGAL: lanjut dari {counter.initial} byte, diunduh ulang {counter.fetched} byte "
+              f"(harusnya {saved} + {filesize - saved})")
+        ok = False
+    if os.path.exists(out + ".part") or os.path.exists(ckpt):
+        print("GAGAL: .part / .part.json tertinggal setelah selesai")
+        ok = False
+    if os.path.getsize(out) != filesize or sha256(out) != sha256(src):
+        print("GAGAL: isi hasil resume berbeda dari sumber")
+        ok = False
+    if ok:
+        print(f"resume: OK, diunduh ulang {counter.fetched} byte, sha256 sama")
+    return ok
+
+
+def check_fallback(cibenyt, media, src):
+    out_dir = os.path.join(media, "..", "fallback")
+    os.makedirs(out_dir, exist_ok=True)
+    server = fakeyt.MediaServer(media, ranges=False).start()
+    try:
+        yt = types.SimpleNamespace(on_progress=None, on_complete=None)
+        stream = fakeyt.FakeStream(yt, server.url + os.path.basename(src), "video/mp4")
+        out = cibenyt.fetch_stream(stream, out_dir, "fallback.bin")
+    finally:
+        server.stop()
+    ok = True
+    leftovers = [n for n in os.listdir(out_dir) if n != "fallback.bin"]
+    if leftovers:
+        print(f"GAGAL: file tertinggal setelah fallback: {leftovers}")
+        ok = False
+    if sha256(out) != sha256(src):
+        print("GAGAL: isi hasil fallback berbeda dari sumber")
+        ok = False
+    if ok:
+        print("fallback tanpa Range: OK, sha256 sama, tidak ada .part tertinggal")
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size-mb", type=int, default=32)
+    ap.add_argument("--connections", type=int, default=4)
+    ap.add_argument("--chunk-mb", type=int, default=1)
+    ap.add_argument("--bandwidth-mbps", type=float, default=40, help="batas per koneksi saat cek resume")
+    ap.add_argument("--kill-at", type=float, default=0.3, help="fraksi byte tercatat sebelum SIGKILL")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--url", help=argparse.SUPPRESS)
+    ap.add_argument("--out", help=argparse.SUPPRESS)
+    ap.add_argument("--filesize", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(args)
+
+    with tempfile.TemporaryDirectory() as home:
+        os.environ["HOME"] = home
+        sys.path.insert(0, ROOT)
+        import cibenyt
+
+        media = os.path.join(home, "media")
+        os.makedirs(media)
+        # byte acak: tanpa ffmpeg pun isinya tidak bisa "kebetulan" sama
+        src = os.path.join(media, "blob.bin")
+        with open(src, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+        ok = check_resume(cibenyt, media, src, args)
+        ok = check_fallback(cibenyt, media, src) and ok
+        return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Pengganti `pytubefix.YouTube` untuk benchmark offline.
+
+`MediaServer` menyajikan stream sintetis (progressive, adaptive video-only, audio)
+lewat HTTP lokal dengan ukuran, latensi, batas bandwidth dan dukungan Range yang
+bisa diatur. `FakeYouTube` meniru API yang dipakai cibenyt (title, length,
+streams.filter/order_by/first, Stream.url/filesize/download, callback progres).
+"""
+import http.server, os, re, shutil, subprocess, tempfile, threading, time, urllib.request
+
+CHUNK = 64 * 1024
+
+
+# ---------- Media sintetis ----------
+def make_media(folder, name, size, kind):
+    """
+    Buat file berukuran kira-kira `size` byte. Dengan ffmpeg: Matroska berisi rawvideo
+    atau PCM (jadi merge benar-benar berjalan, jalur -c copy); tanpa ffmpeg: byte acak.
+    """
+    path = os.path.join(folder, name)
+    if os.path.exists(path):
+        return path
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg and kind == "video":
+        w, h, rate = 320, 240, 25
+        frames = max(1, size // (w * h * 3 // 2))
+        src = f"testsrc=size={w}x{h}:rate={rate}"
+        cmd = [ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i", src, "-frames:v", str(frames),
+               "-c:v", "rawvideo", "-pix_fmt", "yuv420p", "-f", "matroska", path]
+    elif ffmpeg and kind == "audio":
+        seconds = max(1.0, size / (48000 * 2 * 2))
+        cmd = [ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+               "-ac", "2", "-t", f"{seconds:.2f}", "-c:a", "pcm_s16le", "-f", "matroska", path]
+    else:
+        cmd = None
+    if cmd:
+        subprocess.run(cmd, check=True)
+    else:
+        with open(path, "wb") as f:
+            left = size
+            while left:
+                block = os.urandom(min(left, 1024 * 1024))
+                f.write(block)
+                left -= len(block)
+    return path
+
+
+class MediaServer:
+    """HTTP lokal untuk file di `folder`, dengan latensi per request, batas bandwidth per koneksi, dan Range."""
+
+    def __init__(self, folder, latency_ms=0, bandwidth_mbps=0, ranges=True):
+        self.folder = folder
+        self.latency = latency_ms / 1000.0
+        self.bandwidth = bandwidth_mbps * 1e6 / 8 if bandwidth_mbps else 0
+        self.ranges = ranges
+        self.requests = 0
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests += 1
+                path = os.path.join(server.folder, os.path.basename(self.path.split("?")[0]))
+                if not os.path.exists(path):
+                    self.send_error(404)
+                    return
+                size = os.path.getsize(path)
+                start, end, status = 0, size - 1, 200
+                m = re.match(r"bytes=(\d*)-(\d*)$", self.headers.get("Range", ""))
+                if m and server.ranges:
+                    if m[1]:
+                        start = int(m[1])
+                        end = min(int(m[2]), size - 1) if m[2] else size - 1
+                    else:
+                        start = max(size - int(m[2]), 0)
+                    status = 206
+                if server.latency:
+                    time.sleep(server.latency)
+                self.send_response(status)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.send_header("Accept-Ranges", "bytes" if server.ranges else "none")
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.end_headers()
+                server._send(self.wfile, path, start, end)
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/"
+
+    def _send(self, wfile, path, start, end):
+        t0 = time.perf_counter()
+        sent = 0
+        with open(path, "rb") as f:
+            f.seek(start)
+            left = end - start + 1
+            try:
+                while left:
+                    block = f.read(min(CHUNK, left))
+                    if not block:
+                        break
+                    wfile.write(block)
+                    left -= len(block)
+                    sent += len(block)
+                    if self.bandwidth:
+                        ahead = sent / self.bandwidth - (time.perf_counter() - t0)
+                        if ahead > 0:
+                            time.sleep(ahead)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+def prepare_media(folder, video_mb=16, audio_mb=2, progressive_mb=8):
+    """Siapkan file-file stream sintetis; dipakai ulang di antara run bila ukurannya sama."""
+    mb = 1024 * 1024
+    return {
+        "video": make_media(folder, f"video-{video_mb}.mkv", video_mb * mb, "video"),
+        "audio": make_media(folder, f"audio-{audio_mb}.mkv", audio_mb * mb, "audio"),
+        "progressive": make_media(folder, f"prog-{progressive_mb}.mkv", progressive_mb * mb, "video"),
+    }
+
+
+# ---------- Pengganti pytubefix ----------
+class FakeStream:
+    def __init__(self, yt, url, mime_type, resolution=None, abr=None, progressive=False, only_audio=False,
+                 video_codec=None, audio_codec=None, fps=30):
+        self._yt = yt
+        self.url = url
+        self.mime_type = mime_type
+        self.subtype = mime_type.split("/")[-1]
+        self.resolution = resolution
+        self.abr = abr
+        self.fps = fps
+        self.is_progressive = progressive
+        self.is_adaptive = not progressive
+        self.only_audio = only_audio
+        self.includes_video_track = not only_audio
+        self.includes_audio_track = progressive or only_audio
+        self.video_codec = video_codec
+        self.audio_codec = audio_codec
+        self.codecs = [c for c in (video_codec, audio_codec) if c]
+        self.bitrate = int(abr.rstrip("kbps")) * 1000 if abr else 0
+        self.itag = abs(hash((url, resolution, abr))) % 1000
+        self._filesize = None
+
+    @property
+    def filesize(self):
+        if self._filesize is None:
+            req = urllib.request.Request(self.url, headers={"Range": "bytes=0-0"})
+            with urllib.request.urlopen(req) as resp:
+                cr = resp.headers.get("Content-Range")
+                self._filesize = int(cr.rsplit("/", 1)[1]) if cr else int(resp.headers["Content-Length"])
+        return self._filesize
+
+    filesize_approx = filesize
+
+    def download(self, output_path=None, filename=None, **kwargs):
+        # seperti pytubefix: satu koneksi berurutan + callback progres per potongan
+        path = os.path.join(output_path or ".", filename)
+        total = self.filesize
+        done = 0
+        with urllib.request.urlopen(self.url) as resp, open(path, "wb") as f:
+            while True:
+                block = resp.read(CHUNK)
+                if not block:
+                    break
+                f.write(block)
+                done += len(block)
+                if self._yt.on_progress:
+                    self._yt.on_progress(self, block, total - done)
+        if self._yt.on_complete:
+            self._yt.on_complete(self, path)
+        return path
+
+
+class FakeQuery(list):
+    def filter(self, progressive=None, adaptive=None, only_video=None, only_audio=None, res=None,
+               file_extension=None, **kwargs):
+        out = []
+        for s in self:
+            if progressive is not None and s.is_progressive != progressive:
+                continue
+            if adaptive is not None and s.is_adaptive != adaptive:
+                continue
+            if only_video and (s.only_audio or s.is_progressive):
+                continue
+            if only_audio and not s.only_audio:
+                continue
+            if res and s.resolution != res:
+                continue
+            if file_extension and s.subtype != file_extension:
+                continue
+            out.append(s)
+        return FakeQuery(out)
+
+    def order_by(self, attr):
+        def key(s):
+            value = getattr(s, attr) or "0"
+            return int(re.sub(r"\D", "", str(value)) or 0)
+        return FakeQuery(sorted(self, key=key))
+
+    def desc(self):
+        return FakeQuery(reversed(self))
+
+    def asc(self):
+        return self
+
+    def first(self):
+        return self[0] if self else None
+
+    def get_highest_resolution(self):
+        return self.filter(progressive=True).order_by("resolution").desc().first()
+
+
+class FakeYouTube:
+    """Stand-in `pytubefix.YouTube`: semua video menunjuk ke media sintetis di `MEDIA_URL`."""
+
+    MEDIA_URL = os.environ.get("BENCH_MEDIA_URL", "")
+    MEDIA = {"video": "video-16.mkv", "audio": "audio-2.mkv", "progressive": "prog-8.mkv"}
+    METADATA_LATENCY = float(os.environ.get("BENCH_METADATA_LATENCY_MS", 0)) / 1000.0
+
+    def __init__(self, url, *args, on_progress_callback=None, on_complete_callback=None, **kwargs):
+        if self.METADATA_LATENCY:
+            time.sleep(self.METADATA_LATENCY)
+        m = re.search(r"(?:v=|youtu\.be/)([\w-]{6,})", url)
+        self.video_id = m.group(1) if m else "benchvideo"
+        self.watch_url = url
+        self.title = f"Bench {self.video_id}"
+        self.author = "bench"
+        self.length = 60
+        self.thumbnail_url = ""
+        self.on_progress = on_progress_callback
+        self.on_complete = on_complete_callback
+        base = self.MEDIA_URL
+        v, a, p = (base + self.MEDIA[k] for k in ("video", "audio", "progressive"))
+        mkv = "video/webm"  # Matroska; ekstensi .webm seperti stream VP9 asli
+        self.streams = FakeQuery([
+            FakeStream(self, p, "video/mp4", "720p", progressive=True, video_codec="rawvideo", audio_codec="pcm_s16le"),
+            FakeStream(self, p, "video/mp4", "360p", progressive=True, video_codec="rawvideo", audio_codec="pcm_s16le"),
+            FakeStream(self, v, mkv, "2160p", video_codec="rawvideo"),
+            FakeStream(self, v, mkv, "1080p", video_codec="rawvideo"),
+            FakeStream(self, a, "audio/webm", abr="128kbps", only_audio=True, audio_codec="pcm_s16le"),
+        ])
+
+    def register_on_progress_callback(self, fn):
+        self.on_progress = fn
+
+    def register_on_complete_callback(self, fn):
+        self.on_complete = fn
+
+
+def media_folder():
+    folder = os.path.join(tempfile.gettempdir(), "cibenyt-bench-media")
+    os.makedirs(folder, exist_ok=True)
+    return folder
@@ -0,0 +1,99 @@
+"""
+Build aset statis halaman utama ke static/dist/ (dijalankan saat deploy, bukan per request).
+
+- CSS: Tailwind dipurge sesuai class yang dipakai di cibenyt.py & static/app.js,
+  digabung dengan static/app.css, lalu diminify.
+- JS: static/app.js diminify (esbuild) lalu digabung dengan Alpine versi tetap.
+- Nama file berisi hash isi (app.<hash>.css/js) + varian .gz dan .br, plus manifest.json
+  yang dibaca cibenyt saat start. Tanpa static/dist/ halaman kembali memakai CDN.
+
+    python build_assets.py      # butuh Node (npx); paket diunduh saat build pertama
+"""
+import gzip, hashlib, json, os, shutil, subprocess, sys, tempfile, urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC = os.path.join(ROOT, "static")
+DIST = os.path.join(STATIC, "dist")
+TAILWIND = "tailwindcss@3.4.17"
+ESBUILD = "esbuild@0.24.0"
+ALPINE_URL = "https://unpkg.com/alpinejs@3.14.1/dist/cdn.min.js"
+
+
+def npx(*args):
+    subprocess.run(["npx", "--yes", *args], check=True, cwd=ROOT)
+
+
+def build_css(tmp):
+    src = os.path.join(tmp, "input.css")
+    with open(os.path.join(STATIC, "app.css")) as f, open(src, "w") as out:
+        out.write("@tailwind base;\n@tailwind components;\n@tailwind utilities;\n" + f.read())
+    config = os.path.join(tmp, "tailwind.config.js")
+    content = [os.path.join(ROOT, "cibenyt.py"), os.path.join(STATIC, "app.js")]
+    with open(config, "w") as f:
+        # darkMode 'class': tema diatur tombol di halaman (class .dark di <html>)
+        f.write(f"module.exports = {{content: {json.dumps(content)}, darkMode: 'class'}};\n")
+    out = os.path.join(tmp, "app.css")
+    npx(TAILWIND, "-c", config, "-i", src, "-o", out, "--minify")
+    with open(out, "rb") as f:
+        return f.read()
+
+
+def build_js(tmp):
+    out = os.path.join(tmp, "app.js")
+    npx(ESBUILD, os.path.join(STATIC, "app.js"), "--minify", f"--outfile={out}")
+    with open(out, "rb") as f:
+        app_js = f.read()
+    with urllib.request.urlopen(ALPINE_URL) as resp:
+        alpine = resp.read()
+    # app() harus sudah ada sebelum Alpine mulai
+    return app_js + b";\n" + alpine
+
+
+def brotli_compress(data):
+    try:
+        import brotli
+        return brotli.compress(data, quality=11)
+    except ImportError:
+        pass
+    if shutil.which("brotli"):
+        return subprocess.run(["brotli", "-c", "-q", "11"], input=data, stdout=subprocess.PIPE, check=True).stdout
+    return None
+
+
+def write_asset(name, data):
+    stem, ext = os.path.splitext(name)
+    built = f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+    path = os.path.join(DIST, built)
+    with open(path, "wb") as f:
+        f.write(data)
+    sizes = {"raw": len(data)}
+    with open(path + ".gz", "wb") as f:
+        gz = gzip.compress(data, 9, mtime=0)
+        f.write(gz)
+        sizes["gzip"] = len(gz)
+    br = brotli_compress(data)
+    if br is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(br)
+        sizes["br"] = len(br)
+    else:
+        print("peringatan: brotli tidak tersedia, hanya .gz yang dibuat", file=sys.stderr)
+    return built, sizes
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        css = build_css(tmp)
+        js = build_js(tmp)
+    shutil.rmtree(DIST, ignore_errors=True)
+    os.makedirs(DIST)
+    manifest, report = {}, {}
+    for name, data in (("app.css", css), ("app.js", js)):
+        manifest[name], report[name] = write_asset(name, data)
+    with open(os.path.join(DIST, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(json.dumps({"manifest": manifest, "bytes": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,3244 @@
-from flask import Flask, request, render_template_string, send_file
-from pytubefix import YouTube
+from flask import Flask, request, render_template, send_file, jsonify, redirect, Response
+from werkzeug.http import parse_range_header, is_resource_modified, http_date, parse_date
+from werkzeug.security import safe_join
+from urllib.parse import quote
+from datetime import datetime, timezone
+from pytubefix import YouTube, Playlist
+from pytubefix import exceptions as pytube_exceptions
 import os, re, platform, shutil, tempfile, subprocess
+import queue, threading, time, uuid, json
+import urllib.request, urllib.error, http.client, random
+import sqlite3, hashlib, logging, tarfile, zipfile, mimetypes, atexit, contextlib
+from collections import OrderedDict, deque
 
-app = Flask(__name__)
+# folder static/ disajikan oleh route /assets sendiri (varian .br/.gz & cache panjang)
+app = Flask(__name__, static_folder=None)
+log = logging.getLogger("cibenyt")
+
+# ---------- Konfigurasi (bisa diatur lewat environment) ----------
+# Jumlah worker yang menjalankan job unduh secara paralel; sesuaikan dengan core & uplink.
+JOB_WORKERS = int(os.environ.get("CIBEN_JOB_WORKERS", os.cpu_count() or 2))
+# Maksimum job yang boleh menunggu di antrean sebelum request baru ditolak.
+JOB_QUEUE_MAX = int(os.environ.get("CIBEN_JOB_QUEUE_MAX", 32))
+# Berapa lama (detik) job yang sudah selesai tetap bisa ditanyakan statusnya.
+JOB_TTL = int(os.environ.get("CIBEN_JOB_TTL", 3600))
+# Retry job yang gagal karena gangguan sementara: jumlah percobaan ulang dan backoff (detik).
+JOB_RETRIES = int(os.environ.get("CIBEN_JOB_RETRIES", 4))
+RETRY_BASE_DELAY = float(os.environ.get("CIBEN_RETRY_BASE_DELAY", 2))
+RETRY_MAX_DELAY = float(os.environ.get("CIBEN_RETRY_MAX_DELAY", 60))
+# Batch/playlist: job paralel per batch dan jumlah item maksimum setelah playlist diurai.
+BATCH_CONCURRENCY = int(os.environ.get("CIBEN_BATCH_CONCURRENCY", JOB_WORKERS))
+BATCH_MAX_ITEMS = int(os.environ.get("CIBEN_BATCH_MAX_ITEMS", 1000))
+# Jumlah koneksi paralel per stream dan ukuran tiap potongan Range (MB).
+RANGED_CONNECTIONS = int(os.environ.get("CIBEN_RANGED_CONNECTIONS", 4))
+RANGED_CHUNK_MB = int(os.environ.get("CIBEN_RANGED_CHUNK_MB", 8))
+# Scheduler transfer: anggaran bandwidth global & per klien (Mbps, 0 = tanpa batas), dan
+# batas total byte yang sedang ditransfer (MB, 0 = tanpa batas) untuk admission control.
+BANDWIDTH_MBPS = float(os.environ.get("CIBEN_BANDWIDTH_MBPS", 0))
+CLIENT_BANDWIDTH_MBPS = float(os.environ.get("CIBEN_CLIENT_BANDWIDTH_MBPS", 0))
+MAX_INFLIGHT_MB = int(os.environ.get("CIBEN_MAX_INFLIGHT_MB", 0))
+# Cache metadata/manifest stream per video ID (URL stream YouTube kedaluwarsa ~6 jam).
+METADATA_CACHE_SIZE = int(os.environ.get("CIBEN_METADATA_CACHE_SIZE", 256))
+METADATA_CACHE_TTL = int(os.environ.get("CIBEN_METADATA_CACHE_TTL", 1800))
 
 # ---------- Utilities ----------
 def safe_filename(name):
     return re.sub(r'[\\/*?:"<>|]', "", name).strip() or "video"
 
-def get_download_folder():
-    system = platform.system().lower()
-    if "linux" in system:  # termasuk Android (Termux)
-        path = os.path.expanduser("~/storage/shared/YTDownloads")
-    elif "windows" in system:
-        path = os.path.join(os.path.expanduser("~/Downloads"), "YTDownloads")
-    else:
-        path = os.path.join(os.path.expanduser("~"), "Downloads", "YTDownloads")
-    os.makedirs(path, exist_ok=True)
-    return path
+def get_download_folder():
+    system = platform.system().lower()
+    if "linux" in system:  # termasuk Android (Termux)
+        path = os.path.expanduser("~/storage/shared/YTDownloads")
+    elif "windows" in system:
+        path = os.path.join(os.path.expanduser("~/Downloads"), "YTDownloads")
+    else:
+        path = os.path.join(os.path.expanduser("~"), "Downloads", "YTDownloads")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+DOWNLOAD_FOLDER = get_download_folder()
+# Cara menyajikan /download/...: "" (Python/wsgi.file_wrapper, zero-copy bila server mendukung),
+# "x-accel" (nginx X-Accel-Redirect) atau "x-sendfile" (Apache/lighttpd X-Sendfile).
+DOWNLOAD_OFFLOAD = os.environ.get("CIBEN_DOWNLOAD_OFFLOAD", "").lower()
+# Prefix lokasi internal nginx yang menunjuk ke DOWNLOAD_FOLDER (mode x-accel).
+ACCEL_PREFIX = os.environ.get("CIBEN_ACCEL_PREFIX", "/protected-downloads/")
+# Thread ffmpeg per job saat terpaksa transcode (0 = otomatis) dan preset x264-nya.
+FFMPEG_THREADS = int(os.environ.get("CIBEN_FFMPEG_THREADS", 0))
+X264_PRESET = os.environ.get("CIBEN_X264_PRESET", "veryfast")
+# Konversi audio (MP3/Opus/AAC/FLAC): jumlah encode ffmpeg bersamaan, thread per encode,
+# dan parameter loudnorm untuk target '+norm'.
+TRANSCODE_WORKERS = int(os.environ.get("CIBEN_TRANSCODE_WORKERS", os.cpu_count() or 2))
+TRANSCODE_THREADS = int(os.environ.get("CIBEN_TRANSCODE_THREADS", 1))
+LOUDNORM = os.environ.get("CIBEN_LOUDNORM", "I=-16:TP=-1.5:LRA=11")
+# Mode stream: hasil merge yang dikirim langsung ke klien juga disimpan ke disk untuk cache.
+STREAM_TEE = os.environ.get("CIBEN_STREAM_TEE", "1") == "1"
+# Stream (/stream) yang boleh berjalan bersamaan per proses: tiap stream = dua unduhan + satu ffmpeg.
+STREAM_WORKERS = int(os.environ.get("CIBEN_STREAM_WORKERS", 8))
+# Job yang lebih lama dari ini (detik) dicatat di log beserta rincian per fase; 0 = nonaktif.
+SLOW_JOB_SECONDS = float(os.environ.get("CIBEN_SLOW_JOB_SECONDS", 0))
+# Storage: kuota folder unduhan (MB, 0 = tanpa batas), umur maksimum file sejak terakhir
+# diunduh (hari, 0 = selamanya), ruang kosong minimum yang dijaga (MB), interval janitor
+# (detik) dan umur file sementara yang dianggap yatim (jam).
+STORAGE_QUOTA_MB = int(os.environ.get("CIBEN_STORAGE_QUOTA_MB", 0))
+STORAGE_MAX_AGE_DAYS = float(os.environ.get("CIBEN_STORAGE_MAX_AGE_DAYS", 0))
+STORAGE_RESERVE_MB = int(os.environ.get("CIBEN_STORAGE_RESERVE_MB", 256))
+JANITOR_INTERVAL = int(os.environ.get("CIBEN_JANITOR_INTERVAL", 300))
+ORPHAN_HOURS = float(os.environ.get("CIBEN_ORPHAN_HOURS", 24))
+# Staging di filesystem yang sama dengan folder unduhan, jadi finalisasi cukup rename.
+STAGING_DIR = os.path.join(DOWNLOAD_FOLDER, ".staging")
+os.makedirs(STAGING_DIR, exist_ok=True)
+# Index hasil unduhan: (video ID, kualitas, container) -> file di DOWNLOAD_FOLDER.
+RESULT_DB = os.environ.get("CIBEN_RESULT_DB", os.path.join(DOWNLOAD_FOLDER, ".cibenyt-index.sqlite3"))
+# Store job: "memory" (satu proses) atau "sqlite" / "sqlite:///path" (bersama antar worker gunicorn).
+JOB_STORE_SPEC = os.environ.get("CIBEN_JOB_STORE", "memory")
+# Saat shutdown: lama (detik) menunggu job yang berjalan selesai sebelum ffmpeg dimatikan.
+DRAIN_TIMEOUT = float(os.environ.get("CIBEN_DRAIN_TIMEOUT", 30))
+
+def valid_youtube_url(url):
+    pattern = r"(https?://)?(www\.)?(youtube\.com/watch\?v=|youtu\.be/)[\w-]+"
+    return re.match(pattern, url)
+
+def valid_playlist_url(url):
+    return re.match(r"(https?://)?(www\.)?youtube\.com/(playlist|watch)\?\S*list=[\w-]+", url)
+
+def extract_video_id(url):
+    # sama dengan getter `videoId` di front-end
+    m = re.search(r"(?:v=|youtu\.be/)([\w-]{6,})", url or "")
+    return m.group(1) if m else None
+
+def parse_timestamp(value):
+    """'90', '1:30', '01:02:03.5' -> detik (float); kosong -> None."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    if not re.match(r"^\d+(:\d{1,2}){0,2}(\.\d+)?$", value):
+        raise ValueError(f"Waktu tidak valid: {value}")
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def clip_quality(quality, start=None, end=None):
+    """
+    Tambahkan rentang klip ke string kualitas: 'v:1080p' + 90..120 -> 'v:1080p@90-120'.
+    String ini jadi kunci job, single-flight dan index hasil, jadi klip berbeda tidak saling pakai.
+    """
+    start = start or 0
+    if not start and end is None:
+        # "dari 0 sampai habis" = video utuh: kunci yang sama dengan tanpa klip
+        return quality
+    if end is not None and end <= start:
+        raise ValueError("Waktu selesai harus setelah waktu mulai.")
+    return f"{quality}@{start:g}-{'' if end is None else f'{end:g}'}"
+
+def split_clip(quality):
+    """'v:1080p@90-120' -> ('v:1080p', (90.0, 120.0)); tanpa klip -> (quality, None)."""
+    m = re.match(r"^(.*)@(\d+(?:\.\d+)?)-(\d+(?:\.\d+)?)?$", quality)
+    if not m:
+        return quality, None
+    return m.group(1), (float(m.group(2)), float(m.group(3)) if m.group(3) else None)
+
+def clean_youtube_url(url):
+    if "youtu.be" in url:
+        return url.split("?")[0]
+    elif "youtube.com/watch" in url:
+        return url.split("&")[0]
+    return url
+
+def staging_path(final_path):
+    """
+    Nama sementara di folder yang sama dengan `final_path` (ekstensi tetap, supaya
+    ffmpeg mengenali container). File ditulis ke sini lalu `os.replace` ke nama akhir,
+    jadi pembaca tidak pernah melihat file setengah jadi.
+    """
+    folder, name = os.path.split(final_path)
+    base, ext = os.path.splitext(name)
+    return os.path.join(folder, f".{base}.{uuid.uuid4().hex[:8]}.tmp{ext}")
+
+def finalize(tmp_path, final_path):
+    os.replace(tmp_path, final_path)
+    return final_path
+
+# ---------- FFmpeg: kapabilitas & rencana merge ----------
+_ffmpeg_caps = None
+_ffmpeg_caps_lock = threading.Lock()
+
+def _ffmpeg_list(path, flag):
+    """Nama muxer/encoder dari `ffmpeg -muxers` / `-encoders` (baris setelah garis pemisah)."""
+    out = subprocess.run([path, "-hide_banner", flag], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    names, started = set(), False
+    for line in out.splitlines():
+        if line.strip().startswith("--"):
+            started = True
+            continue
+        parts = line.split()
+        if started and len(parts) >= 2:
+            names.update(parts[1].split(","))
+    return names
+
+def ffmpeg_caps():
+    """Probe ffmpeg sekali saja: path, versi, muxer & encoder yang tersedia, dan ffprobe."""
+    global _ffmpeg_caps
+    with _ffmpeg_caps_lock:
+        if _ffmpeg_caps is None:
+            path = shutil.which("ffmpeg")
+            caps = {"available": False, "path": None, "version": None, "muxers": set(), "encoders": set(), "ffprobe": None}
+            if path:
+                try:
+                    version = subprocess.run([path, "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+                    caps.update(
+                        available=True,
+                        path=path,
+                        version=(version.splitlines() or [""])[0],
+                        muxers=_ffmpeg_list(path, "-muxers"),
+                        encoders=_ffmpeg_list(path, "-encoders"),
+                        ffprobe=shutil.which("ffprobe"),
+                    )
+                except OSError:
+                    pass
+            _ffmpeg_caps = caps
+        return _ffmpeg_caps
+
+def ffmpeg_available():
+    return ffmpeg_caps()["available"]
+
+# probe di background saat start supaya request pertama tidak menunggu
+threading.Thread(target=ffmpeg_caps, name="probe-ffmpeg", daemon=True).start()
+
+# Codec (nama keluarga) yang bisa di-remux tanpa re-encode ke tiap container
+MP4_VIDEO = {"avc1", "hvc1", "av01", "vp09"}
+MP4_AUDIO = {"mp4a", "mp3", "ac-3", "ec-3"}
+WEBM_VIDEO = {"vp8", "vp09", "av01"}
+WEBM_AUDIO = {"opus", "vorbis"}
+_CODEC_ALIASES = {
+    "h264": "avc1", "avc3": "avc1", "hevc": "hvc1", "hev1": "hvc1", "h265": "hvc1",
+    "vp9": "vp09", "av1": "av01", "aac": "mp4a", "ac3": "ac-3", "eac3": "ec-3",
+}
+CONTAINERS = {
+    "mp4": (".mp4", "video/mp4"),
+    "webm": (".webm", "video/webm"),
+    "matroska": (".mkv", "video/x-matroska"),
+}
+
+def codec_family(codec):
+    """'avc1.640028' / 'h264' / 'vp9' -> nama keluarga yang seragam ('avc1', 'vp09', ...)."""
+    if not codec:
+        return None
+    name = codec.lower().split(".")[0].strip()
+    return _CODEC_ALIASES.get(name, name)
+
+def probe_codec(path):
+    """Codec track pertama di file lewat ffprobe; None bila ffprobe tidak ada atau gagal."""
+    ffprobe = ffmpeg_caps()["ffprobe"]
+    if not ffprobe:
+        return None
+    try:
+        out = subprocess.run(
+            [ffprobe, "-v", "error", "-show_entries", "stream=codec_name", "-of", "json", path],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True,
+        ).stdout
+        return json.loads(out)["streams"][0].get("codec_name")
+    except (OSError, ValueError, KeyError, IndexError, subprocess.CalledProcessError):
+        return None
+
+def stream_codec(stream, kind):
+    # pytubefix sudah mengurai codec dari mime, mis. 'video/mp4; codecs="avc1.640028"'
+    return getattr(stream, "video_codec" if kind == "video" else "audio_codec", None)
+
+def plan_merge(v_codec, a_codec, transcode_ok=True):
+    """
+    Pilih target merge untuk pasangan codec. Remux lossless bila memungkinkan:
+    MP4 (paling kompatibel) -> WebM -> Matroska (muat hampir semua codec).
+    Bila tetap harus transcode, hanya track yang tidak cocok dengan MP4 yang di-encode ulang.
+    """
+    muxers = ffmpeg_caps()["muxers"]
+    v, a = codec_family(v_codec), codec_family(a_codec)
+    if v in MP4_VIDEO and a in MP4_AUDIO and "mp4" in muxers:
+        return {"container": "mp4", "video": "copy", "audio": "copy"}
+    if v in WEBM_VIDEO and a in WEBM_AUDIO and "webm" in muxers:
+        return {"container": "webm", "video": "copy", "audio": "copy"}
+    if "matroska" in muxers or not transcode_ok:
+        return {"container": "matroska", "video": "copy", "audio": "copy"}
+    return transcode_plan(v, a)
+
+def transcode_plan(v, a, full=False):
+    encoders = ffmpeg_caps()["encoders"]
+    v_enc = "libx264" if "libx264" in encoders else "mpeg4"
+    return {
+        "container": "mp4",
+        "video": "copy" if (v in MP4_VIDEO and not full) else v_enc,
+        "audio": "copy" if (a in MP4_AUDIO and not full) else "aac",
+    }
+
+def _merge_cmd(video_path, audio_path, plan, out_path):
+    cmd = ["ffmpeg", "-y", "-i", video_path, "-i", audio_path, "-map", "0:v:0", "-map", "1:a:0"]
+    cmd += ["-c:v", plan["video"]]
+    if plan["video"] == "libx264":
+        cmd += ["-preset", X264_PRESET, "-crf", "20"]
+    cmd += ["-c:a", plan["audio"]]
+    if plan["audio"] != "copy":
+        cmd += ["-b:a", "192k"]
+    if plan["video"] != "copy" or plan["audio"] != "copy":
+        cmd += ["-threads", str(FFMPEG_THREADS)]
+    if plan["container"] == "mp4":
+        cmd += ["-movflags", "+faststart"]
+    cmd += ["-f", plan["container"], out_path]
+    return cmd
+
+_children = set()
+_children_lock = threading.Lock()
+
+def spawn(cmd, **kwargs):
+    """Popen yang dicatat, supaya `drain()` bisa menghentikan ffmpeg yang masih jalan saat shutdown."""
+    proc = subprocess.Popen(cmd, **kwargs)
+    with _children_lock:
+        for done in [p for p in _children if p.poll() is not None]:
+            _children.discard(done)
+        _children.add(proc)
+    return proc
+
+def kill_children(grace=5):
+    with _children_lock:
+        procs = [p for p in _children if p.poll() is None]
+    for proc in procs:
+        proc.terminate()
+    deadline = time.monotonic() + grace
+    for proc in procs:
+        try:
+            proc.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+    if procs:
+        log.info("drain: %d proses ffmpeg dihentikan", len(procs))
+
+def _run_ffmpeg(cmd, on_progress=None):
+    """Jalankan ffmpeg dengan `-progress pipe:1`, teruskan out_time (mikrodetik) ke `on_progress`."""
+    cmd = cmd[:1] + ["-hide_banner", "-loglevel", "warning", "-nostats", "-progress", "pipe:1"] + cmd[1:]
+    proc = spawn(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    # stderr dibaca di thread sendiri agar pipe-nya tidak penuh selagi progres dibaca;
+    # isinya dipakai classify_error. Level "warning" karena status selain 403/404 (mis.
+    # "HTTP error 410 Gone") hanya muncul sebagai warning; di level error cuma "4XX Client Error".
+    errors = []
+    reader = threading.Thread(target=lambda: errors.append(proc.stderr.read()), daemon=True)
+    reader.start()
+    try:
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            if key == "out_time_us" and on_progress and value.isdigit():
+                on_progress(int(value))
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+        reader.join()
+        proc.stderr.close()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, stderr="".join(errors)[-4000:])
+
+def merge_av(video_path, audio_path, out_basename, v_mime="video/mp4", a_mime="audio/mp4", v_codec=None, a_codec=None,
+             progress=None, duration=None):
+    """
+    Gabungkan video+audio menggunakan ffmpeg.
+    - Codec diambil dari metadata stream (atau ffprobe), lalu `plan_merge` memilih container
+      yang bisa di-remux dengan -c copy: MP4, WebM, atau MKV.
+    - Bila copy tetap gagal, hanya track yang tidak cocok dengan MP4 yang di-encode ulang;
+      re-encode penuh adalah upaya terakhir.
+    - Progres (`-progress`) dilaporkan ke `progress` dalam mikrodetik dari `duration` detik.
+    """
+    v_codec = v_codec or probe_codec(video_path)
+    a_codec = a_codec or probe_codec(audio_path)
+    if v_codec is None and a_codec is None:
+        # tanpa info codec: tebak dari MIME seperti sebelumnya
+        v_codec = "avc1" if "mp4" in (v_mime or "") else None
+        a_codec = "mp4a" if "mp4" in (a_mime or "") else None
+
+    plans = [plan_merge(v_codec, a_codec)]
+    for fallback in (transcode_plan(codec_family(v_codec), codec_family(a_codec)),
+                     transcode_plan(None, None, full=True)):
+        if fallback not in plans:
+            plans.append(fallback)
+
+    for i, plan in enumerate(plans):
+        ext = CONTAINERS[plan["container"]][0]
+        out_path = os.path.join(DOWNLOAD_FOLDER, out_basename + ext)
+        tmp_path = staging_path(out_path)
+        t0 = time.perf_counter()
+        total_us = int(duration * 1e6) if duration else 0
+        if progress:
+            progress.phase("merge", total_us)
+        try:
+            _run_ffmpeg(_merge_cmd(video_path, audio_path, plan, tmp_path),
+                        (lambda us: progress.update(min(us, total_us) if total_us else us)) if progress else None)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            log.warning("merge gagal: codecs=%s/%s plan=%s (%.2fs)", v_codec, a_codec, plan, time.perf_counter() - t0)
+            METRICS.inc("cibenyt_merge_fallback_total", from_container=plan["container"])
+            if i == len(plans) - 1:
+                raise
+            continue
+        log.info("merge %s: codecs=%s/%s plan=%s %.2fs", out_basename, v_codec, a_codec, plan, time.perf_counter() - t0)
+        mode = "copy" if plan["video"] == plan["audio"] == "copy" else "transcode"
+        METRICS.inc("cibenyt_merges_total", mode=mode, container=plan["container"])
+        return finalize(tmp_path, out_path)
+
+def clip_stream(stream, out_path, start, end=None, progress=None):
+    """
+    Potong satu stream langsung dari URL-nya dengan ffmpeg: `-ss` sebelum `-i` membuat
+    ffmpeg mencari lewat index container (moov/Cues) dan hanya meminta byte Range di
+    sekitar jendela klip; mulai dari keyframe terdekat sebelum `start` lalu `-c copy`.
+    """
+    cmd = ["ffmpeg", "-y", "-user_agent", HTTP_HEADERS["User-Agent"], "-ss", f"{start:.3f}"]
+    if end is not None:
+        cmd += ["-t", f"{end - start:.3f}"]
+    cmd += ["-i", stream.url, "-map", "0", "-c", "copy", "-avoid_negative_ts", "make_zero"]
+    if out_path.endswith((".mp4", ".m4a")):
+        cmd += ["-movflags", "+faststart"]
+    duration = (end if end is not None else start) - start
+    total_us = int(duration * 1e6)
+    if progress:
+        progress.phase("clip", total_us)
+    tmp_path = staging_path(out_path)
+    t0 = time.perf_counter()
+    try:
+        _run_ffmpeg(cmd + [tmp_path], (lambda us: progress.update(min(us, total_us or us))) if progress else None)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    log.info("klip %s %.1f-%s: %.2fs", os.path.basename(out_path), start, end, time.perf_counter() - t0)
+    return finalize(tmp_path, out_path)
+
+def keyframe_before(url, t):
+    """Waktu (detik) keyframe video terakhir <= `t`: paket pertama setelah seek, dengan timestamp asli."""
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "warning", "-user_agent", HTTP_HEADERS["User-Agent"],
+           "-ss", f"{t:.3f}", "-i", url, "-map", "0:v:0", "-c", "copy", "-copyts", "-frames:v", "1",
+           "-f", "framecrc", "-"]
+    proc = spawn(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    out, err = proc.communicate()
+    if proc.returncode and _FFMPEG_HTTP_STATUS.search(err):
+        # URL ditolak/kedaluwarsa: biar job me-resolve ulang, jangan diam-diam memotong dari `t`
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=err)
+    timebase = None
+    for line in out.splitlines():
+        if line.startswith("#tb 0:"):
+            num, _, den = line.split(":", 1)[1].strip().partition("/")
+            timebase = int(num) / int(den)
+        elif line and not line.startswith("#") and timebase:
+            # framecrc: stream, dts, pts, durasi, ukuran, crc
+            return int(line.split(",")[2]) * timebase
+    return None
+
+def clip_av(v_stream, a_stream, out_basename, start, end=None, progress=None):
+    """
+    Klip adaptive dalam satu proses ffmpeg: dua input `-ss ... -i url` (seperti `stream_merge`)
+    langsung di-mux dengan -c copy. Tanpa re-encode, video hanya bisa mulai di keyframe, jadi
+    kedua input dipotong dari keyframe terakhir sebelum `start`; bila audio dipotong tepat di
+    `start`, track video yang mulai lebih awal membuat audio tergeser. Mengembalikan
+    (path hasil, detik awal sebenarnya).
+    """
+    keyframe = keyframe_before(v_stream.url, start)
+    cut = start if keyframe is None else min(start, keyframe)
+    if cut < start:
+        log.info("klip %s: mulai dari keyframe %.3fs (diminta %.3fs)", out_basename, cut, start)
+    # sedikit setelah timestamp keyframe supaya seek tidak jatuh ke keyframe sebelumnya karena pembulatan
+    seek = ["-ss", f"{cut + 0.001:.3f}"]
+    if end is not None:
+        seek += ["-t", f"{end - cut - 0.001:.3f}"]
+    http_in = ["-user_agent", HTTP_HEADERS["User-Agent"]]
+    plan = plan_merge(stream_codec(v_stream, "video"), stream_codec(a_stream, "audio"), transcode_ok=False)
+    out_path = os.path.join(DOWNLOAD_FOLDER, out_basename + CONTAINERS[plan["container"]][0])
+    tmp_path = staging_path(out_path)
+    cmd = ["ffmpeg", "-y", *http_in, *seek, "-i", v_stream.url, *http_in, *seek, "-i", a_stream.url,
+           "-map", "0:v:0", "-map", "1:a:0", "-c", "copy", "-avoid_negative_ts", "make_zero"]
+    if plan["container"] == "mp4":
+        cmd += ["-movflags", "+faststart"]
+    cmd += ["-f", plan["container"], tmp_path]
+    total_us = int(((end if end is not None else cut) - cut) * 1e6)
+    if progress:
+        progress.phase("clip", total_us)
+    t0 = time.perf_counter()
+    try:
+        _run_ffmpeg(cmd, (lambda us: progress.update(min(us, total_us or us))) if progress else None)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    log.info("klip a/v %s %.1f-%s: %.2fs", out_basename, cut, end, time.perf_counter() - t0)
+    METRICS.inc("cibenyt_merges_total", mode="copy", container=plan["container"])
+    return finalize(tmp_path, out_path), cut
+
+# ---------- Metrics ----------
+class Metrics:
+    """
+    Counter & histogram sederhana yang di-render dalam format teks Prometheus.
+    Di mode store bersama tiap proses menerbitkan `snapshot()`-nya ke store, dan /metrics
+    me-render gabungan semua proses (`render(snapshots)`), jadi counter tidak per worker.
+    """
+
+    SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+    RATE_BUCKETS = tuple(mb * 1024 * 1024 for mb in (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._gauges = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(h["buckets"]):
+                if value <= bound:
+                    h["counts"][i] += 1
+            h["sum"] += value
+            h["count"] += 1
+
+    def gauge(self, name, fn):
+        """Daftarkan gauge yang nilainya dihitung saat /metrics dibaca: fn() -> {labels_tuple: nilai} atau angka."""
+        self._gauges.append((name, fn))
+
+    @staticmethod
+    def _escape(value):
+        # format teks Prometheus: \, " dan baris baru di nilai label harus di-escape
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    @classmethod
+    def _labels(cls, labels, extra=()):
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{cls._escape(v)}"' for k, v in items) + "}"
+
+    def snapshot(self):
+        """Counter & histogram proses ini dalam bentuk yang bisa di-JSON-kan."""
+        with self._lock:
+            return {
+                "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, list(labels), dict(h, buckets=list(h["buckets"]), counts=list(h["counts"]))]
+                               for (name, labels), h in self._histograms.items()],
+            }
+
+    @staticmethod
+    def merge(snapshots):
+        """Jumlahkan beberapa `snapshot()` (mis. dari semua proses) menjadi satu snapshot."""
+        counters, histograms = {}, {}
+        for snap in snapshots:
+            for name, labels, value in snap["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, h in snap["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                total = histograms.get(key)
+                if total is None:
+                    histograms[key] = dict(h, counts=list(h["counts"]))
+                    continue
+                total["counts"] = [a + b for a, b in zip(total["counts"], h["counts"])]
+                total["sum"] += h["sum"]
+                total["count"] += h["count"]
+        return {
+            "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+            "histograms": [[name, list(labels), h] for (name, labels), h in histograms.items()],
+        }
+
+    def render(self, snapshots=None):
+        """Teks Prometheus dari counter proses ini, atau dari gabungan `snapshots` bila diberikan."""
+        lines = []
+        snap = self.merge(snapshots) if snapshots is not None else self.snapshot()
+        counters = sorted(((name, tuple(map(tuple, labels))), value) for name, labels, value in snap["counters"])
+        histograms = sorted((((name, tuple(map(tuple, labels))), h) for name, labels, h in snap["histograms"]),
+                            key=lambda kv: kv[0])
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{name}{self._labels(labels)} {value}")
+        for (name, labels), h in histograms:
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram")
+                seen.add(name)
+            for bound, count in zip(h["buckets"], h["counts"]):
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {h['count']}")
+            lines.append(f"{name}_sum{self._labels(labels)} {h['sum']}")
+            lines.append(f"{name}_count{self._labels(labels)} {h['count']}")
+        for name, fn in self._gauges:
+            lines.append(f"# TYPE {name} gauge")
+            value = fn()
+            for labels, v in (value.items() if isinstance(value, dict) else [((), value)]):
+                lines.append(f"{name}{self._labels(labels)} {v}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+
+def quality_type(quality):
+    # label metrik: "p" (progressive), "v" (adaptive), "a" (audio)
+    return (quality or "?").split(":", 1)[0]
+
+# ---------- Progres job ----------
+class Progress:
+    """
+    Status progres satu job (fase, byte, throughput). Update dari loop unduhan
+    dikoalesensi (paling sering tiap PROGRESS_INTERVAL detik) dan hanya menaikkan
+    nomor versi; pendengar SSE menunggu versi baru sendiri-sendiri, jadi berapa pun
+    jumlah pendengarnya, loop unduhan tidak pernah ikut menunggu.
+    """
+
+    PROGRESS_INTERVAL = 0.25
+
+    def __init__(self, quality=None):
+        self.quality_type = quality_type(quality)
+        # durasi per fase (detik) untuk metrik dan log job lambat
+        self.timings = {}
+        self._phase_name = "queued"
+        self._phase_started = time.perf_counter()
+        self._cond = threading.Condition()
+        self._lock = threading.Lock()
+        self.version = 0
+        self.state = {"phase": "queued", "bytes_done": 0, "total": 0, "rate": 0.0}
+        self._done = 0
+        self._total = 0
+        self._mark = (time.monotonic(), 0)
+        self._last_emit = 0.0
+        # dipanggil tiap state baru, mis. untuk menyimpan progres ke store job bersama
+        self.listener = None
+
+    def _emit(self, **extra):
+        now = time.monotonic()
+        t0, b0 = self._mark
+        rate = (self._done - b0) / (now - t0) if now > t0 else 0.0
+        self._mark = (now, self._done)
+        self._last_emit = now
+        with self._cond:
+            self.state = dict(self.state, bytes_done=self._done, total=self._total, rate=round(rate), **extra)
+            self.version += 1
+            self._cond.notify_all()
+        if self.listener:
+            self.listener()
+
+    def _end_phase(self):
+        elapsed = time.perf_counter() - self._phase_started
+        name = self._phase_name
+        self.timings[name] = self.timings.get(name, 0.0) + elapsed
+        METRICS.observe("cibenyt_phase_seconds", elapsed, phase=name, quality_type=self.quality_type)
+        if name in ("video", "audio") and self._done:
+            METRICS.inc("cibenyt_transfer_bytes_total", self._done, phase=name, quality_type=self.quality_type)
+            if elapsed > 0:
+                METRICS.observe("cibenyt_transfer_throughput_bytes_per_second", self._done / elapsed,
+                                buckets=Metrics.RATE_BUCKETS, phase=name)
+
+    def phase(self, name, total=0):
+        with self._lock:
+            self._end_phase()
+            self._phase_name, self._phase_started = name, time.perf_counter()
+            self._done, self._total = 0, total or 0
+            self._mark = (time.monotonic(), 0)
+            self._emit(phase=name)
+
+    def _set(self, done, total=None):
+        self._done = done
+        if total:
+            self._total = total
+        if time.monotonic() - self._last_emit >= self.PROGRESS_INTERVAL or done == self._total:
+            self._emit()
+
+    def update(self, done, total=None):
+        with self._lock:
+            self._set(done, total)
+
+    def advance(self, n):
+        # dipanggil dari beberapa koneksi Range sekaligus
+        with self._lock:
+            self._set(self._done + n)
+
+    def finish(self, status):
+        with self._lock:
+            if self._phase_name not in ("done", "error"):
+                self._end_phase()
+                self._phase_name = status
+            self._emit(phase=status)
+
+    def wait(self, version, timeout=15):
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version, timeout)
+            return self.version, dict(self.state)
+
+# pytubefix memanggil callback lewat objek YouTube (yang dipakai bersama lewat cache),
+# jadi callback diteruskan ke Progress milik thread yang sedang mengunduh.
+_progress_local = threading.local()
+
+def _on_pytube_progress(stream, chunk, bytes_remaining):
+    throttle = getattr(_progress_local, "throttle", None)
+    if throttle:
+        throttle(len(chunk))
+    progress = getattr(_progress_local, "progress", None)
+    if progress:
+        total = stream.filesize
+        progress.update(total - bytes_remaining, total)
+
+def _on_pytube_complete(stream, file_path):
+    progress = getattr(_progress_local, "progress", None)
+    if progress:
+        progress.update(stream.filesize, stream.filesize)
+
+# ---------- Scheduler bandwidth ----------
+class TokenBucket:
+    """Token bucket byte/detik; `consume` boleh berutang lalu tidur sebanyak utangnya (0 = tanpa batas)."""
+
+    def __init__(self, rate=0):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.tokens = 0.0
+        self.last = time.monotonic()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self.rate = rate
+            self.tokens = min(self.tokens, rate * 0.25)
+
+    def consume(self, n):
+        with self._lock:
+            if not self.rate:
+                return
+            now = time.monotonic()
+            # burst maksimal 250 ms
+            self.tokens = min(self.rate * 0.25, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+class BandwidthScheduler:
+    """
+    Membagi uplink ke semua transfer stream: satu bucket global plus bucket per klien
+    yang rate-nya = porsi adil (global / jumlah klien aktif), dibatasi batas per klien.
+    Admission control: transfer baru menunggu sampai total byte yang sedang berjalan
+    ditambah `filesize`-nya muat di `max_inflight`. Antrean admission FIFO: transfer besar
+    yang sedang menunggu menahan transfer yang datang belakangan, jadi tidak kelaparan
+    oleh transfer kecil yang terus masuk.
+
+    Di mode store bersama, transfer proses lain (`set_others`, disinkronkan tiap detik)
+    ikut dihitung: klien aktif di semua proses berbagi bandwidth global, porsi klien
+    dibagi antar proses menurut jumlah transfernya, dan byte in-flight-nya ikut admission.
+    """
+
+    def __init__(self, bandwidth_mbps=0, client_bandwidth_mbps=0, max_inflight_mb=0):
+        self._cond = threading.Condition()
+        self._global = TokenBucket()
+        self._clients = {}  # client -> {"bucket", "transfers", "bytes"}
+        self._inflight = 0
+        self._waiting = deque()  # tiket acquire yang menunggu, urut kedatangan
+        self._others = {"clients": {}, "inflight": 0}  # transfer di proses lain
+        self.configure(bandwidth_mbps, client_bandwidth_mbps, max_inflight_mb)
+
+    def configure(self, bandwidth_mbps=None, client_bandwidth_mbps=None, max_inflight_mb=None):
+        with self._cond:
+            if bandwidth_mbps is not None:
+                self.bandwidth = float(bandwidth_mbps) * 1e6 / 8
+            if client_bandwidth_mbps is not None:
+                self.client_bandwidth = float(client_bandwidth_mbps) * 1e6 / 8
+            if max_inflight_mb is not None:
+                self.max_inflight = int(max_inflight_mb) * 1024 * 1024
+            self._rebalance()
+            self._cond.notify_all()
+
+    def set_others(self, others):
+        """`{"clients": {client: jumlah transfer}, "inflight": byte}` milik proses lain."""
+        with self._cond:
+            self._others = others
+            self._rebalance()
+            self._cond.notify_all()
+
+    def usage(self):
+        with self._cond:
+            return {"clients": {client: c["transfers"] for client, c in self._clients.items()},
+                    "inflight": self._inflight}
+
+    def _client_rate(self):
+        active = {client for client, c in self._clients.items() if c["transfers"]} | set(self._others["clients"])
+        share = self.bandwidth / len(active) if self.bandwidth and active else 0
+        if share and self.client_bandwidth:
+            return min(share, self.client_bandwidth)
+        return share or self.client_bandwidth
+
+    def _rebalance(self):
+        rate = self._client_rate()
+        total = 0
+        for client, c in self._clients.items():
+            # klien yang juga mentransfer di proses lain: porsinya dibagi menurut jumlah transfer
+            elsewhere = self._others["clients"].get(client, 0)
+            share = rate * c["transfers"] / (c["transfers"] + elsewhere) if rate and c["transfers"] else rate
+            c["bucket"].set_rate(share)
+            total += share
+        # bucket global proses ini = jumlah porsi kliennya bila ada proses lain yang aktif
+        others_active = self._others["clients"] and self.bandwidth
+        self._global.set_rate(min(total, self.bandwidth) if others_active and total else self.bandwidth)
+
+    def _fits(self, size):
+        inflight = self._inflight + self._others["inflight"]
+        return not self.max_inflight or not inflight or inflight + size <= self.max_inflight
+
+    def acquire(self, client, size):
+        with self._cond:
+            ticket = object()
+            self._waiting.append(ticket)
+            try:
+                self._cond.wait_for(lambda: self._waiting[0] is ticket and self._fits(size))
+            finally:
+                self._waiting.remove(ticket)
+                # antrean berikutnya mungkin sudah muat
+                self._cond.notify_all()
+            self._inflight += size
+            c = self._clients.setdefault(client, {"bucket": TokenBucket(), "transfers": 0, "bytes": 0})
+            c["transfers"] += 1
+            self._rebalance()
+            return c
+
+    def release(self, client, size):
+        with self._cond:
+            self._inflight -= size
+            c = self._clients[client]
+            c["transfers"] -= 1
+            if not c["transfers"]:
+                del self._clients[client]
+            self._rebalance()
+            self._cond.notify_all()
+
+    def transfer(self, client, size):
+        """Context manager untuk satu transfer; hasilnya fungsi `throttle(n)` dipanggil tiap n byte diterima."""
+        scheduler = self
+
+        class _Transfer:
+            def __enter__(self):
+                self.c = scheduler.acquire(client, size)
+                return self.throttle
+
+            def throttle(self, n):
+                self.c["bytes"] += n
+                self.c["bucket"].consume(n)
+                scheduler._global.consume(n)
+
+            def __exit__(self, *exc):
+                scheduler.release(client, size)
+
+        return _Transfer()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "bandwidth_mbps": self.bandwidth * 8 / 1e6,
+                "client_bandwidth_mbps": self.client_bandwidth * 8 / 1e6,
+                "max_inflight_mb": self.max_inflight // (1024 * 1024),
+                "inflight_bytes": self._inflight,
+                "waiting": len(self._waiting),
+                "other_processes": {"clients": dict(self._others["clients"]), "inflight_bytes": self._others["inflight"]},
+                "clients": {
+                    client: {"transfers": c["transfers"], "rate_mbps": c["bucket"].rate * 8 / 1e6, "bytes": c["bytes"]}
+                    for client, c in self._clients.items()
+                },
+            }
+
+SCHEDULER = BandwidthScheduler(BANDWIDTH_MBPS, CLIENT_BANDWIDTH_MBPS, MAX_INFLIGHT_MB)
+METRICS.gauge("cibenyt_transfer_inflight_bytes", lambda: SCHEDULER.snapshot()["inflight_bytes"])
+
+def job_priority(quality):
+    """Urutan antrean: audio & klip lebih dulu, lalu progressive resolusi rendah, adaptive 4K terakhir."""
+    quality, clip = split_clip(quality)
+    quality, _ = split_policy(quality)
+    if quality.startswith("a:") or clip:
+        return 0
+    kind, _, res = quality.partition(":")
+    height = int(res.rstrip("p")) if res.rstrip("p").isdigit() else 720
+    return (1 if kind == "p" else 2) * 10000 + height
+
+# ---------- Klasifikasi error & retry ----------
+class RetryableError(RuntimeError):
+    """Gangguan sementara (jaringan putus, timeout, 429/5xx): job diulang dengan backoff."""
+
+class URLExpiredError(RetryableError):
+    """URL stream bertanda tangan kedaluwarsa/ditolak (403/410): metadata harus di-resolve ulang."""
+
+# error pytubefix yang hilang sendiri bila dicoba lagi; sisanya (video privat, dihapus, live, dll.) fatal
+_PYTUBE_RETRYABLE = tuple(
+    getattr(pytube_exceptions, name) for name in ("BotDetection", "MaxRetriesExceeded")
+    if hasattr(pytube_exceptions, name)
+)
+
+# ffmpeg yang membaca URL googlevideo langsung (klip): status HTTP hanya terlihat di stderr-nya
+_FFMPEG_HTTP_STATUS = re.compile(r"(?:Server returned|HTTP error) (\d{3})")
+_FFMPEG_NETWORK_ERROR = re.compile(
+    r"Server returned 5XX|Connection (?:timed out|reset|refused)|Operation timed out|End of file|I/O error")
+
+def _classify_status(code):
+    if code in (403, 410):
+        return "expired"
+    return "retry" if code in (408, 429) or code >= 500 else "fatal"
+
+def classify_error(exc):
+    """'retry' (backoff lalu ulang), 'expired' (resolve ulang YouTube(url) lalu ulang) atau 'fatal'."""
+    if isinstance(exc, URLExpiredError):
+        return "expired"
+    if isinstance(exc, urllib.error.HTTPError):
+        return _classify_status(exc.code)
+    if isinstance(exc, subprocess.CalledProcessError) and exc.stderr:
+        # diperlakukan sama seperti error urllib dengan status yang sama
+        m = _FFMPEG_HTTP_STATUS.search(exc.stderr)
+        if m:
+            return _classify_status(int(m.group(1)))
+        if _FFMPEG_NETWORK_ERROR.search(exc.stderr):
+            return "retry"
+    if isinstance(exc, (RetryableError, urllib.error.URLError, TimeoutError, ConnectionError,
+                        http.client.HTTPException) + _PYTUBE_RETRYABLE):
+        return "retry"
+    return "fatal"
+
+def backoff_delay(attempt):
+    # backoff eksponensial dengan full jitter: klien yang gagal bersamaan tidak mencoba serentak
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+# ---------- Ranged download engine ----------
+class RangeNotSupported(RuntimeError):
+    pass
+
+HTTP_HEADERS = {"User-Agent": "Mozilla/5.0", "Accept-Language": "en-US,en"}
+
+def _pwrite(fd, data, offset):
+    if hasattr(os, "pwrite"):
+        return os.pwrite(fd, data, offset)
+    # Windows: tidak ada pwrite, pakai file handle per thread (seek tidak dibagi)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.write(fd, data)
+
+def _preallocate(path, size):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        if os.fstat(fd).st_size != size:
+            if hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(fd, 0, size)
+                except OSError:
+                    os.ftruncate(fd, size)
+            else:
+                os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+def _load_checkpoint(ckpt_path, filesize, chunk_size):
+    """(potongan selesai, {potongan: offset byte berikutnya} untuk potongan yang terputus di tengah)."""
+    try:
+        with open(ckpt_path) as f:
+            data = json.load(f)
+        if data.get("filesize") == filesize and data.get("chunk_size") == chunk_size:
+            return set(data.get("done", [])), {int(k): v for k, v in data.get("partial", {}).items()}
+    except (OSError, ValueError):
+        pass
+    return set(), {}
+
+def _save_checkpoint(ckpt_path, filesize, chunk_size, done, partial=None):
+    tmp = ckpt_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"filesize": filesize, "chunk_size": chunk_size, "done": sorted(done),
+                   "partial": {str(k): v for k, v in (partial or {}).items()}}, f)
+    os.replace(tmp, ckpt_path)
+
+def _fetch_range(url, fd, start, end, timeout=30, on_bytes=None):
+    req = urllib.request.Request(url, headers=dict(HTTP_HEADERS, Range=f"bytes={start}-{end}"))
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        if resp.status != 206:
+            raise RangeNotSupported(f"Server tidak mendukung Range (HTTP {resp.status}).")
+        offset = start
+        while True:
+            buf = resp.read(256 * 1024)
+            if not buf:
+                break
+            view = memoryview(buf)
+            while view:
+                n = _pwrite(fd, view, offset)
+                offset += n
+                view = view[n:]
+            if on_bytes:
+                on_bytes(len(buf))
+    if offset != end + 1:
+        raise RetryableError(f"Potongan {start}-{end} terputus di byte {offset}.")
+
+def ranged_download(url, out_path, filesize, connections=None, chunk_size=None, retries=3, progress=None,
+                    throttle=None):
+    """
+    Unduh `url` ke `out_path` lewat beberapa koneksi HTTP Range paralel.
+    Data ditulis langsung di posisinya (pwrite) ke file `.part` yang sudah dialokasikan,
+    dan potongan yang selesai (plus offset potongan yang terputus di tengah) dicatat di
+    sidecar `.part.json` sehingga unduhan yang terputus bisa dilanjutkan dari byte terakhir.
+    URL yang ditolak (403/410) tidak dicoba ulang di sini: job perlu resolve ulang URL-nya.
+    """
+    connections = connections or RANGED_CONNECTIONS
+    chunk_size = chunk_size or RANGED_CHUNK_MB * 1024 * 1024
+    part_path = out_path + ".part"
+    ckpt_path = part_path + ".json"
+
+    _preallocate(part_path, filesize)
+    done, partial = _load_checkpoint(ckpt_path, filesize, chunk_size)
+    if progress:
+        progress.update(sum(min(chunk_size, filesize - i * chunk_size) for i in done)
+                        + sum(pos - i * chunk_size for i, pos in partial.items()), filesize)
+    n_chunks = (filesize + chunk_size - 1) // chunk_size
+    todo = queue.Queue()
+    for i in range(n_chunks):
+        if i not in done:
+            todo.put(i)
+
+    lock = threading.Lock()
+    errors = []
+    last_save = [time.monotonic()]
+
+    def on_bytes(n):
+        if throttle:
+            throttle(n)
+        if progress:
+            progress.advance(n)
+
+    def worker():
+        fd = os.open(part_path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+        try:
+            while not errors:
+                try:
+                    i = todo.get_nowait()
+                except queue.Empty:
+                    return
+                end = min((i + 1) * chunk_size, filesize) - 1
+                # lanjut dari byte terakhir yang tertulis, baik dari percobaan sebelumnya maupun checkpoint
+                pos = [partial.get(i, i * chunk_size)]
+
+                def on_chunk_bytes(n, i=i, pos=pos):
+                    pos[0] += n
+                    on_bytes(n)
+                    with lock:
+                        partial[i] = pos[0]
+                        # offset potongan yang sedang berjalan ikut dicatat berkala: proses yang
+                        # mati mendadak (kill/restart) kehilangan paling banyak ~1 detik data
+                        if time.monotonic() - last_save[0] >= 1.0:
+                            last_save[0] = time.monotonic()
+                            _save_checkpoint(ckpt_path, filesize, chunk_size, done, partial)
+
+                for attempt in range(retries):
+                    if pos[0] > end:
+                        # semua byte potongan sudah tertulis (mati sebelum ditandai selesai):
+                        # request `bytes=end+1-end` tidak valid dan akan gagal terus
+                        break
+                    try:
+                        _fetch_range(url, fd, pos[0], end, on_bytes=on_chunk_bytes)
+                        break
+                    except RangeNotSupported as e:
+                        errors.append(e)
+                        return
+                    except (urllib.error.URLError, OSError, http.client.HTTPException, RetryableError) as e:
+                        if attempt == retries - 1 or classify_error(e) != "retry":
+                            with lock:
+                                _save_checkpoint(ckpt_path, filesize, chunk_size, done, partial)
+                            errors.append(e)
+                            return
+                        time.sleep(0.5 * (attempt + 1))
+                with lock:
+                    done.add(i)
+                    partial.pop(i, None)
+                    _save_checkpoint(ckpt_path, filesize, chunk_size, done, partial)
+        finally:
+            os.close(fd)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, min(connections, todo.qsize())))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        if isinstance(errors[0], RangeNotSupported):
+            # tanpa Range tidak ada yang bisa dilanjutkan: buang file yang sudah dialokasikan penuh
+            # (pemanggil mengunduh ulang lewat stream.download())
+            for path in (part_path, ckpt_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        # selain itu .part dan checkpoint dibiarkan agar percobaan berikutnya bisa melanjutkan
+        raise errors[0]
+
+    os.replace(part_path, out_path)
+    try:
+        os.remove(ckpt_path)
+    except OSError:
+        pass
+    return out_path
+
+def fetch_stream(stream, output_path, filename, progress=None, client="-"):
+    """
+    Unduh satu stream pytubefix. Pakai engine Range paralel bila ukuran diketahui,
+    dan kembali ke `stream.download()` bila server menolak Range.
+    Progres dilaporkan ke `progress` (lihat `Progress`) bila diberikan; bandwidth
+    diatur oleh SCHEDULER atas nama `client`.
+    """
+    out_path = os.path.join(output_path, filename)
+    try:
+        filesize = stream.filesize
+        url = stream.url
+    except Exception:
+        filesize, url = 0, None
+    if progress and filesize:
+        progress.update(0, filesize)
+    with SCHEDULER.transfer(client, filesize or 0) as throttle:
+        if filesize and url:
+            try:
+                return ranged_download(url, out_path, filesize, progress=progress, throttle=throttle)
+            except RangeNotSupported:
+                if progress:
+                    progress.update(0)
+        tmp_path = staging_path(out_path)
+        _progress_local.progress = progress
+        _progress_local.throttle = throttle
+        try:
+            stream.download(output_path=output_path, filename=os.path.basename(tmp_path))
+        except Exception:
+            # file staging yang setengah jadi tidak boleh tertinggal (percobaan ulang mulai dari awal)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            _progress_local.progress = None
+            _progress_local.throttle = None
+        return finalize(tmp_path, out_path)
+
+# ---------- Metadata cache ----------
+class TTLCache:
+    """LRU sederhana dengan batas umur entri; aman dipakai dari banyak thread."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item and item[0] > time.time():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+METADATA_CACHE = TTLCache(METADATA_CACHE_SIZE, METADATA_CACHE_TTL)
+
+def sort_resolutions(streams):
+    return sorted(
+        list({s.resolution for s in streams if s.resolution}),
+        key=lambda x: int(x.replace('p','')), reverse=True
+    )
+
+def build_manifest(yt):
+    """Resolusi stream sekali saja: judul, tabel progressive/adaptive per resolusi, dan audio terbaik."""
+    # Kumpulkan progressive & adaptive
+    prog_streams = yt.streams.filter(progressive=True, file_extension='mp4')
+    # Adaptive video-only (hingga 4K)
+    adapt_streams = yt.streams.filter(adaptive=True, only_video=True)
+    progressive, adaptive = {}, {}
+    for st in prog_streams:
+        if st.resolution:
+            progressive.setdefault(st.resolution, st)
+    for st in adapt_streams:
+        if st.resolution:
+            adaptive.setdefault(st.resolution, st)
+    return {
+        "yt": yt,
+        "title": yt.title,
+        "progressive": progressive,
+        "progressive_res": sort_resolutions(prog_streams),
+        "adaptive": adaptive,
+        "adaptive_res": sort_resolutions(adapt_streams),
+        "best_audio": yt.streams.filter(only_audio=True).order_by("abr").desc().first(),
+        # semua kandidat, untuk dinilai `select_adaptive` & kawan-kawan sesuai policy
+        "progressive_streams": list(prog_streams),
+        "video_streams": list(adapt_streams),
+        "audio_streams": list(yt.streams.filter(only_audio=True)),
+    }
+
+def get_manifest(url):
+    video_id = extract_video_id(url)
+    manifest = METADATA_CACHE.get(video_id) if video_id else None
+    if manifest is None:
+        manifest = build_manifest(YouTube(url, on_progress_callback=_on_pytube_progress,
+                                          on_complete_callback=_on_pytube_complete))
+        manifest["video_id"] = video_id
+        if video_id:
+            METADATA_CACHE.set(video_id, manifest)
+    return manifest
+
+def forget_manifest(url):
+    # URL stream di manifest kedaluwarsa: percobaan berikutnya membuat YouTube(url) baru
+    video_id = extract_video_id(url)
+    if video_id:
+        METADATA_CACHE.pop(video_id)
+
+# ---------- Pemilihan stream ----------
+# Policy: "max_mb=200,prefer=remux,codec=av1+vp9,audio_kbps=128,max_fps=30"
+#   max_mb      batas total ukuran video+audio (MB)
+#   prefer      remux (pasangan yang bisa di-remux ke MP4), small (ukuran terkecil), quality (default)
+#   codec       urutan codec video yang disukai, dipisah '+', mis. av1 untuk file terkecil
+#   audio_kbps  bitrate audio minimum; dipilih yang terendah di atasnya, bukan yang tertinggi
+#   max_fps     batas frame rate
+POLICY_FIELDS = {"max_mb": float, "prefer": str, "codec": str, "audio_kbps": int, "max_fps": int}
+PREFER_VALUES = ("quality", "remux", "small")
+
+def parse_policy(spec):
+    """String 'k=v,k=v' atau dict -> dict policy yang sudah divalidasi (ValueError bila salah)."""
+    if isinstance(spec, dict):
+        items = spec.items()
+    else:
+        items = [part.split("=", 1) if "=" in part else (part, "") for part in (spec or "").split(",") if part.strip()]
+    policy = {}
+    for key, value in items:
+        key = str(key).strip()
+        if key not in POLICY_FIELDS:
+            raise ValueError(f"Policy tidak dikenal: {key}")
+        try:
+            policy[key] = POLICY_FIELDS[key](str(value).strip())
+        except ValueError:
+            raise ValueError(f"Nilai policy {key} tidak valid: {value}")
+    if policy.get("prefer", "quality") not in PREFER_VALUES:
+        raise ValueError(f"prefer harus salah satu dari {', '.join(PREFER_VALUES)}")
+    if "codec" in policy:
+        policy["codec"] = "+".join(codec_family(c) for c in policy["codec"].split("+") if c)
+    return policy
+
+def policy_spec(policy):
+    # bentuk kanonis: policy yang sama selalu menghasilkan kunci job/index yang sama
+    return ",".join(f"{k}={policy[k]:g}" if isinstance(policy[k], float) else f"{k}={policy[k]}" for k in sorted(policy))
+
+def with_policy(quality, spec):
+    """'v:1080p' + 'prefer=remux' -> 'v:1080p~prefer=remux' (kosong = policy default server)."""
+    policy = parse_policy(spec)
+    return f"{quality}~{policy_spec(policy)}" if policy else quality
+
+def split_policy(quality):
+    base, _, spec = quality.partition("~")
+    return base, parse_policy(spec) if spec else DEFAULT_POLICY
+
+DEFAULT_POLICY = parse_policy(os.environ.get("CIBEN_SELECT_POLICY", ""))
+
+def _height(stream):
+    m = re.match(r"(\d+)", getattr(stream, "resolution", None) or "")
+    return int(m.group(1)) if m else 0
+
+def _kbps(stream):
+    m = re.match(r"(\d+)", getattr(stream, "abr", None) or "")
+    return int(m.group(1)) if m else 0
+
+def size_hint(stream):
+    # filesize_approx dihitung dari bitrate x durasi, tanpa request HTTP per kandidat
+    try:
+        return int(getattr(stream, "filesize_approx", 0) or 0) or stream_size(stream)
+    except Exception:
+        return stream_size(stream)
+
+def describe_stream(stream):
+    return {
+        "itag": getattr(stream, "itag", None),
+        "mime": stream.mime_type,
+        "resolution": getattr(stream, "resolution", None),
+        "fps": getattr(stream, "fps", None),
+        "abr": getattr(stream, "abr", None),
+        "codec": stream_codec(stream, "video") or stream_codec(stream, "audio"),
+        "size": size_hint(stream),
+    }
+
+def remux_container(v_codec, a_codec):
+    """Container tujuan remux tanpa re-encode untuk pasangan codec."""
+    v, a = codec_family(v_codec), codec_family(a_codec)
+    if v in MP4_VIDEO and a in MP4_AUDIO:
+        return "mp4"
+    if v in WEBM_VIDEO and a in WEBM_AUDIO:
+        return "webm"
+    return "matroska"
+
+_REMUX_RANK = {"mp4": 2, "webm": 1, "matroska": 0}
+_MB = 1024 * 1024
+
+def _codec_rank(policy, codec):
+    order = policy.get("codec", "").split("+") if policy.get("codec") else []
+    family = codec_family(codec)
+    return len(order) - order.index(family) if family in order else 0
+
+def _audio_key(policy, a):
+    # dengan audio_kbps: yang terendah di atas batas; tanpa itu: bitrate tertinggi (perilaku lama)
+    kbps = _kbps(a)
+    if policy.get("audio_kbps"):
+        return (kbps >= policy["audio_kbps"], -kbps if kbps >= policy["audio_kbps"] else kbps)
+    return (True, kbps)
+
+def _over_budget_key(target, height, size):
+    # tidak ada yang muat: tetap sedekat mungkin dengan resolusi diminta (yang di bawahnya
+    # lebih dulu), baru yang terkecil; tanpa resolusi (maks) langsung yang terkecil
+    if target >= 10 ** 6:
+        return (0, 0, 0, -size)
+    return (0, -abs(height - target), height <= target, -size)
+
+def _pair_key(policy, target, v, a):
+    size = size_hint(v) + size_hint(a)
+    budget = policy.get("max_mb", 0) * _MB
+    height = _height(v)
+    if budget and size > budget:
+        return _over_budget_key(target, height, size)
+    prefer = policy.get("prefer", "quality")
+    container = remux_container(stream_codec(v, "video"), stream_codec(a, "audio"))
+    key = [1, height if height <= target else -height]
+    if prefer == "remux":
+        key.append(_REMUX_RANK[container])
+    if prefer == "small":
+        key.append(-size)
+    key += [_codec_rank(policy, stream_codec(v, "video")), getattr(v, "fps", 0) or 0, _REMUX_RANK[container],
+            _audio_key(policy, a), -size]
+    return tuple(key)
+
+def _selection(manifest, kind, res, policy, build):
+    # skor dihitung sekali per video (manifest di-cache) untuk tiap kombinasi kualitas+policy
+    cache = manifest.setdefault("selections", {})
+    key = (kind, res, policy_spec(policy))
+    if key not in cache:
+        cache[key] = build()
+    return cache[key]
+
+def _filter_audio(manifest, policy, why):
+    audios = list(manifest.get("audio_streams") or ([manifest["best_audio"]] if manifest.get("best_audio") else []))
+    if not audios:
+        raise RuntimeError("Stream audio tidak ditemukan.")
+    if policy.get("audio_kbps"):
+        ok = [a for a in audios if _kbps(a) >= policy["audio_kbps"]]
+        if not ok:
+            why.append(f"tidak ada audio >= {policy['audio_kbps']} kbps, dipakai yang tertinggi")
+        audios = ok or audios
+    return audios
+
+def _budget_note(policy, size, why):
+    if policy.get("max_mb"):
+        within = size <= policy["max_mb"] * _MB
+        why.append(f"total {size / _MB:.1f} MB {'<=' if within else '>'} budget {policy['max_mb']:g} MB"
+                   + ("" if within else " (tidak ada pilihan yang muat, dipilih yang terdekat dengan resolusi diminta lalu terkecil)"))
+
+def select_adaptive(manifest, res, policy=None):
+    """
+    Pilih pasangan video-only + audio terbaik untuk resolusi `res` sesuai policy.
+    Semua kandidat dinilai (resolusi, fps, codec, container hasil remux, ukuran) dan
+    alasannya dikembalikan: (res, v_stream, a_stream, selection).
+    """
+    policy = DEFAULT_POLICY if policy is None else policy
+
+    def build():
+        target = int(re.sub(r"\D", "", res) or 0) or 10 ** 6
+        videos = list(manifest.get("video_streams") or manifest["adaptive"].values())
+        if not videos:
+            raise RuntimeError("Stream video adaptive tidak tersedia.")
+        why = []
+        if policy.get("max_fps"):
+            videos = [v for v in videos if (getattr(v, "fps", 0) or 0) <= policy["max_fps"]] or videos
+        audios = _filter_audio(manifest, policy, why)
+        scored = sorted(((_pair_key(policy, target, v, a), v, a) for v in videos for a in audios),
+                        key=lambda item: item[0], reverse=True)
+        _, v, a = scored[0]
+        v_codec, a_codec = stream_codec(v, "video"), stream_codec(a, "audio")
+        container = remux_container(v_codec, a_codec)
+        size = size_hint(v) + size_hint(a)
+        chosen_res = v.resolution or res
+        why.insert(0, f"resolusi {chosen_res} (diminta {res})")
+        why.append(f"{codec_family(v_codec)}+{codec_family(a_codec)} -> remux {container} tanpa re-encode")
+        _budget_note(policy, size, why)
+        if policy.get("audio_kbps"):
+            why.append(f"audio {a.abr} (minimum {policy['audio_kbps']} kbps)")
+        alternatives = []
+        for _, alt_v, alt_a in scored[1:4]:
+            alternatives.append({
+                "video": f"{alt_v.resolution} {codec_family(stream_codec(alt_v, 'video'))}",
+                "audio": f"{alt_a.abr} {codec_family(stream_codec(alt_a, 'audio'))}",
+                "container": remux_container(stream_codec(alt_v, "video"), stream_codec(alt_a, "audio")),
+                "size": size_hint(alt_v) + size_hint(alt_a),
+            })
+        selection = {
+            "policy": policy_spec(policy) or "default",
+            "video": describe_stream(v),
+            "audio": describe_stream(a),
+            "container": container,
+            "size": size,
+            "why": why,
+            "candidates": len(scored),
+            "alternatives": alternatives,
+        }
+        return chosen_res, v, a, selection
+
+    return _selection(manifest, "v", res, policy, build)
+
+def select_progressive(manifest, res, policy=None):
+    """Progressive: resolusi tertinggi <= `res` yang muat di budget; (stream, selection)."""
+    policy = DEFAULT_POLICY if policy is None else policy
+
+    def build():
+        target = int(re.sub(r"\D", "", res) or 0) or 10 ** 6
+        streams = list(manifest.get("progressive_streams") or manifest["progressive"].values())
+        if not streams:
+            stream = manifest["yt"].streams.get_highest_resolution()
+            return stream, {"policy": policy_spec(policy) or "default", "video": describe_stream(stream),
+                            "why": ["tidak ada progressive mp4, dipakai resolusi tertinggi"]}
+        budget = policy.get("max_mb", 0) * _MB
+
+        def key(s):
+            size, height = size_hint(s), _height(s)
+            if budget and size > budget:
+                return _over_budget_key(target, height, size)
+            return (1, height if height <= target else -height, _codec_rank(policy, stream_codec(s, "video")), -size)
+
+        stream = max(streams, key=key)
+        why = [f"resolusi {stream.resolution} (diminta {res})"]
+        _budget_note(policy, size_hint(stream), why)
+        return stream, {"policy": policy_spec(policy) or "default", "video": describe_stream(stream),
+                        "size": size_hint(stream), "why": why, "candidates": len(streams)}
+
+    return _selection(manifest, "p", res, policy, build)
+
+def select_audio(manifest, policy=None):
+    """Audio saja: bitrate sesuai policy; dengan prefer=remux/small, codec yang lebih ringkas menang seri."""
+    policy = DEFAULT_POLICY if policy is None else policy
+
+    def build():
+        why = []
+        audios = _filter_audio(manifest, policy, why)
+        budget = policy.get("max_mb", 0) * _MB
+
+        def key(a):
+            size = size_hint(a)
+            if budget and size > budget:
+                return (0, -size)
+            compat = codec_family(stream_codec(a, "audio")) in MP4_AUDIO if policy.get("prefer") == "remux" else 0
+            return (1, compat, _audio_key(policy, a), -size if policy.get("prefer") == "small" else 0)
+
+        a = max(audios, key=key)
+        why.insert(0, f"audio {a.abr} {codec_family(stream_codec(a, 'audio'))}")
+        _budget_note(policy, size_hint(a), why)
+        return a, {"policy": policy_spec(policy) or "default", "audio": describe_stream(a), "size": size_hint(a),
+                   "why": why, "candidates": len(audios)}
+
+    return _selection(manifest, "a", "audio", policy, build)
+
+# ---------- Result store ----------
+_db_lock = threading.Lock()
+_db = sqlite3.connect(RESULT_DB, check_same_thread=False, timeout=30)
+# WAL: beberapa proses worker bisa membaca sambil satu menulis
+_db.execute("PRAGMA journal_mode=WAL")
+_db.execute("""
+    CREATE TABLE IF NOT EXISTS results (
+        video_id TEXT NOT NULL,
+        quality TEXT NOT NULL,
+        container TEXT NOT NULL,
+        file_name TEXT NOT NULL,
+        title TEXT,
+        note TEXT,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        sha256 TEXT NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (video_id, quality, container)
+    )
+""")
+_db.execute("CREATE INDEX IF NOT EXISTS results_file ON results(file_name)")
+_db.commit()
+
+def file_checksum(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def record_result(video_id, quality, file_name, title=None, note=None):
+    path = os.path.join(DOWNLOAD_FOLDER, file_name)
+    st = os.stat(path)
+    entry = {
+        "video_id": video_id,
+        "quality": quality,
+        "container": os.path.splitext(file_name)[1].lstrip(".").lower(),
+        "file_name": file_name,
+        "title": title,
+        "note": note,
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "sha256": file_checksum(path),
+        "created": time.time(),
+    }
+    with _db_lock:
+        _db.execute(
+            "INSERT OR REPLACE INTO results VALUES (:video_id, :quality, :container, :file_name, :title, :note, :size, :mtime, :sha256, :created)",
+            entry,
+        )
+        _db.commit()
+    return entry
+
+def _forget_result(video_id, quality, container):
+    _db.execute("DELETE FROM results WHERE video_id=? AND quality=? AND container=?", (video_id, quality, container))
+
+def lookup_result(video_id, quality):
+    """Cari hasil yang sudah ada untuk (video ID, kualitas); None bila belum ada atau file hilang."""
+    with _db_lock:
+        rows = _db.execute(
+            "SELECT video_id, quality, container, file_name, title, note, size, mtime, sha256 FROM results "
+            "WHERE video_id=? AND quality=? ORDER BY created DESC",
+            (video_id, quality),
+        ).fetchall()
+        for vid, q, container, file_name, title, note, size, mtime, sha256 in rows:
+            try:
+                st = os.stat(os.path.join(DOWNLOAD_FOLDER, file_name))
+            except OSError:
+                _forget_result(vid, q, container)
+                continue
+            if st.st_size != size:
+                _forget_result(vid, q, container)
+                continue
+            _db.commit()
+            return {"file_name": file_name, "title": title, "note": note, "size": size, "sha256": sha256}
+        _db.commit()
+    return None
+
+def result_quality(file_name):
+    """Kualitas yang tercatat untuk file hasil, atau None (bukan hasil job, mis. arsip batch)."""
+    with _db_lock:
+        row = _db.execute("SELECT quality FROM results WHERE file_name=? LIMIT 1", (file_name,)).fetchone()
+    return row[0] if row else None
+
+def verify_result_store():
+    """
+    Cocokkan index dengan isi DOWNLOAD_FOLDER (dijalankan sekali saat start).
+    Entri yang filenya hilang/berubah ukuran dibuang; bila hanya mtime yang berubah,
+    checksum dihitung ulang dan entri diperbaiki jika isinya masih sama.
+    """
+    with _db_lock:
+        rows = _db.execute("SELECT video_id, quality, container, file_name, size, mtime, sha256 FROM results").fetchall()
+    for vid, q, container, file_name, size, mtime, sha256 in rows:
+        path = os.path.join(DOWNLOAD_FOLDER, file_name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st and st.st_size == size and st.st_mtime == mtime:
+            continue
+        ok = st is not None and st.st_size == size and file_checksum(path) == sha256
+        with _db_lock:
+            if ok:
+                _db.execute(
+                    "UPDATE results SET mtime=? WHERE video_id=? AND quality=? AND container=?",
+                    (st.st_mtime, vid, q, container),
+                )
+            else:
+                _forget_result(vid, q, container)
+            _db.commit()
+
+threading.Thread(target=verify_result_store, name="verify-result-store", daemon=True).start()
+
+# ---------- Storage ----------
+class StorageFullError(RuntimeError):
+    pass
+
+_db.execute("CREATE TABLE IF NOT EXISTS access (file_name TEXT PRIMARY KEY, last_access REAL NOT NULL)")
+_db.commit()
+
+def touch_access(file_name):
+    with _db_lock:
+        _db.execute("INSERT OR REPLACE INTO access VALUES (?, ?)", (file_name, time.time()))
+        _db.commit()
+
+def stored_files():
+    """(waktu akses terakhir, nama, ukuran) untuk tiap hasil di DOWNLOAD_FOLDER; tanpa catatan akses -> mtime."""
+    with _db_lock:
+        access = dict(_db.execute("SELECT file_name, last_access FROM access").fetchall())
+    out = []
+    for entry in os.scandir(DOWNLOAD_FOLDER):
+        if entry.name.startswith(".") or entry.name.endswith((".part", ".part.json")) or not entry.is_file():
+            continue
+        st = entry.stat()
+        out.append((access.get(entry.name, st.st_mtime), entry.name, st.st_size))
+    return out
+
+def evict(file_name, reason):
+    try:
+        os.remove(os.path.join(DOWNLOAD_FOLDER, file_name))
+    except OSError:
+        return
+    with _db_lock:
+        _db.execute("DELETE FROM results WHERE file_name=?", (file_name,))
+        _db.execute("DELETE FROM access WHERE file_name=?", (file_name,))
+        _db.commit()
+    METRICS.inc("cibenyt_evictions_total", reason=reason)
+    log.info("evict %s (%s)", file_name, reason)
+
+def enforce_storage(need=0, keep=()):
+    """
+    Hapus hasil yang paling lama tidak diunduh (LRU) sampai pemakaian + `need` muat dalam
+    kuota dan ruang kosong di disk tetap di atas cadangan; hapus juga yang melewati umur maksimum.
+    Tanpa kuota, hanya aturan umur yang berlaku (file pengguna tidak dihapus diam-diam).
+    """
+    files = sorted(stored_files())
+    used = sum(size for _, _, size in files)
+    quota = STORAGE_QUOTA_MB * 1024 * 1024
+    reserve = STORAGE_RESERVE_MB * 1024 * 1024
+    now = time.time()
+    free = shutil.disk_usage(DOWNLOAD_FOLDER).free
+    for last_access, name, size in files:
+        if name in keep:
+            continue
+        too_old = STORAGE_MAX_AGE_DAYS and now - last_access > STORAGE_MAX_AGE_DAYS * 86400
+        over_quota = quota and used + need > quota
+        low_disk = quota and free - need < reserve
+        if not (too_old or over_quota or low_disk):
+            # urut dari akses terlama: file berikutnya lebih baru, jadi aman berhenti
+            break
+        evict(name, "age" if too_old else "quota" if over_quota else "disk")
+        used -= size
+        free += size
+
+def ensure_space(need):
+    """Cek ruang sebelum job mulai; bila kuota aktif, beri tempat dengan eviction dulu."""
+    if STORAGE_QUOTA_MB:
+        enforce_storage(need)
+    free = shutil.disk_usage(DOWNLOAD_FOLDER).free
+    if free - need < STORAGE_RESERVE_MB * 1024 * 1024:
+        raise StorageFullError(
+            f"Ruang disk tidak cukup: butuh {need / 1048576:.0f} MB, tersisa {free / 1048576:.0f} MB."
+        )
+
+def sweep_orphans():
+    """Hapus file sementara yang ditinggal job yang mati: staging .tmp, .part & checkpoint, isi .staging/."""
+    cutoff = time.time() - ORPHAN_HOURS * 3600
+    candidates = [
+        e for e in os.scandir(DOWNLOAD_FOLDER)
+        if (e.name.startswith(".") and ".tmp" in e.name) or e.name.endswith((".part", ".part.json"))
+    ]
+    candidates += list(os.scandir(STAGING_DIR))
+    for e in candidates:
+        try:
+            if e.stat().st_mtime > cutoff:
+                continue
+            if e.is_dir():
+                shutil.rmtree(e.path, ignore_errors=True)
+            else:
+                os.remove(e.path)
+            METRICS.inc("cibenyt_orphans_swept_total")
+        except OSError:
+            pass
+
+def _janitor():
+    while True:
+        time.sleep(JANITOR_INTERVAL)
+        try:
+            sweep_orphans()
+            enforce_storage()
+        except Exception:
+            log.exception("janitor gagal")
+
+threading.Thread(target=_janitor, name="storage-janitor", daemon=True).start()
+
+def storage_stats():
+    files = stored_files()
+    disk = shutil.disk_usage(DOWNLOAD_FOLDER)
+    return {
+        "files": len(files),
+        "used_bytes": sum(size for _, _, size in files),
+        "quota_bytes": STORAGE_QUOTA_MB * 1024 * 1024,
+        "disk_free_bytes": disk.free,
+        "disk_total_bytes": disk.total,
+    }
+
+METRICS.gauge("cibenyt_storage_used_bytes", lambda: storage_stats()["used_bytes"])
+
+def stream_size(stream):
+    try:
+        return stream.filesize or 0
+    except Exception:
+        return 0
+
+# ---------- Audio: konversi format ----------
+# Target audio di kunci kualitas: 'a:<format>[-<kbps>][+norm]', mis. 'a:mp3-192', 'a:opus-96+norm', 'a:flac'.
+# 'a:audio' tetap berarti stream asli tanpa konversi.
+AUDIO_FORMATS = {
+    # format: (encoder, ekstensi, muxer, keluarga codec sumber yang cukup di-copy, bitrate default kbps)
+    "mp3": ("libmp3lame", ".mp3", "mp3", {"mp3"}, 192),
+    "opus": ("libopus", ".opus", "ogg", {"opus"}, 128),
+    "aac": ("aac", ".m4a", "mp4", {"mp4a"}, 192),
+    "flac": ("flac", ".flac", "flac", set(), None),
+}
+_transcodes = threading.BoundedSemaphore(TRANSCODE_WORKERS)
+_transcodes_active = [0]
+_transcodes_lock = threading.Lock()
+
+def parse_audio_target(quality):
+    """'a:mp3-192+norm' -> ('mp3', 192, True); None untuk 'a:audio' / bukan audio (ValueError bila format salah)."""
+    if not quality.startswith("a:") or quality == "a:audio":
+        return None
+    m = re.match(r"^a:([a-z0-9]+)(?:-(\d+))?(\+norm)?$", quality)
+    if not m or m.group(1) not in AUDIO_FORMATS:
+        raise ValueError(f"Format audio tidak dikenal: {quality[2:]} (pilih {', '.join(AUDIO_FORMATS)})")
+    fmt = m.group(1)
+    default_kbps = AUDIO_FORMATS[fmt][4]
+    kbps = int(m.group(2)) if m.group(2) and default_kbps else default_kbps
+    return fmt, kbps, bool(m.group(3))
+
+def audio_quality(quality):
+    """
+    Bentuk kanonis target audio agar 'a:mp3' dan 'a:mp3-192' memakai kunci job & index
+    yang sama: cache hasil konversi per (video ID, format, bitrate, normalisasi).
+    """
+    m = re.match(r"^a:[^~@]+", quality)
+    target = parse_audio_target(m.group(0)) if m else None
+    if not target:
+        return quality
+    fmt, kbps, norm = target
+    return f"a:{fmt}{f'-{kbps}' if kbps else ''}{'+norm' if norm else ''}" + quality[m.end():]
+
+def audio_label(target):
+    fmt, kbps, norm = target
+    return f"{fmt.upper()}{f' {kbps}k' if kbps else ''}{' norm' if norm else ''}"
+
+def select_audio_source(manifest, policy, target):
+    """Sumber untuk konversi: codec yang sama dengan target (cukup di-copy) bila ada, selain itu `select_audio`."""
+    fmt, kbps, norm = target
+    families = AUDIO_FORMATS[fmt][3]
+    same = [a for a in manifest.get("audio_streams") or [] if codec_family(stream_codec(a, "audio")) in families]
+    if same and not policy and not norm:
+        # bitrate sumber tertinggi yang tidak melebihi target, supaya copy tidak menggembungkan ukuran
+        fit = [a for a in same if _kbps(a) <= (kbps or 10 ** 6)]
+        a = max(fit, key=_kbps) if fit else min(same, key=_kbps)
+        return a, {"policy": "default", "audio": describe_stream(a), "size": size_hint(a),
+                   "why": [f"sumber sudah {codec_family(stream_codec(a, 'audio'))}, bisa di-copy ke {fmt}"],
+                   "candidates": len(manifest.get("audio_streams") or [])}
+    return select_audio(manifest, policy)
+
+@contextlib.contextmanager
+def transcode_slot():
+    with _transcodes:
+        with _transcodes_lock:
+            _transcodes_active[0] += 1
+        try:
+            yield
+        finally:
+            with _transcodes_lock:
+                _transcodes_active[0] -= 1
+
+def transcode_audio(src_path, src_codec, src_kbps, target, out_basename, progress=None, duration=None):
+    """
+    Konversi audio ke target dengan satu proses ffmpeg. Stream-copy bila codec sumber sudah
+    sama dan bitrate-nya tidak melebihi target; selain itu encode ulang. Normalisasi loudness
+    (`loudnorm` single-pass/dinamis) berjalan sebagai filter di encode yang sama, tanpa decode kedua.
+    Encode dibatasi `TRANSCODE_WORKERS` proses bersamaan, masing-masing `TRANSCODE_THREADS` thread.
+    Mengembalikan (path hasil, "copy" | "transcode").
+    """
+    fmt, kbps, norm = target
+    encoder, ext, muxer, families, _ = AUDIO_FORMATS[fmt]
+    copy = codec_family(src_codec) in families and not norm and (not kbps or not src_kbps or src_kbps <= kbps)
+    cmd = ["ffmpeg", "-y", "-i", src_path, "-map", "0:a:0", "-vn"]
+    if copy:
+        cmd += ["-c:a", "copy"]
+    else:
+        if encoder not in ffmpeg_caps()["encoders"]:
+            raise RuntimeError(f"FFmpeg tidak punya encoder {encoder} untuk {fmt.upper()}.")
+        cmd += ["-c:a", encoder]
+        if kbps:
+            cmd += ["-b:a", f"{kbps}k"]
+        if norm:
+            # loudnorm me-resample ke 192 kHz: kembalikan ke 48 kHz (didukung semua target)
+            cmd += ["-af", f"loudnorm={LOUDNORM}", "-ar", "48000"]
+        cmd += ["-threads", str(TRANSCODE_THREADS)]
+    if muxer == "mp4":
+        cmd += ["-movflags", "+faststart"]
+    out_path = os.path.join(DOWNLOAD_FOLDER, out_basename + ext)
+    tmp_path = staging_path(out_path)
+    cmd += ["-f", muxer, tmp_path]
+
+    mode = "copy" if copy else "transcode"
+    total_us = int(duration * 1e6) if duration else 0
+    t0 = time.perf_counter()
+    # copy hanya I/O; slot pool hanya untuk encode yang memakan CPU
+    with contextlib.nullcontext() if copy else transcode_slot():
+        if progress:
+            progress.phase("transcode", total_us)
+        try:
+            _run_ffmpeg(cmd, (lambda us: progress.update(min(us, total_us) if total_us else us)) if progress else None)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    log.info("audio %s: %s -> %s (%s) %.2fs", out_basename, src_codec, audio_label(target), mode, time.perf_counter() - t0)
+    METRICS.inc("cibenyt_audio_conversions_total", format=fmt, mode=mode)
+    return finalize(tmp_path, out_path), mode
+
+METRICS.gauge("cibenyt_audio_transcodes_in_flight", lambda: _transcodes_active[0])
+
+def raw_audio_result(video_id, a_stream):
+    """File 'a:audio' yang sudah ada di index dengan container sama, dipakai ulang sebagai sumber konversi."""
+    entry = lookup_result(video_id, "a:audio") if video_id else None
+    ext = "." + (a_stream.mime_type.split("/")[-1] if a_stream.mime_type else "m4a")
+    if entry and entry["file_name"].endswith(ext):
+        return os.path.join(DOWNLOAD_FOLDER, entry["file_name"])
+    return None
+
+# ---------- Pipeline unduh ----------
+@contextlib.contextmanager
+def checkpoint_dir(video_id, quality_key):
+    """
+    Folder kerja tetap per (video ID, kualitas) di staging. Stream yang sudah selesai dan
+    file `.part` (potongan Range + checkpoint) bertahan bila job gagal atau server restart,
+    jadi percobaan berikutnya melanjutkan; folder dihapus setelah job sukses.
+    Folder yang ditinggal lebih dari CIBEN_ORPHAN_HOURS disapu janitor.
+    """
+    if not video_id:
+        with tempfile.TemporaryDirectory(dir=STAGING_DIR) as td:
+            yield td
+        return
+    td = os.path.join(STAGING_DIR, "job-" + hashlib.sha1(f"{video_id}|{quality_key}".encode()).hexdigest()[:16])
+    os.makedirs(td, exist_ok=True)
+    yield td
+    shutil.rmtree(td, ignore_errors=True)
+
+def stream_ext(stream, default):
+    return "." + (stream.mime_type.split("/")[-1] if stream.mime_type else default)
+
+def policy_label(policy, *streams):
+    # policy non-default bisa memilih stream lain pada resolusi yang sama: itag ikut di nama file
+    if not policy:
+        return ""
+    return " " + "+".join(str(getattr(s, "itag", "")) for s in streams)
+
+def clip_label(clip):
+    if not clip:
+        return ""
+    start, end = clip
+    return f" [{start:g}-{'' if end is None else f'{end:g}'}s]"
+
+def clip_estimate(stream, length, start, end):
+    # perkiraan byte yang ditransfer untuk klip, untuk cek ruang & admission control
+    size = stream_size(stream)
+    if not length:
+        return size
+    window = (end if end is not None else length) - start
+    return int(size * max(0.0, min(1.0, window / length)))
+
+def fetch_clip(stream, output_path, filename, clip, yt, progress=None, client="-"):
+    """Klip satu stream; ruang disk & admission control memakai perkiraan byte jendela klip."""
+    estimate = clip_estimate(stream, getattr(yt, "length", None), *clip)
+    ensure_space(estimate)
+    # ffmpeg menarik URL sendiri, jadi hanya admission yang diatur scheduler (tanpa throttle)
+    with SCHEDULER.transfer(client, estimate):
+        return clip_stream(stream, os.path.join(output_path, filename), clip[0], clip[1], progress)
+
+def run_download(url, quality, progress=None, client="-"):
+    """
+    Jalankan satu pekerjaan unduh sampai selesai (dipanggil oleh worker job).
+    Mengembalikan dict hasil: judul, link /download/..., catatan, dan daftar resolusi.
+    Fase & byte dilaporkan ke `progress` (metadata / video / audio / merge).
+    """
+    progress = progress or Progress(quality)
+    quality_key = quality
+    quality, clip = split_clip(quality)
+    quality, policy = split_policy(quality)
+    if clip and not ffmpeg_available():
+        raise RuntimeError("Potong klip membutuhkan FFmpeg.")
+    progress.phase("metadata")
+    manifest = get_manifest(url)
+    yt = manifest["yt"]
+    yt_title = manifest["title"]
+    video_id = manifest["video_id"]
+    cacheable = True
+    progressive_res = manifest["progressive_res"]
+    adaptive_res = manifest["adaptive_res"]
+
+    # Eksekusi berdasarkan pilihan
+    if quality.startswith("p:"):
+        res = quality.split(":",1)[1]
+        stream, selection = select_progressive(manifest, res, policy)
+        ext = ".mp4"
+        # resolusi & video ID ikut di nama file agar hasil lain tidak saling timpa
+        filename = safe_filename(f"{yt_title} [{stream.resolution or res}{policy_label(policy, stream)}]"
+                                 f"{clip_label(clip)} [{video_id}]") + ext
+        if clip:
+            output = fetch_clip(stream, DOWNLOAD_FOLDER, filename, clip, yt, progress, client)
+        else:
+            ensure_space(stream_size(stream))
+            progress.phase("video")
+            output = fetch_stream(stream, DOWNLOAD_FOLDER, filename, progress, client)
+        file_name = os.path.basename(output)
+        note = "Mode Mudah (progressive): video+audio dalam satu file."
+
+    elif quality == "a:audio":
+        a_stream, selection = select_audio(manifest, policy)
+        # simpan dengan ekstensi asli
+        ext = "." + (a_stream.mime_type.split("/")[-1] if a_stream.mime_type else "m4a")
+        filename = safe_filename(f"{yt_title}{policy_label(policy, a_stream)}{clip_label(clip)} [{video_id}]") + ext
+        if clip:
+            output = fetch_clip(a_stream, DOWNLOAD_FOLDER, filename, clip, yt, progress, client)
+        else:
+            ensure_space(stream_size(a_stream))
+            progress.phase("audio")
+            output = fetch_stream(a_stream, DOWNLOAD_FOLDER, filename, progress, client)
+        file_name = os.path.basename(output)
+        note = "Audio saja (format asli). Pilih MP3/Opus/AAC/FLAC untuk konversi dengan FFmpeg."
+
+    elif quality.startswith("a:"):
+        target = parse_audio_target(quality)
+        if not ffmpeg_available():
+            raise RuntimeError("Konversi audio membutuhkan FFmpeg.")
+        a_stream, selection = select_audio_source(manifest, policy, target)
+        selection = dict(selection, why=list(selection["why"]))
+        base = safe_filename(f"{yt_title} [{audio_label(target)}]{clip_label(clip)} [{video_id}]")
+        duration = getattr(yt, "length", None)
+        with checkpoint_dir(video_id, quality_key) as td:
+            src_name = f"src-{a_stream.itag}{stream_ext(a_stream, 'm4a')}"
+            src_path = None if clip else raw_audio_result(video_id, a_stream)
+            if clip:
+                duration = (clip[1] if clip[1] is not None else duration or clip[0]) - clip[0]
+            if src_path:
+                # stream asli sudah pernah diunduh: konversi langsung tanpa menghubungi YouTube lagi
+                selection["why"].append("sumber dari hasil 'a:audio' yang sudah ada")
+            elif os.path.exists(os.path.join(td, src_name)):
+                src_path = os.path.join(td, src_name)
+                selection["why"].append("sumber dilanjutkan dari checkpoint")
+            elif clip:
+                src_path = fetch_clip(a_stream, td, src_name, clip, yt, progress, client)
+            else:
+                ensure_space(2 * stream_size(a_stream))
+                progress.phase("audio")
+                src_path = fetch_stream(a_stream, td, src_name, progress, client)
+            out_path, mode = transcode_audio(src_path, stream_codec(a_stream, "audio"), _kbps(a_stream), target,
+                                             base, progress, duration)
+        file_name = os.path.basename(out_path)
+        selection["conversion"] = {"format": target[0], "kbps": target[1], "loudnorm": target[2], "mode": mode}
+        note = (f"Audio {audio_label(target)}: "
+                + ("stream asli di-copy tanpa re-encode." if mode == "copy" else "dikonversi dengan FFmpeg."))
+
+    elif quality.startswith("v:"):
+        res, v_stream, a_stream, selection = select_adaptive(manifest, quality.split(":",1)[1], policy)
+        base = safe_filename(f"{yt_title} [{res}{policy_label(policy, v_stream, a_stream)}]{clip_label(clip)} [{video_id}]")
+        if clip:
+            # video & audio dipotong dan di-mux bersama (sinkron), tanpa file sementara
+            estimate = clip_estimate(v_stream, yt.length, *clip) + clip_estimate(a_stream, yt.length, *clip)
+            ensure_space(estimate)
+            with SCHEDULER.transfer(client, estimate):
+                out_path, cut = clip_av(v_stream, a_stream, base, clip[0], clip[1], progress)
+            file_name = os.path.basename(out_path)
+            note = f"Mode Maks: {res} digabung otomatis dengan FFmpeg."
+            if cut < clip[0]:
+                note += f" Klip dimulai dari keyframe {cut:.2f}s agar audio & video sinkron."
+        else:
+            # video+audio sementara + hasil merge
+            ensure_space(2 * (stream_size(v_stream) + stream_size(a_stream)))
+            # unduh ke staging (filesystem yang sama) lalu merge jika ffmpeg ada
+            with checkpoint_dir(video_id, quality_key) as td:
+                v_ext = stream_ext(v_stream, "mp4")
+                # itag di nama file: stream lain (setelah resolve ulang) tidak memakai checkpoint yang salah
+                v_tmp = os.path.join(td, f"v-{v_stream.itag}{v_ext}")
+                a_tmp = os.path.join(td, f"a-{a_stream.itag}{stream_ext(a_stream, 'm4a')}")
+                for stream, path, phase in ((v_stream, v_tmp, "video"), (a_stream, a_tmp, "audio")):
+                    if os.path.exists(path):
+                        # selesai di percobaan sebelumnya
+                        log.info("checkpoint: %s %s dilanjutkan tanpa unduh ulang", video_id, phase)
+                    else:
+                        progress.phase(phase)
+                        fetch_stream(stream, td, os.path.basename(path), progress, client)
+
+                if ffmpeg_available():
+                    duration = getattr(yt, "length", None)
+                    out_path = merge_av(v_tmp, a_tmp, base, v_stream.mime_type, a_stream.mime_type,
+                                        stream_codec(v_stream, "video"), stream_codec(a_stream, "audio"),
+                                        progress, duration)
+                    file_name = os.path.basename(out_path)
+                    note = f"Mode Maks: {res} digabung otomatis dengan FFmpeg."
+                else:
+                    # tanpa ffmpeg: simpan video-only agar tetap bisa diunduh cepat
+                    out_path = os.path.join(DOWNLOAD_FOLDER, base + v_ext)
+                    tmp_path = staging_path(out_path)
+                    shutil.move(v_tmp, tmp_path)
+                    finalize(tmp_path, out_path)
+                    file_name = os.path.basename(out_path)
+                    note = f"Mode Maks: {res} (video-only). Install FFmpeg untuk menggabungkan audio."
+                    # hasil tanpa audio tidak disimpan di index agar tidak dipakai ulang sebagai hasil lengkap
+                    cacheable = False
+    else:
+        raise RuntimeError("Pilihan kualitas tidak dikenal.")
+
+    if clip:
+        note += f" Klip {clip_label(clip).strip(' []')}."
+    result = {
+        "yt_title": yt_title,
+        "file_path": f"/download/{file_name}",
+        "note": note,
+        "progressive_res": progressive_res,
+        "adaptive_res": adaptive_res,
+        "selection": selection,
+    }
+    if video_id and cacheable:
+        entry = record_result(video_id, quality_key, file_name, yt_title, note)
+        result.update(size=entry["size"], sha256=entry["sha256"])
+    touch_access(file_name)
+    if STORAGE_QUOTA_MB:
+        enforce_storage(keep={file_name})
+    return result
+
+def stored_result(url, quality):
+    """Hasil dari index tanpa menghubungi YouTube, atau None."""
+    video_id = extract_video_id(url)
+    entry = lookup_result(video_id, quality) if video_id else None
+    METRICS.inc("cibenyt_result_store_lookups_total", result="hit" if entry else "miss")
+    if not entry:
+        return None
+    return {
+        "yt_title": entry["title"],
+        "file_path": f"/download/{entry['file_name']}",
+        "note": entry["note"],
+        "progressive_res": [],
+        "adaptive_res": [],
+        "size": entry["size"],
+        "sha256": entry["sha256"],
+        "cached": True,
+    }
+
+# ---------- Streaming merge ----------
+def stream_container(v_stream, a_stream):
+    # streaming hanya bisa remux (tanpa transcode), jadi pilih container yang menerima kedua codec
+    plan = plan_merge(stream_codec(v_stream, "video"), stream_codec(a_stream, "audio"), transcode_ok=False)
+    ext, mimetype = CONTAINERS[plan["container"]]
+    return plan["container"], ext, mimetype
+
+_streams = threading.BoundedSemaphore(STREAM_WORKERS)
+
+class StreamBody:
+    """Iterable respons yang memanggil `release` tepat sekali saat ditutup server, walau belum pernah diiterasi."""
+
+    def __init__(self, body, release):
+        self.body = body
+        self._release = release
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            self.body.close()
+        finally:
+            release, self._release = self._release, None
+            if release:
+                release()
+
+def stream_merge(v_stream, a_stream, tee_path=None, on_saved=None, client="-"):
+    """
+    Generator: ffmpeg membaca stream video & audio langsung dari URL-nya, mux ke
+    container yang bisa di-stream (fragmented MP4 atau Matroska) dan menulis ke pipe.
+    Tiap potongan diteruskan ke respons HTTP dan, bila `tee_path` diisi, juga ke file
+    staging yang di-`finalize` setelah ffmpeg selesai sukses, lalu `on_saved()` dipanggil
+    (di thread generator: pekerjaan berat sebaiknya dipindah ke thread sendiri).
+
+    Backpressure alami: bila klien lambat, yield tertahan, pipe penuh, ffmpeg ikut menunggu.
+    Bila klien putus, generator ditutup dan proses ffmpeg dimatikan. Byte keluaran (-c copy,
+    jadi ~ byte masukan) melewati SCHEDULER atas nama `client`; karena pipe-nya penuh,
+    ffmpeg ikut membaca URL-nya dengan laju yang sama.
+    """
+    container, _, _ = stream_container(v_stream, a_stream)
+    fmt = ["-f", container]
+    if container == "mp4":
+        fmt = ["-movflags", "frag_keyframe+empty_moov+default_base_moof"] + fmt
+    http_in = ["-user_agent", HTTP_HEADERS["User-Agent"], "-reconnect", "1", "-reconnect_streamed", "1"]
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        *http_in, "-i", v_stream.url,
+        *http_in, "-i", a_stream.url,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c", "copy", *fmt, "pipe:1",
+    ]
+    with SCHEDULER.transfer(client, stream_size(v_stream) + stream_size(a_stream)) as throttle:
+        proc = spawn(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        tmp_path = staging_path(tee_path) if tee_path else None
+        tee = open(tmp_path, "wb") if tmp_path else None
+        ok = False
+        try:
+            while True:
+                chunk = proc.stdout.read1(256 * 1024)
+                if not chunk:
+                    break
+                throttle(len(chunk))
+                if tee:
+                    tee.write(chunk)
+                yield chunk
+            ok = proc.wait() == 0
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+            if tee:
+                tee.close()
+                if ok:
+                    finalize(tmp_path, tee_path)
+                    if on_saved:
+                        on_saved()
+                else:
+                    os.remove(tmp_path)
+
+# ---------- Single-flight ----------
+class SingleFlight:
+    """
+    Satukan pemanggilan paralel dengan key yang sama: pemanggil pertama menjalankan
+    `fn`, pemanggil berikutnya menunggu dan menerima hasil (atau exception) yang sama.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def join(self, key):
+        """(leader?, call). Leader wajib memanggil `finish`; yang lain boleh menunggu `call["event"]`."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = {"event": threading.Event(), "result": None, "error": None}
+                return True, call
+        return False, call
+
+    def finish(self, key, call, result=None, error=None):
+        call["result"], call["error"] = result, error
+        with self._lock:
+            del self._calls[key]
+        call["event"].set()
+
+    def do(self, key, fn):
+        leader, call = self.join(key)
+        if leader:
+            try:
+                result = fn()
+            except BaseException as e:
+                self.finish(key, call, error=e)
+                raise
+            self.finish(key, call, result)
+            return result
+        call["event"].wait()
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+DOWNLOADS_INFLIGHT = SingleFlight()
+# /stream yang menyimpan salinan ke disk: satu per (video, kualitas); request lain menunggu hasilnya
+STREAMS_INFLIGHT = SingleFlight()
+
+def download_key(url, quality):
+    return (extract_video_id(url) or url, quality)
+
+# ---------- Job queue ----------
+class QueueFullError(RuntimeError):
+    pass
+
+# identitas proses ini di store bersama (host:pid), untuk klaim & pemulihan job
+OWNER = f"{platform.node()}:{os.getpid()}"
+SHUTTING_DOWN = threading.Event()
+
+class Job:
+    def __init__(self, url, quality, client="-"):
+        self.id = uuid.uuid4().hex[:12]
+        self.client = client
+        self.url = url
+        self.quality = quality
+        self.key = download_key(url, quality)
+        self.status = "queued"  # queued -> running -> done / error
+        self.progress = Progress(quality)
+        self.result = None
+        self.error = None
+        # 'retry' (gagal setelah semua percobaan ulang), 'expired' atau 'fatal'; lihat classify_error
+        self.error_kind = None
+        self.attempts = 0
+        self.created = time.time()
+        self.priority = (job_priority(quality), self.created)
+        self.started = None
+        self.finished = None
+        self.owner = None
+        # False: salinan dari store bersama, job-nya dijalankan proses lain
+        self.live = True
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "url": self.url,
+            "quality": self.quality,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "error_kind": self.error_kind,
+            "attempts": self.attempts,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "progress": self.progress.state,
+            "timings": {k: round(v, 3) for k, v in self.progress.timings.items()},
+        }
+
+    def to_row(self):
+        return {
+            "id": self.id, "key": json.dumps(list(self.key)), "url": self.url, "quality": self.quality,
+            "client": self.client, "priority": self.priority[0], "created": self.created, "status": self.status,
+            "owner": self.owner, "started": self.started, "finished": self.finished,
+            "result": json.dumps(self.result), "error": self.error,
+            "error_kind": self.error_kind, "attempts": self.attempts,
+            "progress": json.dumps(self.progress.state), "timings": json.dumps(self.progress.timings),
+            "updated": time.time(),
+        }
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls.__new__(cls)
+        job.id, job.url, job.quality, job.client = row["id"], row["url"], row["quality"], row["client"]
+        job.key = tuple(json.loads(row["key"]))
+        job.priority = (row["priority"], row["created"])
+        job.status, job.owner, job.error = row["status"], row["owner"], row["error"]
+        job.error_kind, job.attempts = row["error_kind"], row["attempts"] or 0
+        job.created, job.started, job.finished = row["created"], row["started"], row["finished"]
+        job.result = json.loads(row["result"]) if row["result"] else None
+        job.progress = Progress(job.quality)
+        job.progress.state = json.loads(row["progress"]) if row["progress"] else job.progress.state
+        job.progress.timings = json.loads(row["timings"]) if row["timings"] else {}
+        job.live = False
+        return job
+
+class MemoryJobStore:
+    """
+    Store job untuk satu proses (default `python cibenyt.py`): dict + antrean prioritas di memori.
+
+    Backend lain cukup menyediakan method yang sama (add, add_done, claim, save,
+    save_progress, requeue, running_here, get, queue_position, counts, queue_depth,
+    prune, save_batch, get_batch, orphan_batches, sync_scheduler, save_scheduler_config,
+    save_metrics, load_metrics) lalu didaftarkan di JOB_STORES.
+    """
+
+    shared = False
 
-DOWNLOAD_FOLDER = get_download_folder()
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._batches = {}
+        self._queue = queue.PriorityQueue(maxsize=JOB_QUEUE_MAX)
+        self._seq = iter(range(1, 1 << 62))
 
-def valid_youtube_url(url):
-    pattern = r"(https?://)?(www\.)?(youtube\.com/watch\?v=|youtu\.be/)[\w-]+"
-    return re.match(pattern, url)
+    def add(self, job):
+        with self._lock:
+            # URL+kualitas yang sama sedang diproses: ikut menunggu job itu
+            for other in self._jobs.values():
+                if other.key == job.key and other.status in ("queued", "running"):
+                    return other
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((job.priority, next(self._seq), job))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise QueueFullError("Antrean penuh, coba lagi sebentar.")
+        return job
 
-def clean_youtube_url(url):
-    if "youtu.be" in url:
-        return url.split("?")[0]
-    elif "youtube.com/watch" in url:
-        return url.split("&")[0]
-    return url
+    def add_done(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
 
-def ffmpeg_available():
-    return shutil.which("ffmpeg") is not None
+    def claim(self, timeout=1):
+        try:
+            _, _, job = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        job.status = "running"
+        job.started = time.time()
+        job.owner = OWNER
+        return job
+
+    def save(self, job):
+        pass  # objek job di memori sudah yang terbaru
+
+    def save_progress(self, job):
+        pass
+
+    def requeue(self, job):
+        # antrean di memori ikut hilang bersama prosesnya
+        job.status = "error"
+        job.error = "Server berhenti sebelum job selesai, silakan kirim ulang (unduhan dilanjutkan dari checkpoint)."
+        job.error_kind = "retry"
+        job.finished = time.time()
+        job.progress.finish("error")
+
+    def running_here(self):
+        with self._lock:
+            return [j for j in self._jobs.values() if j.status == "running"]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job):
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == "queued" and j.priority <= job.priority)
+
+    def counts(self):
+        with self._lock:
+            statuses = [j.status for j in self._jobs.values()]
+        return {st: statuses.count(st) for st in ("queued", "running")}
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def prune(self, cutoff):
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+                del self._jobs[job_id]
+            for batch_id in [b.id for b in self._batches.values() if b.finished and b.finished < cutoff]:
+                del self._batches[batch_id]
+
+    def save_batch(self, batch, items=()):
+        with self._lock:
+            self._batches[batch.id] = batch
+
+    def get_batch(self, batch_id):
+        with self._lock:
+            return self._batches.get(batch_id)
 
-def merge_av(video_path, audio_path, out_basename, v_mime="video/mp4", a_mime="audio/mp4"):
+    def orphan_batches(self):
+        return []  # batch di memori ikut hilang bersama prosesnya
+
+    def sync_scheduler(self, usage):
+        return None, {"clients": {}, "inflight": 0}  # satu proses: tidak ada transfer lain
+
+    def save_scheduler_config(self, config):
+        pass
+
+    def save_metrics(self, snapshot):
+        pass
+
+    def load_metrics(self):
+        return None  # satu proses: METRICS sudah lengkap
+
+class SQLiteJobStore:
     """
-    Gabungkan video+audio menggunakan ffmpeg.
-    - Jika keduanya MP4/H.264/AAC, hasilkan .mp4 dengan -c copy (cepat).
-    - Jika codec/container beda, hasilkan .mkv dengan -c copy (tanpa re-encode) agar cepat.
+    Job bersama antar worker/proses lewat SQLite (WAL). Antrean = baris berstatus 'queued';
+    worker mengklaimnya dengan `UPDATE ... RETURNING`, dan index unik parsial pada `key`
+    menjadi kunci in-flight: URL+kualitas yang sama tidak bisa antre/berjalan dua kali,
+    di worker mana pun. Progres job yang berjalan disimpan berkala agar worker lain bisa
+    melayani /jobs/<id> dan SSE-nya.
     """
-    out_ext = ".mp4" if ("mp4" in v_mime and "mp4" in a_mime) else ".mkv"
-    out_path = os.path.join(DOWNLOAD_FOLDER, out_basename + out_ext)
 
-    cmd = [
-        "ffmpeg", "-y",
-        "-i", video_path, "-i", audio_path,
-        "-c", "copy",
-        out_path
-    ]
+    shared = True
+    PROGRESS_SAVE_INTERVAL = 1.0
+    # job 'running' milik node lain yang tidak diperbarui selama ini dianggap pemiliknya mati;
+    # pemilik yang hidup memperbaruinya tiap HEARTBEAT_INTERVAL walau progres sedang diam (merge panjang)
+    STALE_SECONDS = 600
+    HEARTBEAT_INTERVAL = 30
+    # pemakaian bandwidth proses lain yang lebih tua dari ini diabaikan (proses mati / berhenti)
+    USAGE_TTL = 5
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                url TEXT NOT NULL,
+                quality TEXT NOT NULL,
+                client TEXT,
+                priority INTEGER NOT NULL,
+                created REAL NOT NULL,
+                status TEXT NOT NULL,
+                owner TEXT,
+                started REAL,
+                finished REAL,
+                result TEXT,
+                error TEXT,
+                progress TEXT,
+                timings TEXT,
+                updated REAL,
+                error_kind TEXT,
+                attempts INTEGER DEFAULT 0
+            )
+        """)
+        # store dari versi sebelumnya: tambahkan kolom yang belum ada
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, decl in (("error_kind", "TEXT"), ("attempts", "INTEGER DEFAULT 0")):
+            if column not in columns:
+                try:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {decl}")
+                except sqlite3.OperationalError:
+                    pass  # proses lain baru saja menambahkannya
+        self._db.execute("CREATE UNIQUE INDEX IF NOT EXISTS jobs_inflight ON jobs(key) WHERE status IN ('queued', 'running')")
+        # scheduler bandwidth: batas bersama (POST /scheduler di worker mana pun) + pemakaian per proses
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS scheduler_config (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                bandwidth_mbps REAL NOT NULL,
+                client_bandwidth_mbps REAL NOT NULL,
+                max_inflight_mb INTEGER NOT NULL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS scheduler_usage (
+                owner TEXT PRIMARY KEY,
+                clients TEXT NOT NULL,
+                inflight INTEGER NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        # snapshot METRICS per proses; milik proses yang mati dilebur ke baris owner ''
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS metrics (
+                owner TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        # batch/playlist: baris batch + satu baris per item yang menautkan item ke job-nya
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS batches (
+                id TEXT PRIMARY KEY,
+                sources TEXT NOT NULL,
+                quality TEXT NOT NULL,
+                client TEXT,
+                concurrency INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                created REAL NOT NULL,
+                finished REAL,
+                owner TEXT,
+                updated REAL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS batch_items (
+                batch_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                video_id TEXT,
+                job_id TEXT,
+                skipped INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                PRIMARY KEY (batch_id, idx)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs(status, priority, created)")
+        self._local = {}  # job yang sedang dijalankan proses ini (progres hidup untuk SSE)
+        # progres terbaru per job, ditulis oleh thread penulis (bukan oleh loop unduhan)
+        self._dirty = {}
+        self._dirty_cond = threading.Condition()
+        self._writer = None
+        self._heartbeat = None
+        self._usage_written = (None, 0.0)
+        self._wake = threading.Event()
+        self._last_recover = 0.0
+
+    def _insert(self, job):
+        row = job.to_row()
+        self._db.execute(f"INSERT INTO jobs ({', '.join(row)}) VALUES ({', '.join(':' + k for k in row)})", row)
+
+    def add(self, job):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                other = self._db.execute(
+                    "SELECT * FROM jobs WHERE key=? AND status IN ('queued', 'running')", (json.dumps(list(job.key)),)
+                ).fetchone()
+                if other:
+                    self._db.execute("COMMIT")
+                    return self._local.get(other["id"]) or Job.from_row(other)
+                queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status='queued'").fetchone()[0]
+                if queued >= JOB_QUEUE_MAX:
+                    raise QueueFullError("Antrean penuh, coba lagi sebentar.")
+                self._insert(job)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        self._wake.set()
+        return job
+
+    def add_done(self, job):
+        with self._lock:
+            self._insert(job)
+
+    def _owner_dead(self, owner, updated, now):
+        owner_host, _, pid = (owner or "").rpartition(":")
+        if owner_host == platform.node() and pid.isdigit():
+            # host sama: hanya pid yang sudah tidak ada yang pasti mati; yang hidup mungkin
+            # sedang merge lama / transfer tersendat dan tidak boleh dijalankan dua kali
+            if owner == OWNER:
+                return False
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                return True
+            except OSError:
+                pass  # ada, tapi milik user lain
+            return False
+        return (updated or 0) < now - self.STALE_SECONDS
+
+    def _recover(self):
+        # job 'running' milik proses yang sudah mati (host sama) atau node yang diam terlalu lama
+        now = time.time()
+        if now - self._last_recover < 10:
+            return
+        self._last_recover = now
+        rows = self._db.execute("SELECT id, owner, updated FROM jobs WHERE status='running'").fetchall()
+        for row in rows:
+            if self._owner_dead(row["owner"], row["updated"], now):
+                log.warning("job %s milik %s dikembalikan ke antrean", row["id"], row["owner"])
+                self._db.execute("UPDATE jobs SET status='queued', owner=NULL, started=NULL WHERE id=? AND status='running'",
+                                 (row["id"],))
+
+    def claim(self, timeout=1):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._recover()
+                row = self._db.execute(
+                    "UPDATE jobs SET status='running', owner=?, started=?, updated=? "
+                    "WHERE id=(SELECT id FROM jobs WHERE status='queued' ORDER BY priority, created LIMIT 1) "
+                    "AND status='queued' RETURNING *",
+                    (OWNER, time.time(), time.time()),
+                ).fetchone()
+                if row:
+                    job = Job.from_row(row)
+                    job.live = True
+                    self._local[job.id] = job
+                    self._start_heartbeat()
+                    return job
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return None
+            # job baru dari proses ini membangunkan worker; dari proses lain terlihat lewat polling
+            self._wake.wait(min(left, 0.5))
+            self._wake.clear()
+
+    def _start_heartbeat(self):
+        # dipanggil dengan self._lock dipegang
+        if not self._heartbeat:
+            self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _beat(self):
+        # tanda hidup untuk node lain: `updated` semua job dan batch yang sedang berjalan di proses ini
+        while True:
+            time.sleep(min(self.HEARTBEAT_INTERVAL, self.STALE_SECONDS / 4))
+            try:
+                with self._lock:
+                    ids = list(self._local)
+                    if ids:
+                        self._db.execute(
+                            f"UPDATE jobs SET updated=? WHERE status='running' AND owner=? AND id IN ({', '.join('?' * len(ids))})",
+                            (time.time(), OWNER, *ids),
+                        )
+                    self._db.execute("UPDATE batches SET updated=? WHERE status!='done' AND owner=?", (time.time(), OWNER))
+            except sqlite3.Error as e:
+                log.warning("heartbeat job gagal disimpan: %s", e)
+
+    def save(self, job):
+        row = job.to_row()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status=:status, owner=:owner, started=:started, finished=:finished, result=:result, "
+                "error=:error, error_kind=:error_kind, attempts=:attempts, progress=:progress, timings=:timings, "
+                "updated=:updated WHERE id=:id",
+                row,
+            )
+            if job.status not in ("queued", "running"):
+                self._local.pop(job.id, None)
+
+    def save_progress(self, job):
+        # dipanggil dari loop unduhan (di bawah lock Progress): cukup tandai job-nya. UPDATE ke
+        # SQLite bisa menunggu lock tulis sampai timeout, jadi dikerjakan thread penulis.
+        with self._dirty_cond:
+            self._dirty[job.id] = job
+            if not self._writer:
+                self._writer = threading.Thread(target=self._progress_writer, name="progress-writer", daemon=True)
+                self._writer.start()
+            self._dirty_cond.notify()
+
+    def _progress_writer(self):
+        while True:
+            with self._dirty_cond:
+                self._dirty_cond.wait_for(lambda: self._dirty)
+                dirty, self._dirty = self._dirty, {}
+            for job in dirty.values():
+                try:
+                    with self._lock:
+                        # job yang sudah selesai disimpan lengkap oleh save(); jangan ditimpa progres lama
+                        self._db.execute("UPDATE jobs SET progress=?, timings=?, updated=? WHERE id=? AND status='running'",
+                                         (json.dumps(job.progress.state), json.dumps(dict(job.progress.timings)),
+                                          time.time(), job.id))
+                except sqlite3.Error as e:
+                    log.warning("progres job %s gagal disimpan: %s", job.id, e)
+            # satu UPDATE per job paling sering tiap interval, berapa pun jumlah update progresnya
+            time.sleep(self.PROGRESS_SAVE_INTERVAL)
+
+    def requeue(self, job):
+        job.status, job.owner, job.started = "queued", None, None
+        self.save(job)
+        with self._lock:
+            self._local.pop(job.id, None)
+
+    def running_here(self):
+        with self._lock:
+            return list(self._local.values())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._local.get(job_id)
+            if job:
+                return job
+            row = self._db.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def queue_position(self, job):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status='queued' AND (priority, created) <= (?, ?)", job.priority
+            ).fetchone()[0]
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"
+            ).fetchall()
+        counts = {"queued": 0, "running": 0}
+        counts.update({status: n for status, n in rows})
+        return counts
+
+    def queue_depth(self):
+        return self.counts()["queued"]
+
+    def prune(self, cutoff):
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (cutoff,))
+            self._db.execute("DELETE FROM batch_items WHERE batch_id IN "
+                             "(SELECT id FROM batches WHERE finished IS NOT NULL AND finished < ?)", (cutoff,))
+            self._db.execute("DELETE FROM batches WHERE finished IS NOT NULL AND finished < ?", (cutoff,))
+
+    def save_batch(self, batch, items=()):
+        """Simpan baris batch, plus item dengan indeks di `items` (semua item setelah playlist diurai)."""
+        row = batch.to_row()
+        item_rows = [(batch.id, i, batch.items[i]["url"], batch.items[i]["video_id"], batch.items[i]["job_id"],
+                      int(batch.items[i]["skipped"]), batch.items[i]["error"]) for i in items]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(f"INSERT OR REPLACE INTO batches ({', '.join(row)}) VALUES ({', '.join(':' + k for k in row)})", row)
+                self._db.executemany("INSERT OR REPLACE INTO batch_items VALUES (?, ?, ?, ?, ?, ?, ?)", item_rows)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            if batch.status != "done":
+                self._start_heartbeat()
+
+    def get_batch(self, batch_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM batches WHERE id=?", (batch_id,)).fetchone()
+            items = self._db.execute("SELECT * FROM batch_items WHERE batch_id=? ORDER BY idx", (batch_id,)).fetchall()
+        return Batch.from_row(row, items) if row else None
+
+    def sync_scheduler(self, usage):
+        """
+        Terbitkan pemakaian bandwidth proses ini (`SCHEDULER.usage()`), lalu kembalikan
+        (batas bersama atau None, pemakaian gabungan proses lain) untuk `SCHEDULER`.
+        """
+        now = time.time()
+        last_usage, last_write = self._usage_written
+        with self._lock:
+            # tulis hanya bila berubah, atau sebagai tanda hidup sebelum dianggap basi
+            if usage != last_usage or now - last_write >= self.USAGE_TTL / 2:
+                self._db.execute("INSERT OR REPLACE INTO scheduler_usage VALUES (?, ?, ?, ?)",
+                                 (OWNER, json.dumps(usage["clients"]), usage["inflight"], now))
+                self._db.execute("DELETE FROM scheduler_usage WHERE updated < ?", (now - 60,))
+                self._usage_written = (usage, now)
+            rows = self._db.execute("SELECT clients, inflight FROM scheduler_usage WHERE owner != ? AND updated >= ?",
+                                    (OWNER, now - self.USAGE_TTL)).fetchall()
+            config = self._db.execute(
+                "SELECT bandwidth_mbps, client_bandwidth_mbps, max_inflight_mb FROM scheduler_config WHERE id=1"
+            ).fetchone()
+        others = {"clients": {}, "inflight": 0}
+        for row in rows:
+            for client, transfers in json.loads(row["clients"]).items():
+                others["clients"][client] = others["clients"].get(client, 0) + transfers
+            others["inflight"] += row["inflight"]
+        return (dict(config) if config else None), others
+
+    def save_scheduler_config(self, config):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO scheduler_config VALUES (1, ?, ?, ?)",
+                             (config["bandwidth_mbps"], config["client_bandwidth_mbps"], config["max_inflight_mb"]))
+
+    def save_metrics(self, snapshot):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO metrics VALUES (?, ?, ?)", (OWNER, json.dumps(snapshot), time.time()))
+
+    def load_metrics(self):
+        """Snapshot METRICS semua proses; counter proses yang sudah mati tetap ikut dijumlahkan."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute("SELECT owner, data, updated FROM metrics").fetchall()
+                snapshots = [json.loads(row["data"]) for row in rows]
+                dead = [row for row in rows if row["owner"] and self._owner_dead(row["owner"], row["updated"], now)]
+                if dead:
+                    # dilebur agar tabel tidak tumbuh per restart, tanpa membuat counter turun
+                    archive = [json.loads(row["data"]) for row in rows if not row["owner"]]
+                    merged = Metrics.merge(archive + [json.loads(row["data"]) for row in dead])
+                    self._db.executemany("DELETE FROM metrics WHERE owner=?", [(row["owner"],) for row in dead])
+                    self._db.execute("INSERT OR REPLACE INTO metrics VALUES ('', ?, ?)", (json.dumps(merged), now))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return snapshots
+
+    def orphan_batches(self):
+        """Ambil alih batch yang belum selesai milik proses/node yang mati; dikembalikan untuk dilanjutkan."""
+        now = time.time()
+        taken = []
+        with self._lock:
+            rows = self._db.execute("SELECT id, owner, updated FROM batches WHERE status!='done'").fetchall()
+            for row in rows:
+                if not self._owner_dead(row["owner"], row["updated"], now):
+                    continue
+                # compare-and-set: hanya satu worker yang berhasil mengambil alih
+                cur = self._db.execute("UPDATE batches SET owner=?, updated=? WHERE id=? AND owner IS ?",
+                                       (OWNER, now, row["id"], row["owner"]))
+                if cur.rowcount:
+                    log.warning("batch %s milik %s dilanjutkan di proses ini", row["id"], row["owner"])
+                    taken.append(row["id"])
+        return [batch for batch in map(self.get_batch, taken) if batch]
+
+# "memory" (default, satu proses) atau "sqlite[:///path]" (bersama antar worker; default file RESULT_DB)
+JOB_STORES = {
+    "memory": lambda arg: MemoryJobStore(),
+    "sqlite": lambda arg: SQLiteJobStore(arg or RESULT_DB),
+}
+
+def make_job_store(spec):
+    scheme, _, arg = spec.partition("://")
+    if scheme not in JOB_STORES:
+        raise RuntimeError(f"CIBEN_JOB_STORE tidak dikenal: {spec}")
+    return JOB_STORES[scheme](arg)
+
+JOB_STORE = make_job_store(JOB_STORE_SPEC)
+_workers = []
+_workers_lock = threading.Lock()
+
+def run_with_retry(job):
+    """
+    Jalankan job sampai sukses atau error fatal. Gangguan sementara diulang dengan backoff
+    eksponensial + jitter; URL kedaluwarsa membuang manifest di cache agar YouTube(url)
+    di-resolve ulang. Stream & potongan yang sudah terunduh tetap di checkpoint, jadi
+    percobaan berikutnya hanya mengambil sisanya.
+    """
+    while True:
+        job.attempts += 1
+        try:
+            return DOWNLOADS_INFLIGHT.do(job.key, lambda: run_download(job.url, job.quality, job.progress, job.client))
+        except Exception as e:
+            kind = classify_error(e)
+            if kind == "fatal" or job.attempts > JOB_RETRIES or SHUTTING_DOWN.is_set():
+                raise
+            if kind == "expired":
+                forget_manifest(job.url)
+            delay = 0 if kind == "expired" and job.attempts == 1 else backoff_delay(job.attempts)
+            log.warning("job %s percobaan %d gagal (%s: %s), ulang dalam %.1fs", job.id, job.attempts, kind, e, delay)
+            METRICS.inc("cibenyt_job_retries_total", kind=kind)
+            job.progress.phase("retry")
+            JOB_STORE.save(job)
+            if SHUTTING_DOWN.wait(delay):
+                raise
+
+def _job_worker():
+    while not SHUTTING_DOWN.is_set():
+        job = JOB_STORE.claim(timeout=1)
+        if job is None:
+            continue
+        if JOB_STORE.shared:
+            job.progress.listener = lambda job=job: JOB_STORE.save_progress(job)
+        try:
+            result = run_with_retry(job)
+        except Exception as e:
+            if SHUTTING_DOWN.is_set():
+                # dihentikan oleh drain(): kembalikan ke antrean, worker/node lain melanjutkan dari checkpoint
+                log.warning("job %s dikembalikan ke antrean saat shutdown", job.id)
+                JOB_STORE.requeue(job)
+                continue
+            job.error_kind = classify_error(e)
+            if job.error_kind == "fatal":
+                job.error = f"Terjadi kesalahan: {e}"
+            else:
+                job.error = f"Gagal setelah {job.attempts} percobaan: {e}"
+            job.status = "error"
+        else:
+            job.result = result
+            job.status = "done"
+        job.finished = time.time()
+        job.progress.finish(job.status)
+        JOB_STORE.save(job)
+        elapsed = job.finished - job.started
+        log.info("job %s %s %s: %s dalam %.2fs", job.id, job.key[0], job.quality, job.status, elapsed)
+        METRICS.inc("cibenyt_jobs_total", status=job.status, quality_type=job.progress.quality_type)
+        METRICS.observe("cibenyt_job_seconds", elapsed, quality_type=job.progress.quality_type)
+        if SLOW_JOB_SECONDS and elapsed >= SLOW_JOB_SECONDS:
+            breakdown = ", ".join(f"{k}={v:.2f}s" for k, v in job.progress.timings.items())
+            log.warning("job lambat %s (%s %s): %.2fs [%s]", job.id, job.key[0], job.quality, elapsed, breakdown)
+
+def start_workers():
+    # mode satu proses: worker dinyalakan saat job pertama masuk, bukan saat import
+    with _workers_lock:
+        while len(_workers) < JOB_WORKERS and not SHUTTING_DOWN.is_set():
+            t = threading.Thread(target=_job_worker, name=f"job-worker-{len(_workers)}", daemon=True)
+            t.start()
+            _workers.append(t)
+
+def drain(timeout=None):
+    """
+    Shutdown yang rapi: berhenti mengambil job baru, tunggu job yang sedang berjalan
+    paling lama `timeout` detik (CIBEN_DRAIN_TIMEOUT), lalu matikan proses ffmpeg yang
+    tersisa. Job yang terputus dikembalikan ke antrean bersama untuk worker/node lain.
+    """
+    if SHUTTING_DOWN.is_set() or not _workers:
+        SHUTTING_DOWN.set()
+        return
+    SHUTTING_DOWN.set()
+    log.info("drain: menunggu %d worker job", len(_workers))
+    deadline = time.monotonic() + (DRAIN_TIMEOUT if timeout is None else timeout)
+    for t in _workers:
+        t.join(max(0.0, deadline - time.monotonic()))
+    kill_children()
+    for t in _workers:
+        t.join(5)
+    # unduhan Range (thread, bukan proses anak) yang masih jalan: checkpoint .part dilanjutkan pemilik baru
+    for job in JOB_STORE.running_here():
+        JOB_STORE.requeue(job)
+    JOB_STORE.save_metrics(METRICS.snapshot())
+
+atexit.register(drain)
+
+def _prune_jobs():
+    JOB_STORE.prune(time.time() - JOB_TTL)
+
+def submit_job(url, quality, client="-"):
+    quality = audio_quality(quality)
+    _prune_jobs()
+    job = Job(url, quality, client)
+    cached = stored_result(url, quality)
+    if cached:
+        # sudah pernah diunduh: job langsung selesai tanpa masuk antrean
+        job.status = "done"
+        job.result = cached
+        job.started = job.finished = job.created
+        job.progress.finish("done")
+        METRICS.inc("cibenyt_jobs_total", status="cached", quality_type=job.progress.quality_type)
+        JOB_STORE.add_done(job)
+        return job
+    start_workers()
+    return JOB_STORE.add(job)
+
+METRICS.gauge("cibenyt_jobs", lambda: {(("status", st),): n for st, n in JOB_STORE.counts().items()})
+METRICS.gauge("cibenyt_job_queue_depth", lambda: JOB_STORE.queue_depth())
+METRICS.gauge("cibenyt_downloads_in_flight", lambda: DOWNLOADS_INFLIGHT.in_flight())
+METRICS.gauge("cibenyt_metadata_cache", lambda: {
+    (("kind", k),): v for k, v in METADATA_CACHE.stats().items()
+})
+
+def queue_position(job):
+    return JOB_STORE.queue_position(job)
+
+def get_job(job_id):
+    return JOB_STORE.get(job_id)
+
+def refresh_job(job):
+    """Status terbaru job (di store bersama objek lama bisa basi), atau objek itu sendiri."""
+    return get_job(job.id) or job
+
+def wait_job(job, timeout=1):
+    # job yang berjalan di proses ini bisa ditunggu lewat Progress; selain itu cukup jeda polling
+    if job.live and job.status in ("queued", "running"):
+        job.progress.wait(job.progress.version, timeout)
+    else:
+        time.sleep(timeout)
+
+def _sync_scheduler():
+    # batas dari POST /scheduler di worker mana pun, plus transfer proses lain, diperbarui tiap detik
+    while True:
+        try:
+            config, others = JOB_STORE.sync_scheduler(SCHEDULER.usage())
+            if config:
+                SCHEDULER.configure(**config)
+            SCHEDULER.set_others(others)
+        except Exception:
+            log.exception("sinkronisasi scheduler gagal")
+        time.sleep(1)
+
+def _sync_metrics():
+    # counter proses ini ke store bersama; /metrics di worker mana pun menjumlahkan semuanya
+    while True:
+        time.sleep(10)
+        try:
+            JOB_STORE.save_metrics(METRICS.snapshot())
+        except Exception:
+            log.exception("sinkronisasi metrics gagal")
+
+if JOB_STORE.shared:
+    # mode bersama: setiap proses ikut mengambil job dari antrean bersama sejak start
+    start_workers()
+    threading.Thread(target=_sync_scheduler, name="scheduler-sync", daemon=True).start()
+    threading.Thread(target=_sync_metrics, name="metrics-sync", daemon=True).start()
+
+# ---------- Batch / playlist ----------
+class Batch:
+    """
+    Sekumpulan URL (video atau playlist) dengan satu pilihan kualitas. Item dikirim ke
+    antrean job paling banyak `concurrency` sekaligus; metadata item berikutnya
+    di-prefetch selagi item sebelumnya ditransfer/merge.
+    """
+
+    def __init__(self, sources, quality, client="-", concurrency=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.sources = sources
+        self.quality = quality
+        self.client = client
+        # lebih dari kapasitas antrean tidak ada gunanya
+        self.concurrency = max(1, min(concurrency or BATCH_CONCURRENCY, JOB_QUEUE_MAX))
+        self.items = []  # {"url", "video_id", "job_id", "skipped", "error"}
+        self.status = "expanding"  # expanding -> running -> done
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.owner = OWNER  # proses yang mengirim item-item ke antrean
+        self.submitted = 0
+        self._cond = threading.Condition()
+
+    def to_row(self):
+        return {
+            "id": self.id, "sources": json.dumps(self.sources), "quality": self.quality, "client": self.client,
+            "concurrency": self.concurrency, "status": self.status, "error": self.error,
+            "created": self.created, "finished": self.finished, "owner": self.owner, "updated": time.time(),
+        }
+
+    @classmethod
+    def from_row(cls, row, item_rows):
+        batch = cls.__new__(cls)
+        batch.id, batch.quality, batch.client = row["id"], row["quality"], row["client"]
+        batch.sources = json.loads(row["sources"])
+        batch.concurrency, batch.status, batch.error = row["concurrency"], row["status"], row["error"]
+        batch.created, batch.finished, batch.owner = row["created"], row["finished"], row["owner"]
+        batch.items = [{"url": r["url"], "video_id": r["video_id"], "job_id": r["job_id"],
+                        "skipped": bool(r["skipped"]), "error": r["error"]} for r in item_rows]
+        batch.submitted = 0
+        batch._cond = threading.Condition()
+        return batch
+
+    def item_dict(self, item):
+        job = get_job(item["job_id"]) if item["job_id"] else None
+        result = (job.result if job else None) or {}
+        if item["error"]:
+            status = "error"
+        elif not job:
+            status = "pending"
+        elif item["skipped"]:
+            status = "skipped"
+        else:
+            status = job.status
+        return {
+            "url": item["url"],
+            "video_id": item["video_id"],
+            "status": status,
+            "job_id": job.id if job else None,
+            "title": result.get("yt_title"),
+            "file_path": result.get("file_path"),
+            "size": result.get("size"),
+            "sha256": result.get("sha256"),
+            "error": item["error"] or (job.error if job else None),
+        }
+
+    def to_dict(self):
+        items = [self.item_dict(item) for item in self.items]
+        counts = {}
+        for item in items:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        return {
+            "id": self.id,
+            "quality": self.quality,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+            "counts": counts,
+            "total_bytes": sum(item["size"] or 0 for item in items),
+            "items": items,
+        }
+
+def expand_sources(sources):
+    """URL video/playlist -> daftar item unik per video ID (URL tidak valid jadi item error)."""
+    items, seen = [], set()
+
+    def add(url, error=None):
+        video_id = extract_video_id(url)
+        if video_id in seen and not error:
+            return
+        seen.add(video_id)
+        items.append({"url": url, "video_id": video_id, "job_id": None, "skipped": False, "error": error})
+
+    for source in sources:
+        if len(items) >= BATCH_MAX_ITEMS:
+            break
+        if valid_playlist_url(source):
+            try:
+                urls = list(Playlist(source).video_urls)
+            except Exception as e:
+                add(source, f"Playlist gagal dibaca: {e}")
+                continue
+            for url in urls:
+                add(clean_youtube_url(url))
+        elif valid_youtube_url(source):
+            add(clean_youtube_url(source))
+        else:
+            add(source, "URL YouTube tidak valid!")
+    return items[:BATCH_MAX_ITEMS]
+
+def _prefetch_batch(batch):
+    # hangatkan cache metadata paling banyak `concurrency` item di depan yang sedang dikirim
+    for i, item in enumerate(batch.items):
+        with batch._cond:
+            batch._cond.wait_for(lambda: i < batch.submitted + batch.concurrency)
+            if i < batch.submitted:
+                continue
+        if item["error"] or lookup_result(item["video_id"], batch.quality):
+            continue
+        try:
+            get_manifest(item["url"])
+        except Exception:
+            pass  # errornya dilaporkan oleh job item itu sendiri
+
+def _run_batch(batch):
+    """Kirim item batch ke antrean; bisa dilanjutkan proses lain dari state di store (item yang sudah punya job dilewati)."""
+    if batch.status == "expanding":
+        try:
+            batch.items = expand_sources(batch.sources)
+        except Exception as e:
+            batch.error = f"Terjadi kesalahan: {e}"
+        batch.status = "running"
+        JOB_STORE.save_batch(batch, range(len(batch.items)))
+    threading.Thread(target=_prefetch_batch, args=(batch,), name=f"batch-prefetch-{batch.id}", daemon=True).start()
+    active = []
+    for i, item in enumerate(batch.items):
+        if item["job_id"]:
+            # dikirim sebelum batch diambil alih: job yang masih berjalan ikut dihitung
+            job = get_job(item["job_id"])
+            if job and job.status in ("queued", "running"):
+                active.append(job)
+        elif not item["error"]:
+            while True:
+                active = [j for j in map(refresh_job, active) if j.status in ("queued", "running")]
+                if len(active) < batch.concurrency:
+                    break
+                wait_job(active[0])
+            while True:
+                try:
+                    job = submit_job(item["url"], batch.quality, batch.client)
+                    break
+                except QueueFullError:
+                    time.sleep(1)
+            item["job_id"] = job.id
+            # sudah ada di index: dilewati tanpa unduh ulang
+            item["skipped"] = bool(job.status == "done" and (job.result or {}).get("cached"))
+            JOB_STORE.save_batch(batch, (i,))
+            if job.status in ("queued", "running"):
+                active.append(job)
+        with batch._cond:
+            batch.submitted = i + 1
+            batch._cond.notify_all()
+    for job in active:
+        while job.status in ("queued", "running"):
+            wait_job(job)
+            job = refresh_job(job)
+    batch.status = "done"
+    batch.finished = time.time()
+    JOB_STORE.save_batch(batch)
+    log.info("batch %s selesai: %s", batch.id, batch.to_dict()["counts"])
+
+def submit_batch(sources, quality, client="-", concurrency=None):
+    _prune_jobs()
+    batch = Batch(sources, quality, client, concurrency)
+    JOB_STORE.save_batch(batch)
+    threading.Thread(target=_run_batch, args=(batch,), name=f"batch-{batch.id}", daemon=True).start()
+    return batch
+
+def resume_batches():
+    """Lanjutkan batch yang ditinggal proses/node yang mati (mode store bersama)."""
+    for batch in JOB_STORE.orphan_batches():
+        threading.Thread(target=_run_batch, args=(batch,), name=f"batch-{batch.id}", daemon=True).start()
+
+def _batch_recovery():
+    while True:
+        try:
+            resume_batches()
+        except Exception:
+            log.exception("pemulihan batch gagal")
+        time.sleep(30)
+
+if JOB_STORE.shared:
+    threading.Thread(target=_batch_recovery, name="batch-recovery", daemon=True).start()
+
+def batch_files(batch):
+    """(nama file, path) hasil batch yang ada di folder unduhan."""
+    files = []
+    for item in batch.to_dict()["items"]:
+        if item["status"] in ("done", "skipped") and item["file_path"]:
+            name = item["file_path"].rsplit("/", 1)[-1]
+            path = os.path.join(DOWNLOAD_FOLDER, name)
+            if os.path.isfile(path):
+                files.append((name, path))
+    return files
+
+class _ChunkSink:
+    """File tulis-saja tanpa seek untuk zipfile: byte yang ditulis diambil generator per potongan."""
+
+    def __init__(self):
+        self.chunks = []
+        self.pos = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def _read_chunks(path, size=1024 * 1024):
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(size)
+            if not block:
+                return
+            yield block
+
+def stream_zip(files, manifest):
+    """ZIP (stored, zip64) yang dibangun sambil dikirim: file dibaca langsung dari folder unduhan."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+        for name, path in files:
+            with zf.open(name, "w", force_zip64=True) as entry:
+                for block in _read_chunks(path):
+                    entry.write(block)
+                    yield sink.drain()
+        zf.writestr("manifest.json", manifest)
+    yield sink.drain()
+
+def stream_tar(files, manifest):
+    """Tar (PAX) yang dibangun sambil dikirim: header per file, isi file, lalu padding 512 byte."""
+    entries = [(name, path, None) for name, path in files] + [("manifest.json", None, manifest.encode())]
+    for name, path, data in entries:
+        info = tarfile.TarInfo(name)
+        info.mode = 0o644
+        if data is None:
+            st = os.stat(path)
+            info.size, info.mtime = st.st_size, int(st.st_mtime)
+        else:
+            info.size, info.mtime = len(data), int(time.time())
+        yield info.tobuf(tarfile.PAX_FORMAT, "utf-8")
+        sent = 0
+        for block in (_read_chunks(path) if data is None else [data]):
+            block = block[:info.size - sent]
+            sent += len(block)
+            yield block
+        # file bisa saja mengecil di tengah jalan; isi sisanya agar arsip tetap valid
+        if sent < info.size:
+            yield b"\0" * (info.size - sent)
+        yield b"\0" * (-info.size % tarfile.BLOCKSIZE)
+    yield b"\0" * (2 * tarfile.BLOCKSIZE)
+
+# ---------- Aset statis ----------
+# static/app.css & static/app.js adalah sumbernya; `python build_assets.py` membuat
+# static/dist/app.<hash>.{css,js} (Tailwind dipurge + Alpine, minified, .gz/.br) dan manifest.json.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+ASSET_MANIFEST = os.path.join(STATIC_DIR, "dist", "manifest.json")
+
+def load_assets():
+    """{'app.css': '/assets/dist/app.<hash>.css', ...} dari hasil build, atau None (pakai CDN)."""
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return out_path
-    except Exception:
-        # fallback re-encode ringan ke mp4 untuk kompatibilitas luas
-        out_path = os.path.join(DOWNLOAD_FOLDER, out_basename + ".mp4")
-        cmd_reencode = [
-            "ffmpeg", "-y",
-            "-i", video_path, "-i", audio_path,
-            "-c:v", "libx264", "-c:a", "aac", "-b:a", "192k",
-            "-movflags", "+faststart",
-            out_path
-        ]
-        subprocess.run(cmd_reencode, check=True)
-        return out_path
+        with open(ASSET_MANIFEST) as f:
+            return {name: f"/assets/dist/{built}" for name, built in json.load(f).items()}
+    except (OSError, ValueError):
+        return None
+
+ASSETS = load_assets()
+
+@app.route("/assets/<path:name>")
+def static_asset(name):
+    path = safe_join(STATIC_DIR, name)
+    if not path or not os.path.isfile(path):
+        return "File tidak ditemukan", 404
+    mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    encoding = None
+    # varian terkompresi dibuat saat build, bukan per request
+    for enc, ext in (("br", ".br"), ("gzip", ".gz")):
+        if enc in request.accept_encodings and os.path.isfile(path + ext):
+            path, encoding = path + ext, enc
+            break
+    resp = send_file(path, mimetype=mimetype, conditional=True, etag=True)
+    resp.headers.pop("Content-Disposition", None)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept-Encoding"
+    # nama di dist/ mengandung hash isi, jadi aman di-cache selamanya
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable" if name.startswith("dist/") else "no-cache"
+    return resp
 
-# ---------- UI (Tailwind + Alpine) ----------
 # ---------- UI (Tailwind + Alpine) ----------
 html_form = """
 <!doctype html>
@@ -75,95 +3247,18 @@ html_form = """
   <meta charset="UTF-8">
   <meta name="viewport" content="width=device-width, initial-scale=1, viewport-fit=cover">
   <meta name="theme-color" content="#111827">
+  {% if assets %}
+  <link rel="stylesheet" href="{{ assets['app.css'] }}">
+  <script defer src="{{ assets['app.js'] }}"></script>
+  {% else %}
+  <!-- belum ada hasil build_assets.py: Tailwind JIT di browser (lambat di HP) -->
   <script src="https://cdn.tailwindcss.com"></script>
+  <script>tailwind.config = {darkMode: 'class'}</script>
+  <link rel="stylesheet" href="/assets/app.css">
+  <script defer src="/assets/app.js"></script>
   <script defer src="https://unpkg.com/alpinejs@3.x.x/dist/cdn.min.js"></script>
+  {% endif %}
   <title>Ciben YT Downloader</title>
-  <style>
-    :root{
-      --bg1: #ef4444;  /* red-500 */
-      --bg2: #3b82f6;  /* blue-500 */
-      --bg3: #22c55e;  /* green-500 */
-      --bg4: #eab308;  /* yellow-500 */
-    }
-    .dark:root{
-      --bg1: #f43f5e; /* rose-500 */
-      --bg2: #06b6d4; /* cyan-500 */
-      --bg3: #a855f7; /* violet-500 */
-      --bg4: #fb7185; /* rose-400 */
-    }
-
-    /* Layer gradient animasi halus */
-    .animated-bg{
-      position: fixed; inset: 0; z-index: -2;
-      background:
-        radial-gradient(1200px 600px at 10% 15%, color-mix(in oklab, var(--bg1), transparent 80%), transparent),
-        radial-gradient(800px 500px at 90% 20%, color-mix(in oklab, var(--bg2), transparent 82%), transparent),
-        radial-gradient(1000px 600px at 60% 85%, color-mix(in oklab, var(--bg3), transparent 82%), transparent),
-        radial-gradient(1200px 800px at 30% 60%, color-mix(in oklab, var(--bg4), transparent 85%), transparent);
-      filter: saturate(1.1);
-      animation: gradientShift 24s ease-in-out infinite alternate;
-    }
-    @keyframes gradientShift{
-      0%   { transform: translate3d(0,0,0); filter: hue-rotate(0deg) saturate(1.05); }
-      50%  { transform: translate3d(-1.5%, -1%, 0); filter: hue-rotate(10deg) saturate(1.15); }
-      100% { transform: translate3d(1.5%, 1%, 0); filter: hue-rotate(-10deg) saturate(1.1); }
-    }
-
-    /* Layer bola Pokémon */
-    .bubble-layer{ position: fixed; inset: 0; z-index: -1; pointer-events:none; overflow:hidden; }
-    .poke{
-      position:absolute; border-radius:9999px;
-      box-shadow:
-        0 0 0 2px rgba(0,0,0,.25) inset,
-        0 8px 24px rgba(0,0,0,.12);
-      will-change: transform;
-    }
-    /* Desain pokeball dengan gradient (setengah merah/putih + garis hitam + lingkaran tengah) */
-    .poke::before, .poke::after{ content:""; position:absolute; inset:0; border-radius:inherit; }
-    /* Top half merah & bottom putih menggunakan linear-gradient */
-    .poke::before{
-      background:
-        linear-gradient(#000 0 0) center/100% 10% no-repeat, /* garis hitam tengah, disetel via transform */
-        linear-gradient(to bottom, #ef4444 0 50%, #ffffff 50% 100%);
-      transform: translateY(calc(var(--line, 0%) - 0%)); /* placeholder agar mudah diubah bila perlu */
-      opacity:.98;
-    }
-    /* Tombol pusat */
-    .poke::after{
-      width:34%; height:34%; margin:auto; top:0; bottom:0; left:0; right:0;
-      border-radius:9999px; background:
-        radial-gradient(circle at 50% 50%, #fff 0 45%, #000 46% 60%, transparent 61%);
-      box-shadow: 0 0 0 2px rgba(0,0,0,.35);
-    }
-
-    /* Animasi gerak lembut (kombinasi) */
-    @keyframes floatY { 0%{ transform: translateY(0px) } 50%{ transform: translateY(-18px) } 100%{ transform: translateY(0px) } }
-    @keyframes driftX { 0%{ transform: translateX(0px) } 50%{ transform: translateX(16px) } 100%{ transform: translateX(0px) } }
-
-    .floatY{ animation: floatY var(--fy, 12s) ease-in-out infinite; }
-    .driftX{ animation: driftX var(--fx, 14s) ease-in-out infinite; }
-
-    /* Aksesibilitas: hormati reduced-motion */
-    @media (prefers-reduced-motion: reduce){
-      .animated-bg, .floatY, .driftX{ animation: none !important; }
-    }
-
-    /* Card blur halus di atas background */
-    .surface{
-      backdrop-filter: blur(8px);
-      background: color-mix(in oklab, #ffffff, transparent 8%);
-    }
-    .dark .surface{
-      background: color-mix(in oklab, #0b1220, transparent 5%);
-    }
-
-    /* Micro transitions untuk tombol */
-    @media (prefers-reduced-motion:no-preference){
-      .btn-trans{ transition: transform .15s ease, box-shadow .2s ease; }
-      .btn-trans:active{ transform: translateY(1px) scale(.995); }
-      .btn-trans:hover{ box-shadow: 0 6px 16px rgba(0,0,0,.12); }
-    }
-  </style>
 </head>
 <body class="min-h-screen bg-white/60 dark:bg-gray-950/60 text-gray-900 dark:text-gray-100">
   <!-- Background layers -->
@@ -190,7 +3285,7 @@ html_form = """
   <main class="max-w-4xl mx-auto px-4 pb-28 pt-6">
     <!-- Card -->
     <div class="rounded-2xl border border-gray-200/70 dark:border-gray-800/70 surface">
-      <form id="mainForm" method="POST" class="p-4 sm:p-6 space-y-4" @submit="onSubmit">
+      <form id="mainForm" method="POST" class="p-4 sm:p-6 space-y-4" @submit="onSubmit($event)">
         <!-- URL input -->
         <div>
           <label class="block text-sm font-semibold mb-1">URL YouTube</label>
@@ -221,6 +3316,27 @@ html_form = """
           <p class="mt-1 text-xs text-gray-700/80 dark:text-gray-300/80" x-show="mode==='max'">
             Menggunakan stream adaptive. <span x-text="ffmpeg ? 'FFmpeg terdeteksi: akan otomatis merge.' : 'FFmpeg tidak terdeteksi: unduhan bisa video-only.'"></span>
           </p>
+          <label class="mt-2 flex items-center gap-2 text-xs" x-show="mode==='max' && ffmpeg">
+            <input type="checkbox" x-model="streamMode" class="rounded">
+            <span>Langsung stream (file mulai terunduh dalam hitungan detik)</span>
+          </label>
+        </div>
+
+        <!-- Klip (opsional) -->
+        <div>
+          <div class="grid grid-cols-2 gap-2">
+            <div>
+              <label class="block text-sm font-semibold mb-1">Mulai</label>
+              <input type="text" name="start" value="{{ start or '' }}" placeholder="0:00" inputmode="decimal"
+                     class="w-full px-3 py-2 rounded-xl border border-gray-200 dark:border-gray-700 bg-white/80 dark:bg-gray-800/70 focus:outline-none focus:ring-2 focus:ring-red-400">
+            </div>
+            <div>
+              <label class="block text-sm font-semibold mb-1">Selesai</label>
+              <input type="text" name="end" value="{{ end or '' }}" placeholder="akhir video" inputmode="decimal"
+                     class="w-full px-3 py-2 rounded-xl border border-gray-200 dark:border-gray-700 bg-white/80 dark:bg-gray-800/70 focus:outline-none focus:ring-2 focus:ring-red-400">
+            </div>
+          </div>
+          <p class="mt-1 text-xs text-gray-700/80 dark:text-gray-300/80">Opsional, mis. 1:30 – 2:00. Hanya bagian itu yang diunduh (butuh FFmpeg).</p>
         </div>
 
         <!-- Quality selector -->
@@ -230,18 +3346,23 @@ html_form = """
             <select name="quality" x-model="quality"
                     class="w-full px-3 py-3 rounded-xl border border-gray-200 dark:border-gray-700 bg-white/80 dark:bg-gray-800/70 focus:outline-none focus:ring-2 focus:ring-red-400">
               <optgroup label="Mudah (progressive)">
-              {% for r in progressive_res %}
-                <option value="p:{{ r }}" {% if ('p:'+r)==quality %}selected{% endif %}>{{ r }} (video+audio)</option>
-              {% endfor %}
-              <option value="a:audio" {% if quality=='a:audio' %}selected{% endif %}>Audio saja</option>
+                <template x-for="r in progressiveRes" :key="'p:'+r">
+                  <option :value="'p:'+r" :selected="('p:'+r)===quality" x-text="r + ' (video+audio)'"></option>
+                </template>
+                <option value="a:audio" :selected="quality==='a:audio'">Audio saja</option>
+              </optgroup>
+              <optgroup label="Audio (konversi FFmpeg)" x-show="ffmpeg">
+                <option value="a:mp3-192" :selected="quality==='a:mp3-192'">MP3 192 kbps</option>
+                <option value="a:mp3-192+norm" :selected="quality==='a:mp3-192+norm'">MP3 192 kbps (volume dinormalisasi)</option>
+                <option value="a:opus-128" :selected="quality==='a:opus-128'">Opus 128 kbps</option>
+                <option value="a:aac-192" :selected="quality==='a:aac-192'">AAC 192 kbps</option>
+                <option value="a:flac" :selected="quality==='a:flac'">FLAC (lossless)</option>
               </optgroup>
-              {% if adaptive_res %}
-              <optgroup label="Maks (adaptive)">
-              {% for r in adaptive_res %}
-                <option value="v:{{ r }}" {% if ('v:'+r)==quality %}selected{% endif %}>{{ r }} (hingga 4K)</option>
-              {% endfor %}
+              <optgroup label="Maks (adaptive)" x-show="adaptiveRes.length">
+                <template x-for="r in adaptiveRes" :key="'v:'+r">
+                  <option :value="'v:'+r" :selected="('v:'+r)===quality" x-text="r + ' (hingga 4K)'"></option>
+                </template>
               </optgroup>
-              {% endif %}
             </select>
           </div>
           <button type="submit" :disabled="loading" class="w-full bg-red-500 hover:bg-red-600 disabled:opacity-60 disabled:cursor-not-allowed text-white px-4 py-3 rounded-xl font-semibold transition flex items-center justify-center gap-2 btn-trans">
@@ -270,18 +3391,29 @@ html_form = """
         <div class="p-3 rounded-lg bg-red-100/90 text-red-900 border border-red-200">{{ error }}</div>
         {% endif %}
 
-        {% if file_path %}
-        <div class="p-3 rounded-lg bg-green-100/90 text-green-900 border border-green-200">
+        <div x-show="jobId && jobStatus !== 'done' && jobStatus !== 'error'" class="p-3 rounded-lg bg-blue-100/90 text-blue-900 border border-blue-200 text-sm">
+          <span x-text="jobStatus === 'running' ? phaseLabel : 'Dalam antrean...'"></span>
+          <span class="opacity-70" x-show="queuePosition > 0" x-text="'(posisi ' + queuePosition + ')'"></span>
+          <div x-show="progress.total" class="mt-2">
+            <div class="h-2 rounded-full bg-blue-200/80 overflow-hidden">
+              <div class="h-full bg-blue-500 transition-all" :style="`width:${progressPct}%`"></div>
+            </div>
+            <div class="mt-1 text-xs opacity-80" x-text="progressText"></div>
+          </div>
+        </div>
+
+        <div x-show="jobError" class="p-3 rounded-lg bg-red-100/90 text-red-900 border border-red-200" x-text="jobError"></div>
+
+        <div x-show="fileUrl" class="p-3 rounded-lg bg-green-100/90 text-green-900 border border-green-200">
           <div class="flex flex-col sm:flex-row sm:items-center sm:justify-between gap-2">
             <div>
               <p class="font-semibold">Berhasil diproses!</p>
-              {% if yt_title %}<p class="text-sm opacity-80 truncate">{{ yt_title }}</p>{% endif %}
-              {% if note %}<p class="text-xs mt-1 text-emerald-800/90">{{ note }}</p>{% endif %}
+              <p class="text-sm opacity-80 truncate" x-show="serverTitle" x-text="serverTitle"></p>
+              <p class="text-xs mt-1 text-emerald-800/90" x-show="note" x-text="note"></p>
             </div>
-            <a href="{{ file_path }}" class="inline-flex items-center gap-2 px-4 py-2 rounded-lg bg-emerald-600 hover:bg-emerald-700 text-white font-semibold btn-trans">⬇️ Unduh</a>
+            <a :href="fileUrl" class="inline-flex items-center gap-2 px-4 py-2 rounded-lg bg-emerald-600 hover:bg-emerald-700 text-white font-semibold btn-trans">⬇️ Unduh</a>
           </div>
         </div>
-        {% endif %}
       </form>
     </div>
 
@@ -311,216 +3443,640 @@ html_form = """
     </div>
   </div>
 
-  <script>
-    function app() {
-      return {
-        url: "{{ url or '' }}",
-        quality: "{{ quality or 'p:720p' }}",
-        mode: "{{ 'easy' if (quality or '').startswith('p:') or (quality=='a:audio') else 'max' }}",
-        loading: false,
-        darkMode: (() => {
-          const saved = localStorage.getItem('theme');
-          if (saved === 'dark') return true;
-          if (saved === 'light') return false;
-          return window.matchMedia('(prefers-color-scheme: dark)').matches;
-        })(),
-        serverTitle: {{ (yt_title|tojson) if yt_title else 'null' }},
-        ffmpeg: {{ 'true' if ffmpeg_ok else 'false' }},
-        get videoId() {
-          const m = (this.url||'').match(/(?:v=|youtu\\.be\\/)([\\w-]{6,})/);
-          return m ? m[1] : '';
-        },
-        get thumbnailUrl() {
-          return this.videoId ? `https://img.youtube.com/vi/${this.videoId}/maxresdefault.jpg` : '';
-        },
-        get qualityLabel(){
-          if(!this.quality) return '';
-          if(this.quality.startsWith('p:')) return this.quality.slice(2) + ' (prog)';
-          if(this.quality.startsWith('v:')) return this.quality.slice(2) + ' (adaptive)';
-          if(this.quality==='a:audio') return 'Audio';
-          return this.quality;
-        },
-        onUrlInput(){ this.serverTitle = null; },
-        onSubmit(){ this.loading = true; setTimeout(()=>{},0); },
-        pasteUrl(){
-          if(navigator.clipboard){
-            navigator.clipboard.readText().then(t=>{ if(t) this.url=t.trim(); });
-          }
-        },
-        scrollToTop(){ window.scrollTo({top:0, behavior:'smooth'}); },
-        toggleTheme(){
-          this.darkMode = !this.darkMode;
-          localStorage.setItem('theme', this.darkMode ? 'dark' : 'light');
-          // sinkronkan meta theme-color agar status bar Android enak dilihat
-          const meta = document.querySelector('meta[name="theme-color"]');
-          if (meta) meta.setAttribute('content', this.darkMode ? '#111827' : '#ffffff');
-        }
-      }
-    }
-
-    // ==== Poké Ball bubbles generator (ringan) ====
-    (function(){
-      const layer = document.getElementById('bubbleLayer');
-      if(!layer) return;
-      const prefersReduced = window.matchMedia('(prefers-reduced-motion: reduce)').matches;
-      const count = prefersReduced ? 4 : 10 + Math.floor(Math.random()*5); // 10-14 bola
-      for(let i=0;i<count;i++){
-        const b = document.createElement('div');
-        const size = (Math.random()*8 + 6) * (window.innerWidth<480?3.5:5); // responsive
-        const left = Math.random()*100;
-        const top  = Math.random()*100;
-        const fy = (Math.random()*8 + 10).toFixed(1) + 's';
-        const fx = (Math.random()*8 + 12).toFixed(1) + 's';
-        const op = (Math.random()*0.35 + 0.2).toFixed(2); // 0.2 - 0.55
-        b.className = 'poke floatY driftX';
-        b.style.width = size+'px';
-        b.style.height = size+'px';
-        b.style.left = left+'%';
-        b.style.top = top+'%';
-        b.style.setProperty('--fy', fy);
-        b.style.setProperty('--fx', fx);
-        b.style.opacity = op;
-        layer.appendChild(b);
-      }
-    })();
-
-    // sinkronkan theme-color awal
-    (function(){
-      const saved = localStorage.getItem('theme');
-      const isDark = saved ? saved==='dark' : window.matchMedia('(prefers-color-scheme: dark)').matches;
-      const meta = document.querySelector('meta[name="theme-color"]');
-      if (meta) meta.setAttribute('content', isDark ? '#111827' : '#ffffff');
-    })();
-  </script>
+  <script id="page-data" type="application/json">{{ page|tojson }}</script>
 </body>
 </html>
 """
 
+_index_template = None
+
+def index_template():
+    # dikompilasi sekali; render_template_string mem-parse ulang ~20 KB sumber di tiap request
+    global _index_template
+    if _index_template is None:
+        _index_template = app.jinja_env.from_string(html_form)
+    return _index_template
+
 # ---------- Routes ----------
+def client_id():
+    # di belakang reverse proxy, alamat klien asli ada di X-Forwarded-For
+    forwarded = request.headers.get("X-Forwarded-For", "")
+    return forwarded.split(",")[0].strip() or request.remote_addr or "-"
+
+def request_quality(data):
+    """Kunci kualitas dari form/JSON/query: kualitas + policy + rentang klip (ValueError bila tidak valid)."""
+    quality = with_policy(data.get("quality") or "p:720p", data.get("policy") or "")
+    quality = clip_quality(quality, parse_timestamp(str(data.get("start") or "")),
+                           parse_timestamp(str(data.get("end") or "")))
+    return audio_quality(quality)
+
 @app.route("/", methods=["GET", "POST"])
 def index():
-    file_path = None
     error = None
-    note = None
     url = ""
     quality = "p:720p"
-    yt_title = None
-
-    progressive_res = ["720p", "480p", "360p"]
-    adaptive_res = []
+    job_id = None
+    result = None
+    start = end = ""
 
     if request.method == "POST":
         url = clean_youtube_url(request.form.get("url", "").strip())
         quality = request.form.get("quality", "p:720p")
+        start = request.form.get("start", "")
+        end = request.form.get("end", "")
 
         if not valid_youtube_url(url):
             error = "URL YouTube tidak valid!"
         else:
             try:
-                yt = YouTube(url)
-                yt_title = yt.title
-
-                # Kumpulkan progressive & adaptive
-                prog_streams = yt.streams.filter(progressive=True, file_extension='mp4')
-                progressive_res = sorted(
-                    list({s.resolution for s in prog_streams if s.resolution}),
-                    key=lambda x: int(x.replace('p','')), reverse=True
-                )
-                # Adaptive video-only (hingga 4K)
-                adapt_streams = yt.streams.filter(adaptive=True, only_video=True)
-                adaptive_res = sorted(
-                    list({s.resolution for s in adapt_streams if s.resolution}),
-                    key=lambda x: int(x.replace('p','')), reverse=True
-                )
+                job = submit_job(url, request_quality(request.form), client_id())
+                job_id = job.id
+                # hasil dari index langsung ditampilkan tanpa polling
+                result = job.result if job.status == "done" else None
+            except (QueueFullError, ValueError) as e:
+                error = str(e)
 
-                # Eksekusi berdasarkan pilihan
-                if quality.startswith("p:"):
-                    res = quality.split(":",1)[1]
-                    stream = prog_streams.filter(res=res).first()
-                    if not stream:
-                        stream = yt.streams.get_highest_resolution()
-                    ext = ".mp4"
-                    filename = safe_filename(yt_title) + ext
-                    output = stream.download(output_path=DOWNLOAD_FOLDER, filename=filename)
-                    file_name = os.path.basename(output)
-                    file_path = f"/download/{file_name}"
-                    note = "Mode Mudah (progressive): video+audio dalam satu file."
-
-                elif quality == "a:audio":
-                    a_stream = yt.streams.filter(only_audio=True).order_by("abr").desc().first()
-                    if not a_stream:
-                        raise RuntimeError("Stream audio tidak ditemukan.")
-                    # simpan dengan ekstensi asli
-                    ext = "." + (a_stream.mime_type.split("/")[-1] if a_stream.mime_type else "m4a")
-                    filename = safe_filename(yt_title) + ext
-                    output = a_stream.download(output_path=DOWNLOAD_FOLDER, filename=filename)
-                    file_name = os.path.basename(output)
-                    file_path = f"/download/{file_name}"
-                    note = "Audio saja. Jika ingin MP3, aktifkan FFmpeg dan saya bisa konversi otomatis."
-
-                elif quality.startswith("v:"):
-                    # Adaptive: ambil video-only pada resolusi dipilih + audio terbaik
-                    res = quality.split(":",1)[1]
-                    v_stream = yt.streams.filter(adaptive=True, only_video=True, res=res).first()
-                    if not v_stream:
-                        # fallback ke resolusi adaptif tertinggi
-                        v_stream = yt.streams.filter(adaptive=True, only_video=True).order_by("resolution").desc().first()
-                        res = v_stream.resolution if v_stream else res
-                    if not v_stream:
-                        raise RuntimeError("Stream video adaptive tidak tersedia.")
-
-                    a_stream = yt.streams.filter(only_audio=True).order_by("abr").desc().first()
-                    if not a_stream:
-                        raise RuntimeError("Stream audio tidak ditemukan.")
-
-                    base = safe_filename(f"{yt_title} [{res}]")
-                    # unduh ke temp lalu merge jika ffmpeg ada
-                    with tempfile.TemporaryDirectory() as td:
-                        v_ext = "." + (v_stream.mime_type.split("/")[-1] if v_stream.mime_type else "mp4")
-                        a_ext = "." + (a_stream.mime_type.split("/")[-1] if a_stream.mime_type else "m4a")
-                        v_tmp = os.path.join(td, "v"+v_ext)
-                        a_tmp = os.path.join(td, "a"+a_ext)
-                        v_stream.download(output_path=td, filename=os.path.basename(v_tmp))
-                        a_stream.download(output_path=td, filename=os.path.basename(a_tmp))
-
-                        if ffmpeg_available():
-                            out_path = merge_av(v_tmp, a_tmp, base, v_stream.mime_type, a_stream.mime_type)
-                            file_name = os.path.basename(out_path)
-                            file_path = f"/download/{file_name}"
-                            note = f"Mode Maks: {res} digabung otomatis dengan FFmpeg."
-                        else:
-                            # tanpa ffmpeg: simpan video-only agar tetap bisa diunduh cepat
-                            out_path = os.path.join(DOWNLOAD_FOLDER, base + v_ext)
-                            shutil.move(v_tmp, out_path)
-                            file_name = os.path.basename(out_path)
-                            file_path = f"/download/{file_name}"
-                            note = f"Mode Maks: {res} (video-only). Install FFmpeg untuk menggabungkan audio."
-                else:
-                    raise RuntimeError("Pilihan kualitas tidak dikenal.")
+    page = {
+        "job_id": job_id,
+        "result": result,
+        "url": url,
+        "quality": quality,
+        "progressive_res": ["720p", "480p", "360p"],
+        "adaptive_res": [],
+        "ffmpeg_ok": ffmpeg_available(),
+    }
+    return render_template(index_template(), page=page, error=error, url=url, start=start, end=end, assets=ASSETS)
 
-            except Exception as e:
-                error = f"Terjadi kesalahan: {e}"
-
-    return render_template_string(
-        html_form,
-        file_path=file_path,
-        error=error,
-        note=note,
-        url=url,
-        quality=quality,
-        yt_title=yt_title,
-        progressive_res=progressive_res,
-        adaptive_res=adaptive_res,
-        ffmpeg_ok=ffmpeg_available(),
-        download_folder=DOWNLOAD_FOLDER
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    data = request.get_json(silent=True) or request.form
+    url = clean_youtube_url((data.get("url") or "").strip())
+    if not valid_youtube_url(url):
+        return jsonify(error="URL YouTube tidak valid!"), 400
+    try:
+        quality = request_quality(data)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    try:
+        job = submit_job(url, quality, client_id())
+    except QueueFullError as e:
+        return jsonify(error=str(e)), 503
+    return jsonify(job_id=job.id, status_url=f"/jobs/{job.id}"), 202
+
+@app.route("/batches", methods=["POST"])
+def create_batch():
+    data = request.get_json(silent=True) or request.form
+    urls = data.get("urls") or data.get("url") or []
+    if isinstance(urls, str):
+        urls = urls.split()
+    sources = [u.strip() for u in urls if isinstance(u, str) and u.strip()]
+    if not sources:
+        return jsonify(error="Daftar URL kosong"), 400
+    try:
+        concurrency = int(data.get("concurrency") or 0) or None
+    except (TypeError, ValueError):
+        return jsonify(error="concurrency harus angka"), 400
+    try:
+        quality = audio_quality(with_policy(data.get("quality") or "p:720p", data.get("policy") or ""))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    batch = submit_batch(sources, quality, client_id(), concurrency)
+    return jsonify(batch_id=batch.id, status_url=f"/batches/{batch.id}",
+                   archive_url=f"/batches/{batch.id}/archive"), 202
+
+@app.route("/batches/<batch_id>")
+def batch_status(batch_id):
+    batch = JOB_STORE.get_batch(batch_id)
+    if not batch:
+        return jsonify(error="Batch tidak ditemukan"), 404
+    return jsonify(batch.to_dict())
+
+@app.route("/batches/<batch_id>/archive")
+def batch_archive(batch_id):
+    """Hasil batch sebagai ZIP/tar yang di-stream (tanpa salinan kedua di disk), plus manifest.json."""
+    batch = JOB_STORE.get_batch(batch_id)
+    if not batch:
+        return "Batch tidak ditemukan", 404
+    fmt = request.args.get("format", "zip")
+    if fmt not in ("zip", "tar"):
+        return "Format harus zip atau tar", 400
+    if batch.status != "done" and request.args.get("partial") != "1":
+        return "Batch belum selesai (tambahkan ?partial=1 untuk hasil yang sudah ada)", 409
+    files = batch_files(batch)
+    for name, _ in files:
+        touch_access(name)
+    manifest = json.dumps(batch.to_dict(), indent=2)
+    body = stream_zip(files, manifest) if fmt == "zip" else stream_tar(files, manifest)
+    resp = Response(body, mimetype="application/zip" if fmt == "zip" else "application/x-tar")
+    resp.headers["Content-Disposition"] = content_disposition(f"batch-{batch.id}.{fmt}")
+    return resp
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify(error="Job tidak ditemukan"), 404
+    data = job.to_dict()
+    data["queue_position"] = queue_position(job) if job.status == "queued" else 0
+    return jsonify(data)
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-Sent Events: progres job (fase, byte, total, throughput) sampai job selesai."""
+    job = get_job(job_id)
+    if not job:
+        return "Job tidak ditemukan", 404
+
+    def generate():
+        current, version = job, -1
+        while True:
+            if current.live:
+                new_version, state = current.progress.wait(version)
+            else:
+                # job dijalankan worker lain: ikuti progres yang disimpan di store bersama
+                if version != -1:
+                    time.sleep(1)
+                current = get_job(job_id) or current
+                state = dict(current.progress.state)
+                if current.status in ("done", "error"):
+                    state["phase"] = current.status
+                new_version = json.dumps([current.status, state], sort_keys=True)
+            if new_version == version:
+                yield ": ping\n\n"
+                continue
+            version = new_version
+            yield f"data: {json.dumps(dict(state, status=current.status))}\n\n"
+            if state["phase"] in ("done", "error"):
+                return
+
+    resp = Response(generate(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = get_job(job_id)
+    if not job:
+        return "Job tidak ditemukan", 404
+    if job.status == "done":
+        return redirect(job.result["file_path"])
+    if job.status == "error":
+        return job.error, 500
+    return "Job belum selesai", 202
+
+@app.route("/prefetch")
+def prefetch():
+    # dipanggil halaman saat URL ditempel, supaya manifest sudah hangat sebelum klik Download
+    url = clean_youtube_url(request.args.get("url", "").strip())
+    if not valid_youtube_url(url):
+        return jsonify(error="URL YouTube tidak valid!"), 400
+    try:
+        manifest = get_manifest(url)
+    except Exception as e:
+        return jsonify(error=f"Terjadi kesalahan: {e}"), 502
+    return jsonify(
+        video_id=extract_video_id(url),
+        title=manifest["title"],
+        progressive_res=manifest["progressive_res"],
+        adaptive_res=manifest["adaptive_res"],
     )
 
+@app.route("/metrics")
+def metrics():
+    if JOB_STORE.shared:
+        # snapshot proses ini ditulis dulu agar hitungan terbarunya ikut terbaca
+        JOB_STORE.save_metrics(METRICS.snapshot())
+    return Response(METRICS.render(JOB_STORE.load_metrics()), mimetype="text/plain; version=0.0.4")
+
+@app.route("/storage")
+def storage():
+    return jsonify(storage_stats())
+
+@app.route("/scheduler", methods=["GET", "POST"])
+def scheduler():
+    """GET: alokasi bandwidth saat ini. POST (JSON): ubah batas tanpa restart."""
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        try:
+            SCHEDULER.configure(
+                data.get("bandwidth_mbps"), data.get("client_bandwidth_mbps"), data.get("max_inflight_mb"),
+            )
+        except (TypeError, ValueError):
+            return jsonify(error="Nilai batas tidak valid"), 400
+        # store bersama: worker lain membaca batas baru dalam ~1 detik
+        snapshot = SCHEDULER.snapshot()
+        JOB_STORE.save_scheduler_config({k: snapshot[k] for k in ("bandwidth_mbps", "client_bandwidth_mbps", "max_inflight_mb")})
+    return jsonify(SCHEDULER.snapshot())
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify(metadata=METADATA_CACHE.stats())
+
+@app.route("/stream")
+def stream_download():
+    """Mode streaming untuk `v:`: hasil merge langsung mengalir ke klien tanpa menunggu job."""
+    url = clean_youtube_url(request.args.get("url", "").strip())
+    quality = request.args.get("quality", "")
+    if not valid_youtube_url(url) or not quality.startswith("v:"):
+        return "URL atau kualitas tidak valid (mode stream hanya untuk kualitas Maks)", 400
+    try:
+        quality = with_policy(quality, request.args.get("policy", ""))
+        base_quality, policy = split_policy(quality)
+    except ValueError as e:
+        return str(e), 400
+    key = download_key(url, quality)
+    flight = None
+    released = []
+
+    def release_flight():
+        if flight and not released:
+            released.append(True)
+            STREAMS_INFLIGHT.finish(key, flight)
+
+    while True:
+        cached = stored_result(url, quality)
+        if cached:
+            return redirect(cached["file_path"])
+        if not STREAM_TEE:
+            break
+        # satu stream per video+kualitas yang menyimpan salinan; request lain menunggu lalu
+        # diarahkan ke hasilnya (bila stream itu gagal/putus, request ini yang mengambil alih)
+        leader, call = STREAMS_INFLIGHT.join(key)
+        if leader:
+            flight = call
+            break
+        call["event"].wait()
+
+    if not ffmpeg_available():
+        release_flight()
+        return "Mode stream membutuhkan FFmpeg", 400
+    if not _streams.acquire(blocking=False):
+        release_flight()
+        resp = Response("Terlalu banyak stream berjalan, coba lagi sebentar atau pakai mode unduh biasa.", 503)
+        resp.headers["Retry-After"] = "5"
+        return resp
+    try:
+        manifest = get_manifest(url)
+        res, v_stream, a_stream, _ = select_adaptive(manifest, base_quality.split(":",1)[1], policy)
+    except Exception as e:
+        _streams.release()
+        release_flight()
+        return f"Terjadi kesalahan: {e}", 502
+
+    _, ext, mimetype = stream_container(v_stream, a_stream)
+    file_name = safe_filename(f"{manifest['title']} [{res}{policy_label(policy, v_stream, a_stream)}] [{manifest['video_id']}]") + ext
+    tee_path = os.path.join(DOWNLOAD_FOLDER, file_name) if flight and manifest["video_id"] else None
+    if tee_path:
+        # salinan di disk ikut kuota seperti hasil job; bila tidak muat, stream tetap jalan tanpa salinan
+        try:
+            ensure_space(stream_size(v_stream) + stream_size(a_stream))
+        except StorageFullError as e:
+            log.warning("stream %s tanpa salinan di disk: %s", file_name, e)
+            tee_path = None
+    note = f"Mode Maks: {res} digabung otomatis dengan FFmpeg."
+    saving = []
+
+    def record():
+        try:
+            record_result(manifest["video_id"], quality, file_name, manifest["title"], note)
+            touch_access(file_name)
+            if STORAGE_QUOTA_MB:
+                enforce_storage(keep={file_name})
+        finally:
+            # baru sekarang request yang menunggu bisa diarahkan ke hasil di index
+            release_flight()
+
+    def on_saved():
+        saving.append(True)
+        threading.Thread(target=record, daemon=True).start()
+
+    def release():
+        _streams.release()
+        if not saving:
+            release_flight()
+
+    body = stream_merge(v_stream, a_stream, tee_path, on_saved if tee_path else None, client_id())
+    resp = Response(StreamBody(body, release), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = content_disposition(file_name)
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+# ---------- JSON API (v1) ----------
+# Untuk klien otomatis: tanpa render template, respons ringkas (field kosong dibuang).
+# Memakai inti yang sama dengan halaman HTML: cache manifest, index hasil & antrean job.
+API = "/api/v1"
+
+def compact(data):
+    return {k: v for k, v in data.items() if v is not None and v != [] and v != {}}
+
+def api_error(message, status):
+    return jsonify(error=message), status
+
+def api_stream(stream, kind):
+    return compact({
+        "itag": getattr(stream, "itag", None),
+        "type": kind,
+        "mime": stream.mime_type,
+        "res": getattr(stream, "resolution", None) if kind != "audio" else None,
+        "fps": getattr(stream, "fps", None) if kind != "audio" else None,
+        "vcodec": codec_family(stream_codec(stream, "video")),
+        "acodec": codec_family(stream_codec(stream, "audio")),
+        "kbps": _kbps(stream) or round((getattr(stream, "bitrate", 0) or 0) / 1000) or None,
+        "size": size_hint(stream) or None,
+    })
+
+def api_info(manifest):
+    """Body JSON + ETag info video; dihitung sekali per manifest (ikut cache metadata)."""
+    if "api_info" not in manifest:
+        yt = manifest["yt"]
+        streams = [api_stream(s, "progressive") for s in manifest.get("progressive_streams", [])]
+        streams += [api_stream(s, "video") for s in manifest.get("video_streams", [])]
+        streams += [api_stream(s, "audio") for s in manifest.get("audio_streams", [])]
+        qualities = [f"p:{r}" for r in manifest["progressive_res"]] + [f"v:{r}" for r in manifest["adaptive_res"]]
+        qualities += ["a:audio"] + ([f"a:{fmt}" for fmt in AUDIO_FORMATS] if ffmpeg_available() else [])
+        body = json.dumps(compact({
+            "id": manifest["video_id"],
+            "title": manifest["title"],
+            "duration": getattr(yt, "length", None),
+            "author": getattr(yt, "author", None),
+            "qualities": qualities,
+            "streams": streams,
+        }), separators=(",", ":"))
+        manifest["api_info"] = (body, hashlib.sha1(body.encode()).hexdigest()[:16])
+    return manifest["api_info"]
+
+def api_result(result):
+    if not result:
+        return None
+    return compact({
+        "title": result.get("yt_title"),
+        "file": result.get("file_path"),
+        "size": result.get("size"),
+        "sha256": result.get("sha256"),
+        "cached": result.get("cached"),
+    })
+
+def api_job(job, url=None):
+    data = {
+        "id": job.id,
+        "url": url,
+        "quality": job.quality,
+        "status": job.status,
+        "result": api_result(job.result),
+        "error": job.error,
+        "error_kind": job.error_kind,
+    }
+    if job.status == "queued":
+        data["queue"] = queue_position(job)
+    elif job.status == "running":
+        state = job.progress.state
+        data["progress"] = compact({"phase": state["phase"], "done": state["bytes_done"], "total": state["total"] or None})
+    return compact(data)
+
+def wants_ndjson():
+    return request.args.get("stream") == "ndjson" or "application/x-ndjson" in request.headers.get("Accept", "")
+
+def ndjson_results(submitted):
+    """Satu baris JSON per URL, dikirim begitu job-nya selesai (urutan selesai, bukan urutan kirim)."""
+    pending = []
+    for url, job, error, _ in submitted:
+        if error or job.status not in ("queued", "running"):
+            yield json.dumps(compact({"url": url, "error": error}) if error else api_job(job, url),
+                             separators=(",", ":")) + "\n"
+        else:
+            pending.append((url, job))
+    while pending:
+        still = []
+        for url, job in pending:
+            job = refresh_job(job)
+            if job.status in ("queued", "running"):
+                still.append((url, job))
+            else:
+                yield json.dumps(api_job(job, url), separators=(",", ":")) + "\n"
+        pending = still
+        if pending:
+            wait_job(pending[0][1], 0.5)
+
+@app.route(API + "/info")
+def api_video_info():
+    url = clean_youtube_url(request.args.get("url", "").strip())
+    if not valid_youtube_url(url):
+        return api_error("URL YouTube tidak valid", 400)
+    try:
+        body, etag = api_info(get_manifest(url))
+    except Exception as e:
+        return api_error(str(e), 502)
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = f"public, max-age={METADATA_CACHE_TTL}"
+    return resp.make_conditional(request)
+
+@app.route(API + "/jobs", methods=["POST"])
+def api_submit():
+    """
+    JSON: `url` atau `urls`, `quality` (kunci kualitas eksplisit, mis. 'v:1080p', 'a:mp3-192'),
+    opsional `start`/`end`/`policy`. Beberapa URL + `Accept: application/x-ndjson` (atau
+    `?stream=ndjson`): hasil dialirkan per baris saat tiap job selesai.
+    """
+    data = request.get_json(silent=True) or {}
+    urls = data.get("urls") or ([data["url"]] if data.get("url") else [])
+    if isinstance(urls, str) or not urls:
+        return api_error("Isi 'url' atau daftar 'urls'", 400)
+    if not data.get("quality"):
+        return api_error("'quality' wajib diisi", 400)
+    try:
+        quality = request_quality(data)
+    except ValueError as e:
+        return api_error(str(e), 400)
+
+    submitted = []
+    for raw in urls[:BATCH_MAX_ITEMS]:
+        url = clean_youtube_url(str(raw).strip())
+        if not valid_youtube_url(url):
+            submitted.append((raw, None, "URL YouTube tidak valid", 400))
+            continue
+        try:
+            submitted.append((url, submit_job(url, quality, client_id()), None, 202))
+        except QueueFullError as e:
+            submitted.append((url, None, str(e), 503))
+
+    if "urls" not in data:
+        url, job, error, status = submitted[0]
+        if error:
+            return api_error(error, status)
+        return jsonify(api_job(job)), 200 if job.status == "done" else 202
+    if wants_ndjson():
+        resp = Response(ndjson_results(submitted), mimetype="application/x-ndjson")
+        resp.headers["X-Accel-Buffering"] = "no"
+        return resp
+    return jsonify(jobs=[api_job(job, url) if job else compact({"url": url, "error": error})
+                         for url, job, error, _ in submitted]), 202
+
+@app.route(API + "/jobs/<job_id>")
+def api_job_status(job_id):
+    job = get_job(job_id)
+    if not job:
+        return api_error("Job tidak ditemukan", 404)
+    return jsonify(api_job(job))
+
+@app.route(API + "/result")
+def api_stored_result():
+    """Hasil yang sudah ada di index untuk (url, quality[, start, end, policy]); 404 bila belum pernah diunduh."""
+    url = clean_youtube_url(request.args.get("url", "").strip())
+    if not valid_youtube_url(url) or not request.args.get("quality"):
+        return api_error("Parameter 'url' dan 'quality' wajib diisi", 400)
+    try:
+        quality = request_quality(request.args)
+    except ValueError as e:
+        return api_error(str(e), 400)
+    result = stored_result(url, quality)
+    if not result:
+        return api_error("Belum ada hasil untuk kualitas ini", 404)
+    return jsonify(compact(dict(api_result(result), quality=quality)))
+
+# ---------- Penyajian file ----------
+if DOWNLOAD_OFFLOAD == "x-sendfile":
+    app.config["USE_X_SENDFILE"] = True
+
+def file_etag(st):
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+def content_disposition(filename):
+    ascii_name = filename.encode("ascii", "ignore").decode() or "download"
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+def _satisfiable_ranges(rng, size):
+    out = []
+    for start, stop in rng.ranges:
+        if start < 0:
+            start, stop = max(size + start, 0), size
+        stop = size if stop is None else min(stop, size)
+        if start < stop:
+            out.append((start, stop))
+    return out
+
+def _if_range_matches(value, etag, mtime):
+    """If-Range (RFC 9110 13.1.5): entity-tag harus sama persis, tanggal harus sama dengan Last-Modified."""
+    if not value:
+        return True
+    value = value.strip()
+    if value.startswith(('"', "W/")):
+        # weak validator tidak boleh dipakai untuk If-Range
+        return value == f'"{etag}"'
+    date = parse_date(value)
+    return date is not None and date == mtime.replace(microsecond=0)
+
+def _multirange_response(file_path, filename, st, ranges):
+    """Respons multipart/byteranges untuk permintaan beberapa range sekaligus."""
+    boundary = uuid.uuid4().hex
+    mimetype = "application/octet-stream"
+    heads = [
+        (f"--{boundary}\r\nContent-Type: {mimetype}\r\n"
+         f"Content-Range: bytes {start}-{stop - 1}/{st.st_size}\r\n\r\n").encode()
+        for start, stop in ranges
+    ]
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    length = sum(len(h) + (stop - start) for h, (start, stop) in zip(heads, ranges))
+    length += 2 * (len(ranges) - 1) + len(tail)
+
+    def generate():
+        with open(file_path, "rb") as f:
+            for i, (head, (start, stop)) in enumerate(zip(heads, ranges)):
+                yield (b"\r\n" if i else b"") + head
+                f.seek(start)
+                remaining = stop - start
+                while remaining:
+                    block = f.read(min(256 * 1024, remaining))
+                    if not block:
+                        return
+                    remaining -= len(block)
+                    yield block
+        yield tail
+
+    resp = Response(generate(), status=206, mimetype=f"multipart/byteranges; boundary={boundary}")
+    resp.headers["Content-Length"] = str(length)
+    resp.headers["Content-Disposition"] = content_disposition(filename)
+    resp.headers["Accept-Ranges"] = "bytes"
+    resp.headers["ETag"] = f'"{file_etag(st)}"'
+    resp.headers["Last-Modified"] = http_date(st.st_mtime)
+    return resp
+
+def timed_send(resp, qtype="-"):
+    """Catat durasi fase `send` sampai body selesai dikirim (bukan hanya sampai respons dibuat)."""
+    t0 = time.perf_counter()
+    size = resp.content_length or 0
+
+    def done():
+        elapsed = time.perf_counter() - t0
+        METRICS.observe("cibenyt_phase_seconds", elapsed, phase="send", quality_type=qtype)
+        METRICS.inc("cibenyt_transfer_bytes_total", size, phase="send", quality_type=qtype)
+
+    if resp.direct_passthrough and hasattr(resp.response, "close"):
+        # body file_wrapper dikembalikan apa adanya ke server (agar sendfile tetap dipakai),
+        # jadi callback dipasang di close() milik wrapper yang dipanggil server setelah selesai
+        body = resp.response
+        body_close = body.close
+
+        def close():
+            try:
+                body_close()
+            finally:
+                done()
+        body.close = close
+    else:
+        resp.call_on_close(done)
+    return resp
+
 @app.route("/download/<filename>")
 def download_file(filename):
+    if filename.startswith("."):
+        # index SQLite dan file internal lain tidak ikut disajikan
+        return "File tidak ditemukan", 404
     file_path = os.path.join(DOWNLOAD_FOLDER, filename)
-    if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True)
-    return "File tidak ditemukan", 404
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return "File tidak ditemukan", 404
+    etag = file_etag(st)
+    mtime = datetime.fromtimestamp(st.st_mtime, timezone.utc)
+
+    touch_access(filename)
+    # label metrik fase send sama dengan fase lain job-nya; arsip batch dll. tetap "-"
+    quality = result_quality(filename)
+    qtype = quality_type(quality) if quality else "-"
+
+    if DOWNLOAD_OFFLOAD == "x-accel":
+        # nginx yang mengirim byte-nya (termasuk Range & sendfile), worker Python langsung bebas
+        resp = Response(status=200)
+        resp.headers["X-Accel-Redirect"] = ACCEL_PREFIX + quote(filename)
+        resp.headers["Content-Disposition"] = content_disposition(filename)
+        resp.headers["ETag"] = f'"{etag}"'
+        return resp
+
+    rng = parse_range_header(request.headers.get("Range"))
+    if rng and rng.units == "bytes" and len(rng.ranges) > 1:
+        # werkzeug hanya mendukung satu range; multi-range, If-Range dan 304-nya ditangani di sini
+        if not is_resource_modified(request.environ, etag=etag, last_modified=mtime):
+            resp = Response(status=304)
+            resp.headers["ETag"] = f'"{etag}"'
+            resp.headers["Last-Modified"] = http_date(mtime)
+            return resp
+        if not _if_range_matches(request.headers.get("If-Range"), etag, mtime):
+            # file sudah berubah sejak salinan klien: Range diabaikan, kirim file utuh (200)
+            resp = send_file(file_path, as_attachment=True, conditional=False, etag=etag, last_modified=mtime)
+            resp.headers["Accept-Ranges"] = "bytes"
+            return timed_send(resp, qtype)
+        ranges = _satisfiable_ranges(rng, st.st_size)
+        if not ranges:
+            resp = Response("Range tidak valid", status=416)
+            resp.headers["Content-Range"] = f"bytes */{st.st_size}"
+            return resp
+        return timed_send(_multirange_response(file_path, filename, st, ranges), qtype)
+
+    # Range tunggal, If-None-Match/If-Modified-Since (304) dan If-Range ditangani werkzeug;
+    # body dikirim lewat wsgi.file_wrapper sehingga gunicorn & co. memakai sendfile().
+    return timed_send(send_file(file_path, as_attachment=True, conditional=True, etag=etag, last_modified=mtime), qtype)
 
 if __name__ == "__main__":
     # akses jaringan lokal (dan mobile) mudah
@@ -0,0 +1,30 @@
+"""
+Mode produksi: beberapa proses worker di semua core dengan state job bersama.
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py cibenyt:app
+
+Job, index hasil dan kunci in-flight disimpan di SQLite (WAL) sehingga request apa pun
+bisa diterima worker mana pun. Saat berhenti (SIGTERM/SIGINT), tiap worker menjalankan
+`cibenyt.drain()`: berhenti mengambil job, menunggu job berjalan, lalu mematikan ffmpeg
+yang tersisa dan mengembalikan job yang terputus ke antrean.
+"""
+import multiprocessing, os
+
+os.environ.setdefault("CIBEN_JOB_STORE", "sqlite")
+# job worker per proses; total = workers x CIBEN_JOB_WORKERS
+os.environ.setdefault("CIBEN_JOB_WORKERS", "2")
+
+bind = os.environ.get("CIBEN_BIND", "0.0.0.0:5001")
+workers = int(os.environ.get("CIBEN_WEB_WORKERS", multiprocessing.cpu_count()))
+# thread per worker: SSE, /stream dan unduhan besar menahan koneksi lama
+worker_class = "gthread"
+threads = int(os.environ.get("CIBEN_WEB_THREADS", 16))
+timeout = 120
+graceful_timeout = float(os.environ.get("CIBEN_DRAIN_TIMEOUT", 30)) + 15
+
+
+def worker_exit(server, worker):
+    import cibenyt
+
+    cibenyt.drain()
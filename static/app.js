@@ -0,0 +1,157 @@
+// Data per request dikirim server sebagai JSON kecil di <script id="page-data">.
+function app() {
+  const page = JSON.parse(document.getElementById('page-data').textContent);
+  const result = page.result || {};
+  return {
+    url: page.url || '',
+    quality: page.quality || 'p:720p',
+    mode: (page.quality || '').startsWith('p:') || page.quality === 'a:audio' ? 'easy' : 'max',
+    loading: !!(page.job_id && !page.result),
+    streamMode: false,
+    jobId: page.job_id,
+    jobStatus: page.result ? 'done' : null,
+    jobError: null,
+    queuePosition: 0,
+    progress: {phase: 'queued', bytes_done: 0, total: 0, rate: 0},
+    fileUrl: result.file_path || null,
+    note: result.note || null,
+    progressiveRes: page.progressive_res,
+    adaptiveRes: page.adaptive_res,
+    darkMode: (() => {
+      const saved = localStorage.getItem('theme');
+      if (saved === 'dark') return true;
+      if (saved === 'light') return false;
+      return window.matchMedia('(prefers-color-scheme: dark)').matches;
+    })(),
+    serverTitle: result.yt_title || null,
+    ffmpeg: page.ffmpeg_ok,
+    get videoId() {
+      const m = (this.url||'').match(/(?:v=|youtu\.be\/)([\w-]{6,})/);
+      return m ? m[1] : '';
+    },
+    get thumbnailUrl() {
+      return this.videoId ? `https://img.youtube.com/vi/${this.videoId}/maxresdefault.jpg` : '';
+    },
+    get qualityLabel(){
+      if(!this.quality) return '';
+      if(this.quality.startsWith('p:')) return this.quality.slice(2) + ' (prog)';
+      if(this.quality.startsWith('v:')) return this.quality.slice(2) + ' (adaptive)';
+      if(this.quality==='a:audio') return 'Audio';
+      return this.quality;
+    },
+    init(){ if(this.jobId && !this.fileUrl) this.watchJob(); },
+    get phaseLabel(){
+      return {metadata: 'Mengambil info video...', video: 'Mengunduh video...', audio: 'Mengunduh audio...', clip: 'Memotong klip...', merge: 'Menggabungkan...', transcode: 'Mengonversi audio...', retry: 'Gangguan jaringan, mencoba lagi...'}[this.progress.phase] || 'Sedang diproses...';
+    },
+    get progressPct(){
+      return this.progress.total ? Math.min(100, Math.round(this.progress.bytes_done * 100 / this.progress.total)) : 0;
+    },
+    get progressText(){
+      const mb = n => (n / 1048576).toFixed(1);
+      if(['merge', 'clip', 'transcode'].includes(this.progress.phase)) return this.progressPct + '%';
+      return `${mb(this.progress.bytes_done)} / ${mb(this.progress.total)} MB · ${mb(this.progress.rate)} MB/s`;
+    },
+    watchJob(){
+      if(!window.EventSource){ this.pollJob(); return; }
+      const es = new EventSource(`/jobs/${this.jobId}/events`);
+      es.onmessage = (e)=>{
+        const p = JSON.parse(e.data);
+        this.progress = p;
+        this.jobStatus = p.status;
+        if(p.phase === 'done' || p.phase === 'error'){ es.close(); this.pollJob(); }
+      };
+      es.onerror = ()=>{ es.close(); this.pollJob(); };
+    },
+    pollJob(){
+      fetch(`/jobs/${this.jobId}`).then(r=>r.json()).then(j=>{
+        this.jobStatus = j.status;
+        this.queuePosition = j.queue_position || 0;
+        if(j.status === 'done'){
+          const res = j.result;
+          this.loading = false;
+          this.serverTitle = res.yt_title;
+          this.fileUrl = res.file_path;
+          this.note = res.note;
+          if(res.progressive_res.length) this.progressiveRes = res.progressive_res;
+          if(res.adaptive_res.length) this.adaptiveRes = res.adaptive_res;
+        } else if(j.status === 'error' || j.error){
+          this.loading = false;
+          this.jobError = j.error || 'Job tidak ditemukan';
+        } else {
+          setTimeout(()=>this.pollJob(), 1500);
+        }
+      }).catch(()=>setTimeout(()=>this.pollJob(), 3000));
+    },
+    onUrlInput(){
+      this.serverTitle = null;
+      clearTimeout(this._prefetchTimer);
+      const vid = this.videoId;
+      if(!vid) return;
+      this._prefetchTimer = setTimeout(()=>{
+        fetch(`/prefetch?url=${encodeURIComponent(this.url)}`).then(r=>r.ok ? r.json() : null).then(m=>{
+          if(!m || m.video_id !== this.videoId) return;
+          this.serverTitle = m.title;
+          if(m.progressive_res.length) this.progressiveRes = m.progressive_res;
+          this.adaptiveRes = m.adaptive_res;
+        }).catch(()=>{});
+      }, 400);
+    },
+    onSubmit(e){
+      const clip = e.target.start.value || e.target.end.value;
+      if(this.streamMode && !clip && this.mode==='max' && this.quality.startsWith('v:')){
+        // hasil merge langsung dialirkan ke browser, tanpa antrean job
+        e.preventDefault();
+        window.location.href = `/stream?url=${encodeURIComponent(this.url)}&quality=${encodeURIComponent(this.quality)}`;
+        return;
+      }
+      this.loading = true;
+    },
+    pasteUrl(){
+      if(navigator.clipboard){
+        navigator.clipboard.readText().then(t=>{ if(t){ this.url=t.trim(); this.onUrlInput(); } });
+      }
+    },
+    scrollToTop(){ window.scrollTo({top:0, behavior:'smooth'}); },
+    toggleTheme(){
+      this.darkMode = !this.darkMode;
+      localStorage.setItem('theme', this.darkMode ? 'dark' : 'light');
+      // sinkronkan meta theme-color agar status bar Android enak dilihat
+      const meta = document.querySelector('meta[name="theme-color"]');
+      if (meta) meta.setAttribute('content', this.darkMode ? '#111827' : '#ffffff');
+    }
+  }
+}
+
+// ==== Poké Ball bubbles generator (ringan) ====
+(function(){
+  const layer = document.getElementById('bubbleLayer');
+  if(!layer) return;
+  const prefersReduced = window.matchMedia('(prefers-reduced-motion: reduce)').matches;
+  const count = prefersReduced ? 4 : 10 + Math.floor(Math.random()*5); // 10-14 bola
+  for(let i=0;i<count;i++){
+    const b = document.createElement('div');
+    const size = (Math.random()*8 + 6) * (window.innerWidth<480?3.5:5); // responsive
+    const left = Math.random()*100;
+    const top  = Math.random()*100;
+    const fy = (Math.random()*8 + 10).toFixed(1) + 's';
+    const fx = (Math.random()*8 + 12).toFixed(1) + 's';
+    const op = (Math.random()*0.35 + 0.2).toFixed(2); // 0.2 - 0.55
+    b.className = 'poke floatY driftX';
+    b.style.width = size+'px';
+    b.style.height = size+'px';
+    b.style.left = left+'%';
+    b.style.top = top+'%';
+    b.style.setProperty('--fy', fy);
+    b.style.setProperty('--fx', fx);
+    b.style.opacity = op;
+    layer.appendChild(b);
+  }
+})();
+
+// sinkronkan theme-color awal
+(function(){
+  const saved = localStorage.getItem('theme');
+  const isDark = saved ? saved==='dark' : window.matchMedia('(prefers-color-scheme: dark)').matches;
+  const meta = document.querySelector('meta[name="theme-color"]');
+  if (meta) meta.setAttribute('content', isDark ? '#111827' : '#ffffff');
+})();